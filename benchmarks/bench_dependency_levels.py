@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for dependency level construction.
+
+Builds large generated decompositions and times build_dependency_levels and the
+critical path priorities used by the scheduler. Exits with a non-zero status if
+any run exceeds the time budget, so it can be used as a regression check:
+
+    python benchmarks/bench_dependency_levels.py --nodes 10000 20000 --max-seconds 1.0
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from microboss.core.agent import build_dependency_levels
+from microboss.core.scheduler import compute_critical_path_priorities
+
+
+def generate_subproblems(nodes, max_deps, seed):
+    """
+    Generate a random acyclic decomposition.
+
+    Args:
+        nodes (int): Number of subproblems
+        max_deps (int): Maximum number of dependencies per subproblem
+        seed (int): Random seed
+
+    Returns:
+        list: Subproblems as (id, template, dependencies) tuples, in shuffled order
+    """
+    rng = random.Random(seed)
+    subproblems = []
+    for i in range(nodes):
+        # Depend mostly on recent tasks so the graph has both long chains and wide levels
+        window = range(max(0, i - 50), i)
+        deps = [f"task_{j}" for j in rng.sample(window, min(len(window), rng.randint(0, max_deps)))]
+        subproblems.append((f"task_{i}", f"Subtask {i}", deps))
+    rng.shuffle(subproblems)
+    return subproblems
+
+
+def check_levels(subproblems, levels):
+    """Verify every task is placed once and after all of its dependencies."""
+    level_of = {}
+    for index, level in enumerate(levels):
+        for id, _, _ in level:
+            assert id not in level_of, f"{id} placed twice"
+            level_of[id] = index
+    assert len(level_of) == len(subproblems), "not every task was placed"
+    for id, _, deps in subproblems:
+        for dep in deps:
+            assert level_of[dep] < level_of[id], f"{id} placed before its dependency {dep}"
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time of several calls, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dependency level construction")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 20000, 50000],
+                        help="Graph sizes to benchmark (default: 10000 20000 50000)")
+    parser.add_argument("--max-deps", type=int, default=4,
+                        help="Maximum number of dependencies per node (default: 4)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--max-seconds", type=float, default=2.0,
+                        help="Fail if a single run exceeds this many seconds (default: 2.0)")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'nodes':>8} {'edges':>8} {'levels':>7} {'levels (s)':>11} {'priorities (s)':>15}")
+    for nodes in args.nodes:
+        subproblems = generate_subproblems(nodes, args.max_deps, args.seed)
+        edges = sum(len(deps) for _, _, deps in subproblems)
+
+        levels_time, levels = time_call(build_dependency_levels, subproblems)
+        check_levels(subproblems, levels)
+        priorities_time, _ = time_call(compute_critical_path_priorities, subproblems)
+
+        print(f"{nodes:>8} {edges:>8} {len(levels):>7} {levels_time:>11.4f} {priorities_time:>15.4f}")
+        if max(levels_time, priorities_time) > args.max_seconds:
+            failed = True
+
+    if failed:
+        print(f"FAILED: a run exceeded {args.max_seconds:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of the cold-start import time of the package and of the CLI.
+
+Each run imports a module in a fresh interpreter with `python -X importtime`, whose
+report is parsed for the cumulative import time of the module and of the slowest
+modules it pulls in. Exits with a non-zero status if the median import time of a
+module exceeds the time budget, or if it imports a module that must only be loaded
+on first use (the provider SDKs, httpx and dotenv), so it can be used as a
+regression check:
+
+    python benchmarks/bench_import_time.py --runs 5 --max-ms 300
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules the package must not import until they are used
+DEFERRED_MODULES = ["anthropic", "openai", "httpx", "dotenv", "requests"]
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)$")
+
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        module (str): Module name
+
+    Returns:
+        dict: Cumulative import time in microseconds of every module imported, keyed by name
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            cumulative[match.group(2)] = int(match.group(1))
+    return cumulative
+
+
+def measure_help():
+    """Get the wall time of `python -m microboss.cli --help`, interpreter start-up included, in seconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "microboss.cli", "--help"], cwd=ROOT, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold-start import time of microboss")
+    parser.add_argument("--module", nargs="+", default=["microboss", "microboss.cli"],
+                        help="Modules to import (default: microboss microboss.cli)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Number of slowest imported modules to report (default: 10)")
+    parser.add_argument("--max-ms", type=float, default=300.0,
+                        help="Fail if the median import time of a module exceeds this many milliseconds (default: 300)")
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.module:
+        runs = [measure_import(module) for _ in range(args.runs)]
+        median_ms = statistics.median(run.get(module, 0) for run in runs) / 1000
+        deferred = [name for name in DEFERRED_MODULES if name in runs[0]]
+
+        print(f"\n{module}: {median_ms:.1f} ms median over {args.runs} runs")
+        print(f"{'cumulative (ms)':>16}  module")
+        slowest = sorted(runs[0].items(), key=lambda item: item[1], reverse=True)
+        for name, micros in [item for item in slowest if item[0] != module][:args.top]:
+            print(f"{micros / 1000:>16.1f}  {name}")
+
+        if median_ms > args.max_ms:
+            failed.append(f"{module} took {median_ms:.1f} ms to import, over {args.max_ms:.0f} ms")
+        if deferred:
+            failed.append(f"{module} imports {', '.join(deferred)}, which must only be loaded on first use")
+
+    help_seconds = statistics.median(measure_help() for _ in range(args.runs))
+    print(f"\nmicroboss.cli --help: {help_seconds * 1000:.1f} ms median wall time, interpreter start-up included")
+
+    if failed:
+        for reason in failed:
+            print(f"FAILED: {reason}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+End-to-end benchmark of the orchestration overhead on the offline local backend.
+
+Runs the agent on decomposed tasks against the deterministic local provider, so the
+time measured is spent in decomposition, scheduling, code execution and logging
+rather than waiting on the network. Exits with a non-zero status if any run exceeds
+the time budget, so it can be used as a regression check:
+
+    python benchmarks/bench_orchestration.py --depth 2 3 --latency fixed:0.05 --max-seconds 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def configure_environment(latency, shape, seed):
+    """Select the local backend and disable everything that would reuse earlier runs."""
+    os.environ["MICROBOSS_PROVIDER"] = "local"
+    os.environ["MICROBOSS_LOCAL_LATENCY"] = latency
+    os.environ["MICROBOSS_LOCAL_DECOMPOSITION"] = shape
+    os.environ["MICROBOSS_LOCAL_SEED"] = str(seed)
+    os.environ["MICROBOSS_CACHE"] = "false"
+    os.environ["MICROBOSS_RESULT_STORE"] = "false"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark orchestration on the offline local backend")
+    parser.add_argument("--depth", type=int, nargs="+", default=[2, 3],
+                        help="Decomposition depths to benchmark (default: 2 3)")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Simulated latency of each LLM call, see MICROBOSS_LOCAL_LATENCY (default: fixed:0)")
+    parser.add_argument("--shape", choices=["fan-in", "chain"], default="fan-in",
+                        help="Shape of the decompositions (default: fan-in)")
+    parser.add_argument("--parallel", type=int, help="Maximum number of subtasks run concurrently")
+    parser.add_argument("--seed", type=int, default=0, help="Latency seed (default: 0)")
+    parser.add_argument("--max-seconds", type=float, default=60.0,
+                        help="Fail if a single run exceeds this many seconds (default: 60.0)")
+    args = parser.parse_args()
+
+    configure_environment(args.latency, args.shape, args.seed)
+
+    # Imported after configuring the environment, and run in a scratch directory
+    # so the benchmark leaves no run/ output behind
+    from microboss.core.agent import agent
+    from microboss.core.budget import Budget
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        for depth in args.depth:
+            budget = Budget()
+            start = time.perf_counter()
+            agent(f"Benchmark task of depth {depth}", depth=depth, max_parallel=args.parallel, budget=budget)
+            elapsed = time.perf_counter() - start
+
+            rows.append((depth, budget.llm_calls, budget.executions, budget.tokens, elapsed))
+
+    # Printed after all runs so the table is not interleaved with the agent's logs
+    failed = False
+    print(f"{'depth':>6} {'llm calls':>10} {'executions':>11} {'tokens':>8} {'wall (s)':>9}")
+    for depth, llm_calls, executions, tokens, elapsed in rows:
+        print(f"{depth:>6} {llm_calls:>10} {executions:>11} {tokens:>8} {elapsed:>9.3f}")
+        if elapsed > args.max_seconds:
+            failed = True
+
+    if failed:
+        print(f"FAILED: a run exceeded {args.max_seconds:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
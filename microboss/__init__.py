@@ -5,5 +5,8 @@ Microboss: An AI agent system that decomposes complex tasks.
 __version__ = "0.1.0"
 
 from microboss.core.agent import agent
+from microboss.core.async_agent import async_agent
+from microboss.core.budget import Budget, BudgetExceededError
+from microboss.core.config import RunConfig
 
-__all__ = ["agent"] 
\ No newline at end of file
+__all__ = ["agent", "async_agent", "Budget", "BudgetExceededError", "RunConfig"] 
\ No newline at end of file
@@ -7,16 +7,21 @@ import os
 import time
 from datetime import datetime
 from pathlib import Path
-from dotenv import load_dotenv
 
 from microboss.core.agent import agent
-
-# Load environment variables from .env file
-load_dotenv()
+from microboss.core.config import RunConfig
+from microboss.providers import get_backend_names
+from microboss.utils.api import load_environment
+from microboss.utils.hedging import get_hedge_stats
+from microboss.utils.usage import format_usage_summary
+from microboss.utils.validation import get_validation_stats
 
 
 def main():
     """Main entry point for the microboss CLI."""
+    # Load environment variables from .env file
+    load_environment()
+    
     parser = argparse.ArgumentParser(
         description="Microboss: An AI agent system that decomposes complex tasks"
     )
@@ -39,10 +44,35 @@ def main():
         default=3,
         help="Maximum number of retries on failure (default: 3)"
     )
+    parser.add_argument(
+        "--parallel",
+        "-p",
+        type=int,
+        help="Maximum number of independent subtasks to run concurrently "
+             f"(default: {os.environ.get('MAX_PARALLEL_SUBTASKS', 'based on CPU count')})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not reuse cached LLM responses or previously solved subtasks"
+    )
+    parser.add_argument(
+        "--provider",
+        type=str,
+        choices=get_backend_names(),
+        help="LLM provider backend, \"local\" answers offline with canned responses "
+             f"(default: {os.environ.get('MICROBOSS_PROVIDER', 'anthropic, falling back to openai')})"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit code generation requests as provider batch jobs, cheaper but slower (providers with a batch interface only)"
+    )
     parser.add_argument(
         "--api-key",
         type=str,
-        help="Anthropic API key (will use ANTHROPIC_API_KEY environment variable if not provided)"
+        help="API key of the provider, Anthropic unless --provider is given "
+             "(will use ANTHROPIC_API_KEY environment variable if not provided)"
     )
     parser.add_argument(
         "--model",
@@ -57,15 +87,16 @@ def main():
     
     args = parser.parse_args()
     
-    # Set environment variables if provided via CLI
-    if args.api_key:
-        os.environ["ANTHROPIC_API_KEY"] = args.api_key
-    
-    if args.model:
-        os.environ["DEFAULT_MODEL"] = args.model
-    
-    if args.max_tokens:
-        os.environ["MAX_TOKENS"] = str(args.max_tokens)
+    # Settings of this run, the environment only provides their defaults
+    config = RunConfig.from_env(
+        model=args.model,
+        max_tokens=args.max_tokens,
+        # The API key option has always been the Anthropic one
+        provider=args.provider or ("anthropic" if args.api_key else None),
+        use_cache=not args.no_cache,
+        batch=args.batch or None,
+        api_key=args.api_key
+    )
     
     # Print the header
     print("\n" + "="*80)
@@ -74,19 +105,35 @@ def main():
     
     print(f"\n📋 TASK: {args.task}")
     print(f"⏰ START TIME: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"🤖 MODEL: {os.environ.get('DEFAULT_MODEL', 'claude-3-7-sonnet-20250219')}")
+    print(f"🤖 MODEL: {config.model}")
     
     start_time = time.time()
+    # Accounts for the usage of the whole task tree
+    budget = config.make_budget()
     
     try:
         print(f"\n🧪 RUNNING WITH DEPTH {args.depth}:")
-        result = agent(args.task, depth=args.depth, max_retries=args.retries)
+        result = agent(
+            args.task, depth=args.depth, max_retries=args.retries, max_parallel=args.parallel,
+            use_cache=config.use_cache, budget=budget, config=config
+        )
         print(f"\n✅ EXECUTION RESULT SUMMARY: Successfully executed task with {len(str(result)) if result else 0} characters of solution")
     except Exception as e:
         print(f"\n❌ EXECUTION FAILED: {e}")
     
     print(f"\n{'='*80}")
     print(f"✅ MICROBOSS EXECUTION COMPLETED IN {time.time() - start_time:.2f}s")
+    for line in format_usage_summary(budget.usage()):
+        print(f"📊 {line}")
+    hedge_stats = get_hedge_stats()
+    if hedge_stats.get("hedges"):
+        print(f"📊 Hedged requests: {hedge_stats['hedges']} of {hedge_stats['calls']} calls "
+              f"({hedge_stats['hedge_rate']:.1%}), {hedge_stats['hedge_wins']} answered first, "
+              f"{hedge_stats['latency_saved']:.2f}s saved")
+    validation_stats = get_validation_stats()
+    if validation_stats["launches_avoided"]:
+        print(f"📊 Executions skipped by static validation: {validation_stats['launches_avoided']} "
+              f"of {validation_stats['checked']} files checked")
     print(f"⏰ END TIME: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*80}")
 
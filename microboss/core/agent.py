@@ -2,14 +2,30 @@
 Core agent functionality for the microboss package.
 """
 
+import re
 import time
 import uuid
+import threading
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 import os
 
-from microboss.utils.api import get_client, generate_code, fix_code, decompose_task
-from microboss.utils.execution import execute_file
+from microboss.core.budget import BudgetExceededError
+from microboss.core.config import RunConfig
+from microboss.core.retry import get_retry_policy, CODE_FAILURE_CLASSES
+from microboss.core.scheduler import DAGScheduler
+from microboss.core.speculative import (
+    run_speculative_candidates, plan_speculative_candidates
+)
+from microboss.core.singleflight import SingleFlight
+from microboss.providers.base import select_backend
+from microboss.utils.api import (
+    get_client, generate_code, fix_code, decompose_task_structured, load_environment
+)
+from microboss.utils.batch import hold_unless_batched
+from microboss.utils.error_context import build_error_context
+from microboss.utils.execution import execute_file, strip_execution_harness
 from microboss.utils.file_utils import (
     create_task_directory, save_code_to_file, read_code_from_file, 
     save_json_to_file, read_json_from_file
@@ -18,40 +34,307 @@ from microboss.utils.logging import (
     log_info, log_success, log_warning, log_error, log_task, 
     log_code, log_result, log_execution
 )
+from microboss.utils.result_store import get_result_store, make_result_key
+
+# Default number of concurrent requests a single provider account is expected to sustain
+DEFAULT_PROVIDER_CONCURRENCY = 8
+
+# Prefix of the placeholder result of a subtask that failed all of its retries
+FAILED_SUBTASK_PREFIX = "Failed after "
+
+# Identical agent calls in flight at the same time share a single solve
+_agent_flights = SingleFlight("agent")
 
+# Bounds LLM calls and code executions across all agents of the process
+_call_semaphore = None
+_call_semaphore_lock = threading.Lock()
 
-def agent(task, depth=1, max_retries=3):
+
+def agent(task, depth=1, max_retries=3, max_parallel=None, use_cache=True, inputs=None, budget=None, config=None):
     """
     Entry point for the agent that solves tasks.
     
+    Identical calls (same task, inputs, depth and model) running concurrently in
+    different threads are coalesced: only one of them solves the task and all of
+    them receive its result or its error.
+    
     Args:
         task (str): Task to solve.
         depth (int): Depth of recursion.
         max_retries (int): Maximum number of retries on code execution failure.
+        max_parallel (int): Maximum number of independent subtasks to run concurrently
+            (default: MAX_PARALLEL_SUBTASKS or a CPU/provider based limit).
+        use_cache (bool): Whether LLM responses may be served from the persistent response cache.
+            Retries always bypass the cache so they do not repeat a cached failure.
+            Also controls whether previously solved tasks are served from the result store.
+        inputs (list): Values of the dependencies the task is solved with, used to
+            key the result store.
+        budget (Budget): Budget shared by the task and all of its subtasks
+            (default: a new budget with the limits of the run configuration).
+        config (RunConfig): Settings of the run, passed to all of its subtasks, API calls
+            and executions (default: read from the environment once, here).
+    
+    Returns:
+        Generated result.
+        
+    Raises:
+        BudgetExceededError: If the budget is exhausted. It is never retried.
+    """
+    use_cache, config, key = prepare_run(task, inputs, depth, use_cache, config)
+    return _agent_flights.do(key, solve_task, task, depth, max_retries, max_parallel, use_cache, inputs, budget, config)
+
+
+def get_max_concurrent_calls():
+    """
+    Get the maximum number of LLM calls and code executions in flight across all agents.
+    
+    Returns:
+        int: The maximum number of concurrent calls.
+    """
+    max_calls_str = os.environ.get("MAX_CONCURRENT_CALLS", str(DEFAULT_PROVIDER_CONCURRENCY))
+    try:
+        return max(1, int(max_calls_str))
+    except ValueError:
+        log_warning(f"Invalid MAX_CONCURRENT_CALLS value: {max_calls_str}. Using default {DEFAULT_PROVIDER_CONCURRENCY}.")
+        return DEFAULT_PROVIDER_CONCURRENCY
+        
+        
+def get_call_semaphore():
+    """
+    Get the semaphore shared by all synchronous agents of the process. Nested
+    decompositions each run their own worker pool, so the LLM calls and executions
+    of the whole run are bounded here rather than by the pool sizes.
+    
+    Returns:
+        threading.BoundedSemaphore: The semaphore bounding concurrent LLM calls and executions.
+    """
+    global _call_semaphore
+    with _call_semaphore_lock:
+        if _call_semaphore is None:
+            _call_semaphore = threading.BoundedSemaphore(get_max_concurrent_calls())
+        return _call_semaphore
+        
+        
+def prepare_run(task, inputs, depth, use_cache=True, config=None):
+    """
+    Load the environment and settle the settings of an agent call.
+    
+    Args:
+        task (str): Task to solve
+        inputs (list): Values of the dependencies the task is solved with
+        depth (int): Depth of recursion
+        use_cache (bool): Whether the call may use cached responses and results
+        config (RunConfig): Optional configuration of the run, read from the environment without one
+        
+    Returns:
+        tuple: (use_cache, config, flight_key)
+    """
+    load_environment()
+    if config is None:
+        config = RunConfig.from_env(use_cache=use_cache)
+    use_cache = use_cache and config.use_cache
+    return use_cache, config, make_flight_key(task, inputs, depth, use_cache, config)
+
+
+def make_flight_key(task, inputs, depth, use_cache, config=None):
+    """
+    Build the key under which identical concurrent agent calls are coalesced.
+    
+    Args:
+        task (str): Task to solve
+        inputs (list): Values of the dependencies the task is solved with
+        depth (int): Depth of recursion
+        use_cache (bool): Whether the call may use cached responses and results
+        config (RunConfig): Optional configuration of the run, whose provider and model are part of the key
+        
+    Returns:
+        str: The key
+    """
+    config = config or RunConfig.from_env()
+    return f"{config.provider}:{config.model}:{int(bool(use_cache))}:{make_result_key(task, inputs, depth)}"
+
+
+def get_agent_flight_stats():
+    """
+    Get how many identical in-flight agent calls were coalesced.
     
+    Returns:
+        dict: Per-key call and coalesced counts, and the number of calls in flight
+    """
+    return _agent_flights.stats()
+
+
+def solve_task(task, depth=1, max_retries=3, max_parallel=None, use_cache=True, inputs=None, budget=None, config=None):
+    """
+    Solve a task without coalescing it with identical in-flight calls.
+    
+    Args:
+        See agent().
+        
     Returns:
         Generated result.
     """
     start_time = time.time()
-    task_id = str(uuid.uuid4())
+    semaphore = get_call_semaphore()
+    task_id, config, budget = start_task(task, depth, max_retries, max_parallel, use_cache, budget, config)
     
+    # Tasks solved before are served from the result store without any LLM call
+    store, result_key = open_result_store(task, inputs, depth, use_cache, config)
+    if store:
+        stored = lookup_memoized_result(store, result_key, task, task_id, depth, budget, config)
+        if stored is not None:
+            return log_stored_result(stored, store, start_time, task_id, depth)
+            
+    # Create a task directory for this run
+    task_dir = create_task_directory(task)
+    
+    # Get the API client
+    client, model_info = get_client(config.provider, config.api_key)
+    log_model_info(model_info, task_id, depth)
+    
+    attempts = Attempts(max_retries, budget, task_id, depth)
+    code_file_path = None
+    # Number of candidates raced on the first attempt of a direct solution
+    candidates = plan_speculative_candidates(config.speculative_candidates, budget) if depth <= 1 else 1
+    # Number of decomposition LLM calls made for this node (one per attempt)
+    decompose_calls = 0
+    
+    while attempts.retries <= max_retries:
+        retries = attempts.retries
+        try:
+            attempts.begin()
+            if depth <= 1:
+                if retries == 0 and candidates > 1:
+                    # Race several diverse candidates and keep the first that works
+                    try:
+                        code_file_path, result = run_speculative_candidates(
+                            client, task, task_dir, candidates, task_id, depth, use_cache, budget, semaphore, config
+                        )
+                    finally:
+                        # If every candidate failed, the retry fixes the first one generated
+                        if (task_dir / "main.py").exists():
+                            code_file_path = task_dir / "main.py"
+                else:
+                    # Generate code or edit existing file
+                    if retries == 0 or code_file_path is None:
+                        # Generate new code on first attempt
+                        with hold_unless_batched(semaphore, client, config):
+                            code = generate_code(
+                                client, task, use_cache=use_cache and retries == 0, budget=budget, config=config,
+                                task_id=task_id, depth=depth
+                            )
+                        code_file_path = save_code_to_file(code, task_dir / "main.py")
+                        
+                        log_code(
+                            "GENERATED CODE",
+                            code=code,
+                            task_id=task_id,
+                            depth=depth
+                        )
+                    else:
+                        # On retry, edit the existing file
+                        log_info(
+                            f"EDITING EXISTING FILE: {code_file_path}",
+                            task_id=task_id,
+                            depth=depth
+                        )
+                        with semaphore:
+                            fix_code_file(
+                                client, code_file_path, attempts.fix_error, task_id, depth, use_cache, budget, config
+                            )
+                        
+                    # Execute the file instead of the code directly
+                    budget.charge_execution()
+                    with semaphore:
+                        with budget.time_execution():
+                            result = execute_file(code_file_path, task_id, depth, config)
+                if store:
+                    store.set(result_key, task, depth, result, read_code_from_file(code_file_path))
+            else:
+                # A single structured decomposition call yields the subtasks,
+                # their dependencies and the aggregation key
+                with semaphore:
+                    subproblems, levels, aggregation_code = decompose_complex_task(
+                        client, task, depth, task_id, use_cache=use_cache and retries == 0, budget=budget, config=config
+                    )
+                decompose_calls += 1
+                save_decomposition(task_dir, subproblems, levels, aggregation_code)
+                
+                # For depth > 1, use a simplified approach to avoid the syntax errors in generated code
+                subtask_results = {}
+                result = execute_simplified_subproblems(
+                    client, task, subproblems, levels, depth, aggregation_code, task_dir, task_id,
+                    max_retries, max_parallel, use_cache and retries == 0, budget, config, subtask_results
+                )
+                # A result built from failed subtasks must be solved again next time
+                if store and not any(map(is_failed_subtask_result, subtask_results.values())):
+                    store.set(result_key, task, depth, result)
+                    
+            return log_task_completed(result, start_time, task_id, depth, decompose_calls, budget)
+        except BudgetExceededError:
+            # Retrying cannot help once the budget is spent, fail the whole tree
+            raise
+        except Exception as e:
+            delay = attempts.failed(e)
+            if delay is None:
+                break
+            # Code errors go straight to the fix call, provider errors back off
+            time.sleep(delay)
+            
+    return attempts.give_up()
+
+
+def start_task(task, depth, max_retries, max_parallel, use_cache, budget=None, config=None, is_async=False):
+    """
+    Log the start of a solve and fill in the defaults of its budget and configuration.
+    
+    Args:
+        task (str): Task to solve
+        depth (int): Depth of recursion
+        max_retries (int): Maximum number of retries
+        max_parallel (int): Maximum number of independent subtasks to run concurrently
+        use_cache (bool): Whether the solve may use cached responses and results
+        budget (Budget): Optional budget, a new one with the limits of the configuration without one
+        config (RunConfig): Optional configuration, read from the environment without one
+        is_async (bool): Whether the task is solved by the async agent
+        
+    Returns:
+        tuple: (task_id, config, budget)
+    """
+    task_id = str(uuid.uuid4())
+    if config is None:
+        config = RunConfig.from_env(use_cache=use_cache)
+    if budget is None:
+        budget = config.make_budget()
+        
+    data = {
+        "max_retries": max_retries,
+        "max_parallel": max_parallel,
+        "use_cache": use_cache,
+        "model": config.model,
+        "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if is_async:
+        data["async"] = True
     log_task(
         f"AGENT SOLVING TASK: '{task}' AT DEPTH {depth}",
         task_id=task_id,
         depth=depth,
-        data={
-            "max_retries": max_retries,
-            "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        data=data
     )
+    return task_id, config, budget
 
-    # Create a task directory for this run
-    task_dir = create_task_directory(task)
-    
-    # Get the API client
-    client, model_info = get_client()
+
+def log_model_info(model_info, task_id=None, depth=None):
+    """
+    Log which model a task is solved with.
     
-    # Log which model is being used - log this multiple times for persistence
+    Args:
+        model_info (str): Description of the model, as returned by get_client()
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+    """
+    # Log this multiple times for persistence
     log_info(
         f"USING MODEL: {model_info}",
         task_id=task_id,
@@ -66,240 +349,397 @@ def agent(task, depth=1, max_retries=3):
         depth=depth,
         data={"model_info": model_info}
     )
+
+
+def log_stored_result(stored, store, start_time, task_id=None, depth=None):
+    """
+    Log a task served from the result store.
     
-    retries = 0
-    last_error = None
-    code_file_path = None
+    Args:
+        stored (dict): The stored entry, as returned by lookup_memoized_result()
+        store (ResultStore): The result store
+        start_time (float): Time the task started
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        
+    Returns:
+        The stored result
+    """
+    log_success(
+        f"AGENT REUSED STORED RESULT AT DEPTH {depth} IN {time.time() - start_time:.2f}s",
+        task_id=task_id,
+        depth=depth,
+        data={"memoized": True, "revalidated": store.revalidate}
+    )
+    log_result(
+        f"FINAL RESULT: {str(stored['result'])[:1000] if stored['result'] is not None else 'None'}",
+        result=stored["result"],
+        task_id=task_id,
+        depth=depth
+    )
+    return stored["result"]
+
+
+def log_task_completed(result, start_time, task_id=None, depth=None, decompose_calls=0, budget=None):
+    """
+    Log the result of a solved task.
     
-    while retries <= max_retries:
-        try:
-            if depth <= 1:
-                # For depth 1, use the direct solution approach
-                log_info(
-                    f"USING DIRECT SOLUTION APPROACH (DEPTH 1)",
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                if retries > 0:
-                    log_info(
-                        f"RETRY ATTEMPT {retries}/{max_retries}",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                    
-                # Generate code or edit existing file
-                if retries == 0 or code_file_path is None:
-                    # Generate new code on first attempt
-                    code = generate_code(client, task)
-                    main_file = task_dir / "main.py"
-                    code_file_path = save_code_to_file(code, main_file)
-                    
-                    log_code(
-                        "GENERATED CODE",
-                        code=code,
-                        task_id=task_id,
-                        depth=depth
-                    )
-                else:
-                    # On retry, edit the existing file
-                    log_info(
-                        f"EDITING EXISTING FILE: {code_file_path}",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                    code = fix_code_file(client, code_file_path, last_error, task_id, depth)
-                
-                # Execute the file instead of the code directly
-                result = execute_file(code_file_path, task_id, depth)
-                
-                log_success(
-                    f"AGENT COMPLETED TASK AT DEPTH {depth} IN {time.time() - start_time:.2f}s",
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                log_result(
-                    f"FINAL RESULT: {str(result)[:1000] if result is not None else 'None'}",
-                    result=result,
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                return result
-            else:
-                # For depth > 1, use the recursive decomposition approach
-                log_info(
-                    f"USING RECURSIVE DECOMPOSITION APPROACH (DEPTH {depth})",
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                if retries > 0:
-                    log_info(
-                        f"RETRY ATTEMPT {retries}/{max_retries}",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                
-                # First get the decomposition
-                log_info(
-                    f"DECOMPOSING TASK: '{task}' AT DEPTH {depth}",
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                subtasks = decompose_task(client, task, depth)
-                
-                # Convert subtasks to a string representation for logging
-                code = "Subtasks:\n" + "\n".join([f"{i+1}. {task}" for i, task in enumerate(subtasks)])
-                
-                log_code(
-                    f"DECOMPOSITION RESULTS ({time.time() - start_time:.2f}s)",
-                    code=code,
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                # Create a directory for the decomposed tasks
-                decomp_dir = task_dir / "decomposed"
-                decomp_dir.mkdir(exist_ok=True)
-                
-                # Process the subtasks to get the proper structure
-                # When decompose_task returns a simple list of strings, we need to create the proper structure
-                if isinstance(subtasks, list) and all(isinstance(t, str) for t in subtasks):
-                    log_info(
-                        "Converting simple subtask list to structured format",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                    subproblems, levels, aggregation_code = decompose_complex_task(client, task, depth, task_id)
-                else:
-                    # This will likely never happen due to the changes in decompose_task,
-                    # but kept for backward compatibility
-                    log_warning(
-                        "Unexpected format from decompose_task. Attempting to process directly.",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                    subproblems = subtasks
-                    levels = [[subtask] for subtask in subtasks]
-                    aggregation_code = f"results.get('task_{len(subtasks)}', None)"
-                
-                # Save the decomposition details
-                decomp_file = decomp_dir / "decomposition.json"
-                save_json_to_file({
-                    "subproblems": [[id, template, deps] for id, template, deps in subproblems],
-                    "levels": [[[id, template, deps] for id, template, deps in level] for level in levels],
-                    "aggregation_code": aggregation_code
-                }, decomp_file)
-                
-                # For depth > 1, use a simplified approach to avoid the syntax errors in generated code
-                result = execute_simplified_subproblems(client, task, subproblems, levels, depth, aggregation_code, task_dir, task_id, max_retries)
-                
-                log_success(
-                    f"AGENT COMPLETED TASK AT DEPTH {depth} IN {time.time() - start_time:.2f}s",
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                log_result(
-                    f"FINAL RESULT: {str(result)[:1000] if result is not None else 'None'}",
-                    result=result,
-                    task_id=task_id,
-                    depth=depth
-                )
-                
-                return result
-        except Exception as e:
-            retries += 1
-            last_error = e
-            if retries <= max_retries:
-                log_warning(
-                    f"ERROR IN EXECUTION: {str(e)}",
-                    task_id=task_id,
-                    depth=depth
-                )
-                log_info(
-                    f"RETRYING ({retries}/{max_retries})...",
-                    task_id=task_id,
-                    depth=depth
-                )
-                time.sleep(1)  # Short pause before retrying
-            else:
-                log_error(
-                    f"ALL RETRIES FAILED. LAST ERROR: {str(e)}",
-                    task_id=task_id,
-                    depth=depth
-                )
-                break
+    Args:
+        result: The result of the task
+        start_time (float): Time the task started
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        decompose_calls (int): Number of decomposition LLM calls made for the task
+        budget (Budget): Optional budget whose usage is logged
+        
+    Returns:
+        The result
+    """
+    log_success(
+        f"AGENT COMPLETED TASK AT DEPTH {depth} IN {time.time() - start_time:.2f}s",
+        task_id=task_id,
+        depth=depth,
+        data={"decompose_calls": decompose_calls, "budget": budget.usage() if budget else None}
+    )
+    
+    log_result(
+        f"FINAL RESULT: {str(result)[:1000] if result is not None else 'None'}",
+        result=result,
+        task_id=task_id,
+        depth=depth
+    )
+    return result
+
+
+def save_decomposition(task_dir, subproblems, levels, aggregation_code):
+    """
+    Save the decomposition of a task in its directory.
+    
+    Args:
+        task_dir (Path): Directory of the task
+        subproblems (list): List of (id, template, deps) tuples
+        levels (list): Subproblems grouped by level
+        aggregation_code (str): Code to aggregate results
+    """
+    decomp_dir = task_dir / "decomposed"
+    decomp_dir.mkdir(exist_ok=True)
+    save_json_to_file({
+        "subproblems": [[id, template, deps] for id, template, deps in subproblems],
+        "levels": [[[id, template, deps] for id, template, deps in level] for level in levels],
+        "aggregation_code": aggregation_code
+    }, decomp_dir / "decomposition.json")
+
+
+class Attempts:
+    """
+    Attempts of a task at solving it: counts them, keeps the errors a fix call
+    needs to see and decides whether and when to retry.
+    """
     
-    if last_error:
+    def __init__(self, max_retries, budget, task_id=None, depth=None):
+        """
+        Args:
+            max_retries (int): Maximum number of retries
+            budget (Budget): Budget of the task
+            task_id: Optional task ID for logging
+            depth: Optional depth for logging
+        """
+        self.max_retries = max_retries
+        self.budget = budget
+        self.task_id = task_id
+        self.depth = depth
+        self.retries = 0
+        self.last_error = None
+        # The last failure of the generated code, which is what a fix call needs to see
+        self.last_code_error = None
+        self.retry_policy = get_retry_policy()
+        
+    @property
+    def fix_error(self):
+        """The error the next fix call is asked to fix."""
+        return self.last_code_error or self.last_error
+        
+    def begin(self):
+        """
+        Start an attempt.
+        
+        Raises:
+            BudgetExceededError: If the budget is exhausted
+        """
+        self.budget.check()
+        if self.depth <= 1:
+            log_info(
+                "USING DIRECT SOLUTION APPROACH (DEPTH 1)",
+                task_id=self.task_id,
+                depth=self.depth
+            )
+        else:
+            log_info(
+                f"USING RECURSIVE DECOMPOSITION APPROACH (DEPTH {self.depth})",
+                task_id=self.task_id,
+                depth=self.depth
+            )
+            
+        if self.retries > 0:
+            log_info(
+                f"RETRY ATTEMPT {self.retries}/{self.max_retries}",
+                task_id=self.task_id,
+                depth=self.depth
+            )
+            
+    def failed(self, error):
+        """
+        Record the failure of an attempt.
+        
+        Args:
+            error (Exception): The error of the attempt
+            
+        Returns:
+            float: Seconds to wait before the next attempt, or None if no retry is left
+        """
+        self.retries += 1
+        self.last_error = error
+        failure_class, delay = self.retry_policy.on_failure(error, self.retries, self.budget)
+        if failure_class in CODE_FAILURE_CLASSES:
+            self.last_code_error = error
+            
+        if self.retries > self.max_retries:
+            log_error(
+                f"ALL RETRIES FAILED. LAST ERROR: {str(error)}",
+                task_id=self.task_id,
+                depth=self.depth
+            )
+            return None
+            
+        log_warning(
+            f"ERROR IN EXECUTION: {str(error)}",
+            task_id=self.task_id,
+            depth=self.depth,
+            data={"failure_class": failure_class.value}
+        )
+        log_info(
+            f"RETRYING ({self.retries}/{self.max_retries}) IN {delay:.2f}s...",
+            task_id=self.task_id,
+            depth=self.depth,
+            data={"failure_class": failure_class.value, "delay": round(delay, 2), "failures": self.retry_policy.stats()}
+        )
+        return delay
+        
+    def give_up(self):
+        """
+        End a task no attempt solved.
+        
+        Returns:
+            None, if no attempt was made
+            
+        Raises:
+            Exception: The error of the last attempt
+        """
+        if self.last_error is None:
+            return None
+            
         log_error(
-            f"EXECUTION FAILED AFTER {max_retries} RETRIES",
+            f"EXECUTION FAILED AFTER {self.max_retries} RETRIES",
+            task_id=self.task_id,
+            depth=self.depth
+        )
+        log_error(
+            f"FINAL ERROR: {str(self.last_error)}",
+            task_id=self.task_id,
+            depth=self.depth
+        )
+        raise self.last_error
+
+
+def open_result_store(task, inputs, depth, use_cache, config):
+    """
+    Get the result store of a task and its key for the provider and model of the run.
+    
+    Args:
+        task (str): Task to solve
+        inputs (list): Values of the dependencies the task is solved with
+        depth (int): Depth of recursion
+        use_cache (bool): Whether the call may use stored results
+        config (RunConfig): Configuration of the run
+        
+    Returns:
+        tuple: (store, key), or (None, None) if the task's result is not memoized
+    """
+    store = get_result_store() if use_cache else None
+    # Neither is a task solved from the placeholders of failed dependencies worth keeping
+    if store is None or any(map(is_failed_subtask_result, inputs or [])):
+        return None, None
+    
+    backend = select_backend(config.provider)
+    # Offline and replayed responses are not worth keeping, and stored results would hide them
+    if not backend.cacheable:
+        return None, None
+    return store, make_result_key(task, inputs, depth, backend.name, backend.resolve_model(config.model))
+
+
+def lookup_memoized_result(store, key, task, task_id=None, depth=None, budget=None, config=None):
+    """
+    Look up a previously solved task, re-executing its stored code if the store
+    is configured to re-validate results.
+    
+    Args:
+        store (ResultStore): The result store
+        key (str): Key of the task in the store
+        task (str): The task, used to name the re-validation directory
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        budget: Optional Budget charged for the re-validation execution
+        config: Optional RunConfig of the run
+        
+    Returns:
+        dict: {"code": ..., "result": ...}, or None if the task must be solved again
+    """
+    stored = store.get(key)
+    if stored is None or not store.revalidate or not stored["code"]:
+        return stored
+        
+    if budget:
+        budget.charge_execution()
+    try:
+        code_file_path = save_code_to_file(stored["code"], create_task_directory(task) / "main.py")
+        with get_call_semaphore():
+            with budget.time_execution() if budget else nullcontext():
+                result = execute_file(code_file_path, task_id, depth, config)
+    except Exception as e:
+        return settle_revalidation(store, key, task, depth, stored, error=e, task_id=task_id)
+    return settle_revalidation(store, key, task, depth, stored, result, task_id=task_id)
+
+
+def settle_revalidation(store, key, task, depth, stored, result=None, error=None, task_id=None):
+    """
+    Update the result store once stored code was re-executed.
+    
+    Args:
+        store (ResultStore): The result store
+        key (str): Key of the task in the store
+        task (str): The task
+        depth (int): Depth of the task
+        stored (dict): The stored entry
+        result: Result of the re-execution
+        error (Exception): Error of the re-execution, if it failed
+        task_id: Optional task ID for logging
+        
+    Returns:
+        dict: {"code": ..., "result": ...}, or None if the task must be solved again
+    """
+    if error is not None:
+        log_warning(
+            f"STORED CODE FAILED RE-VALIDATION: {str(error)}",
             task_id=task_id,
             depth=depth
         )
+        store.delete(key)
+        return None
+        
+    if result != stored["result"]:
+        store.set(key, task, depth, result, stored["code"])
+    return {"code": stored["code"], "result": result}
+
+
+def is_failed_subtask_result(result):
+    """
+    Check whether a result is the placeholder of a subtask that failed all of its retries.
+    
+    Args:
+        result: The result to check
+        
+    Returns:
+        bool: True if the result is a failure placeholder
+    """
+    return isinstance(result, str) and result.startswith(FAILED_SUBTASK_PREFIX)
+
+
+def fix_code_file(client, file_path, error, task_id=None, depth=None, use_cache=True, budget=None, config=None):
+    """
+    Fix code in a file based on the error.
+    
+    Args:
+        client: API client
+        file_path: Path to the file to fix
+        error: The error, or its message
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        use_cache: Whether to use the persistent response cache
+        budget: Optional Budget charged for the LLM call
+        config: Optional RunConfig of the run
+        
+    Returns:
+        The fixed code
+    """
+    code, error = read_code_to_fix(file_path, error, task_id, depth)
+    try:
+        fixed_code = fix_code(
+            client, code, error, use_cache=use_cache, budget=budget, config=config, task_id=task_id, depth=depth
+        )
+        return save_fixed_code(fixed_code, file_path, task_id, depth)
+    except Exception as e:
         log_error(
-            f"FINAL ERROR: {str(last_error)}",
+            f"ERROR FIXING CODE: {e}",
             task_id=task_id,
             depth=depth
         )
-        raise last_error
+        raise
+
+
+def read_code_to_fix(file_path, error, task_id=None, depth=None):
+    """
+    Read the code of a file to fix, and summarise the error it is fixed for.
+    
+    Args:
+        file_path: Path to the file to fix
+        error: The error, or its message
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        
+    Returns:
+        tuple: (code, error) as sent to the fix call
+    """
+    # Convert file_path to a Path object if it's a string
+    file_path = Path(file_path)
+    
+    log_info(
+        f"FIXING CODE IN FILE: {file_path}",
+        task_id=task_id,
+        depth=depth
+    )
     
-    return None
+    # Read the code, without the result-saving harness the model does not need to see
+    code = strip_execution_harness(read_code_from_file(file_path))
+    
+    # Send the frames of this file and the exception rather than the whole stderr
+    return code, build_error_context(error, code, file_path.name)
 
 
-def fix_code_file(client, file_path, error, task_id=None, depth=None):
+def save_fixed_code(fixed_code, file_path, task_id=None, depth=None):
     """
-    Fix code in a file based on the error.
+    Save fixed code in place of the code it fixes.
     
     Args:
-        client: API client
-        file_path: Path to the file to fix
-        error: Error message
+        fixed_code (str): The fixed code
+        file_path: Path to the fixed file
         task_id: Optional task ID for logging
         depth: Optional depth for logging
         
     Returns:
         The fixed code
     """
-    # Convert file_path to a Path object if it's a string
-    file_path = Path(file_path)
+    save_code_to_file(fixed_code, Path(file_path))
     
     log_info(
-        f"FIXING CODE IN FILE: {file_path}",
+        "FIXED CODE",
         task_id=task_id,
         depth=depth
     )
     
-    # Read the code
-    code = read_code_from_file(file_path)
-    
-    try:
-        # Fix the code
-        fixed_code = fix_code(client, code, error)
-        
-        # Save the fixed code
-        save_code_to_file(fixed_code, file_path)
-        
-        log_info(
-            "FIXED CODE",
-            task_id=task_id,
-            depth=depth
-        )
-        
-        return fixed_code
-    except Exception as e:
-        log_error(
-            f"ERROR FIXING CODE: {e}",
-            task_id=task_id,
-            depth=depth
-        )
-        raise
+    return fixed_code
 
 
-def decompose_complex_task(client, task, depth, task_id):
+def decompose_complex_task(client, task, depth, task_id, use_cache=True, budget=None, config=None):
     """
     Decomposes a task into subproblems with dependencies.
 
@@ -308,6 +748,9 @@ def decompose_complex_task(client, task, depth, task_id):
         task (str): Task description.
         depth (int): Current depth.
         task_id: The task ID.
+        use_cache (bool): Whether to use the persistent response cache.
+        budget (Budget): Optional budget charged for the LLM call.
+        config (RunConfig): Optional configuration of the run.
 
     Returns:
         tuple: (subproblems, levels, aggregation_code)
@@ -322,11 +765,39 @@ def decompose_complex_task(client, task, depth, task_id):
         depth=depth
     )
     
-    # Get the decomposition code
-    result = decompose_task(client, task, depth)
+    # Get the subtasks, their dependencies and the aggregation key in one call
+    result = decompose_task_structured(
+        client, task, depth, use_cache=use_cache, budget=budget, config=config, task_id=task_id
+    )
+    
+    return structure_decomposition(result, task, depth, task_id, start_time)
+
+
+def structure_decomposition(result, task, depth, task_id, start_time=None):
+    """
+    Turns the output of decompose_task_structured (or decompose_task) into subproblems with dependencies.
+
+    Args:
+        result: The decomposition returned by the API
+        task (str): Task description.
+        depth (int): Current depth.
+        task_id: The task ID.
+        start_time (float): Time the decomposition started, for logging
+
+    Returns:
+        tuple: (subproblems, levels, aggregation_code), as returned by decompose_complex_task
+    """
+    if start_time is None:
+        start_time = time.time()
     
     # Convert to a string representation for logging
-    if isinstance(result, list) and all(isinstance(item, str) for item in result):
+    if isinstance(result, dict) and "subproblems" in result:
+        # Handle the structured decomposition from decompose_task_structured
+        subtasks_str = "Subtasks:\n" + "\n".join([
+            f"{i+1}. [{id}] {template}" + (f" (depends on: {', '.join(deps)})" if deps else "")
+            for i, (id, template, deps) in enumerate(result["subproblems"])
+        ])
+    elif isinstance(result, list) and all(isinstance(item, str) for item in result):
         # Handle case where decompose_task returns a simple list of subtasks
         subtasks_str = "Subtasks:\n" + "\n".join([f"{i+1}. {task}" for i, task in enumerate(result)])
     else:
@@ -340,6 +811,36 @@ def decompose_complex_task(client, task, depth, task_id):
         depth=depth
     )
     
+    # Use the explicit dependencies of a structured decomposition directly
+    if isinstance(result, dict) and "subproblems" in result:
+        subproblems = []
+        all_ids = set(id for id, _, _ in result["subproblems"])
+        invalid_deps = []
+        for id, template, deps in result["subproblems"]:
+            valid_deps = [dep for dep in deps if dep in all_ids and dep != id]
+            invalid_deps.extend(dep for dep in deps if dep not in valid_deps)
+            subproblems.append((id, template, valid_deps))
+        
+        if invalid_deps:
+            log_warning(
+                f"Found invalid dependencies: {invalid_deps}. Removing them.",
+                task_id=task_id,
+                depth=depth
+            )
+        
+        if not subproblems:
+            subproblems = [("task_1", task, [])]
+        
+        levels = build_dependency_levels(subproblems)
+        
+        # Return the result of the subtask that answers the whole task
+        aggregation_key = result.get("aggregation_key")
+        if aggregation_key not in all_ids:
+            aggregation_key = subproblems[-1][0]
+        aggregation_code = f"results.get('{aggregation_key}', None)"
+        
+        return subproblems, levels, aggregation_code
+    
     # Create a simplified dependency structure if we just get a list of subtasks
     # This handles the case when decompose_task returns just a list without proper dependency info
     if isinstance(result, list) and all(isinstance(item, str) for item in result):
@@ -476,30 +977,246 @@ def decompose_complex_task(client, task, depth, task_id):
         return subproblems, levels, aggregation_code
 
 
-def execute_simplified_subproblems(client, task, subproblems, levels, depth, aggregation_code, task_dir, task_id, max_retries=3):
+def get_max_parallel_subtasks():
+    """
+    Get the maximum number of subtasks to run concurrently within a level.
+    
+    Returns:
+        int: The maximum number of parallel subtasks.
+    """
+    # Subtasks spend most of their time waiting on the model, so the default is
+    # bounded by the provider's concurrency limit rather than by the CPU alone
+    default = max(1, min(os.cpu_count() or 1, DEFAULT_PROVIDER_CONCURRENCY))
+    
+    max_parallel_str = os.environ.get("MAX_PARALLEL_SUBTASKS")
+    if not max_parallel_str:
+        return default
+    try:
+        return max(1, int(max_parallel_str))
+    except ValueError:
+        log_warning(f"Invalid MAX_PARALLEL_SUBTASKS value: {max_parallel_str}. Using default {default}.")
+        return default
+
+
+def execute_subtask(subtask_id, task_template, deps, results, results_lock, level_dir, depth, task_id, max_retries=3, max_parallel=None, use_cache=True, budget=None, config=None):
+    """
+    Execute a single subproblem with retries.
+    
+    Args:
+        subtask_id (str): ID of the subproblem
+        task_template (str): Description of the subproblem
+        deps (list): IDs of the subproblems this one depends on
+        results (dict): Shared results of the subproblems solved so far
+        results_lock (threading.Lock): Lock guarding the shared results
+        level_dir (Path): Directory of the level this subproblem belongs to
+        depth (int): Current depth
+        task_id (str): The parent task ID.
+        max_retries (int): Maximum number of retries for the subtask
+        max_parallel (int): Maximum number of parallel subtasks for nested decompositions
+        use_cache (bool): Whether the first attempt may use the persistent response cache
+        budget (Budget): Budget shared with the parent task
+        config (RunConfig): Configuration of the parent task's run
+        
+    Returns:
+        The result of the subproblem, or a failure placeholder if all retries failed
+        
+    Raises:
+        BudgetExceededError: If the shared budget is exhausted
+    """
+    subtask_dir = start_subtask(subtask_id, task_template, level_dir, depth, task_id)
+    with results_lock:
+        subtask, deps_values = describe_subtask(task_template, deps, results)
+        
+    subtask_retries = 0
+    while True:
+        try:
+            result = agent(
+                subtask, depth - 1, max_retries, max_parallel,
+                use_cache and subtask_retries == 0, inputs=deps_values, budget=budget, config=config
+            )
+            return finish_subtask(result, subtask_id, subtask_dir, depth, task_id)
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            subtask_retries += 1
+            delay, placeholder = subtask_failed(
+                e, subtask_retries, max_retries, budget, subtask_id, subtask_dir, depth, task_id
+            )
+            if placeholder is not None:
+                return placeholder
+            time.sleep(delay)
+
+
+def start_subtask(subtask_id, task_template, level_dir, depth, task_id):
+    """
+    Log the start of a subproblem and create its directory.
+    
+    Args:
+        subtask_id (str): ID of the subproblem
+        task_template (str): Description of the subproblem
+        level_dir (Path): Directory of the level this subproblem belongs to
+        depth (int): Current depth
+        task_id (str): The parent task ID.
+        
+    Returns:
+        Path: Directory of the subproblem
+    """
+    clean_task = task_template.replace('"', '\\"').replace('\n', ' ')
+    log_task(
+        f"Task {subtask_id}: {clean_task}",
+        task_id=task_id,
+        subtask_id=subtask_id,
+        depth=depth,
+        parent_id=task_id
+    )
+    
+    # Create a directory for this subtask
+    subtask_dir = level_dir / subtask_id
+    subtask_dir.mkdir(exist_ok=True)
+    return subtask_dir
+
+
+def describe_subtask(task_template, deps, results):
+    """
+    Build the task solved for a subproblem, including the results of its dependencies.
+    
+    Args:
+        task_template (str): Description of the subproblem
+        deps (list): IDs of the subproblems this one depends on
+        results (dict): Results of the subproblems solved so far
+        
+    Returns:
+        tuple: (task, deps_values) where deps_values is None without dependencies
+    """
+    if not deps:
+        return task_template, None
+        
+    deps_values = [results.get(d) for d in deps if d in results]
+    input_str = str(deps_values)
+    if len(input_str) > 100:
+        input_str = input_str[:97] + "..."
+        
+    clean_task = task_template.replace('"', '\\"').replace('\n', ' ')
+    return f"{clean_task} with inputs {input_str}", deps_values
+
+
+def finish_subtask(result, subtask_id, subtask_dir, depth, task_id):
+    """
+    Log and save the result of a solved subproblem.
+    
+    Args:
+        result: The result of the subproblem
+        subtask_id (str): ID of the subproblem
+        subtask_dir (Path): Directory of the subproblem
+        depth (int): Current depth
+        task_id (str): The parent task ID.
+        
+    Returns:
+        The result
+    """
+    log_success(
+        f"Task {subtask_id} completed successfully",
+        task_id=task_id,
+        subtask_id=subtask_id,
+        depth=depth,
+        parent_id=task_id
+    )
+    
+    # Save this result to subtask directory
+    save_json_to_file(result, subtask_dir / "result.json")
+    return result
+
+
+def subtask_failed(error, subtask_retries, max_retries, budget, subtask_id, subtask_dir, depth, task_id):
+    """
+    Record the failure of an attempt at a subproblem.
+    
+    Args:
+        error (Exception): The error of the attempt
+        subtask_retries (int): Number of failed attempts so far
+        max_retries (int): Maximum number of retries for the subtask
+        budget (Budget): Budget shared with the parent task
+        subtask_id (str): ID of the subproblem
+        subtask_dir (Path): Directory of the subproblem
+        depth (int): Current depth
+        task_id (str): The parent task ID.
+        
+    Returns:
+        tuple: (delay, placeholder) with the seconds to wait before the next attempt,
+               or the failure placeholder result once no retry is left
+    """
+    failure_class, delay = get_retry_policy().on_failure(error, subtask_retries, budget)
+    if subtask_retries <= max_retries:
+        log_warning(
+            f"ERROR IN SUBTASK {subtask_id}: {str(error)}",
+            task_id=task_id,
+            subtask_id=subtask_id,
+            depth=depth,
+            parent_id=task_id,
+            data={"failure_class": failure_class.value}
+        )
+        log_info(
+            f"RETRYING SUBTASK ({subtask_retries}/{max_retries}) IN {delay:.2f}s...",
+            task_id=task_id,
+            subtask_id=subtask_id,
+            depth=depth,
+            parent_id=task_id,
+            data={"failure_class": failure_class.value, "delay": round(delay, 2)}
+        )
+        return delay, None
+        
+    log_error(
+        f"ALL RETRIES FAILED FOR SUBTASK {subtask_id}. LAST ERROR: {str(error)}",
+        task_id=task_id,
+        subtask_id=subtask_id,
+        depth=depth,
+        parent_id=task_id
+    )
+    
+    # Save the error result and return it as a placeholder
+    placeholder = f"{FAILED_SUBTASK_PREFIX}{max_retries} retries: {str(error)}"
+    with open(subtask_dir / "error.txt", 'w') as f:
+        f.write(placeholder)
+    return None, placeholder
+
+
+def execute_simplified_subproblems(client, task, subproblems, levels, depth, aggregation_code, task_dir, task_id, max_retries=3, max_parallel=None, use_cache=True, budget=None, config=None, results=None):
     """
     A simplified execution of subproblems that avoids complex code generation.
-    This function executes each subproblem directly in sequence.
+    Subproblems are dispatched to a bounded worker pool as soon as all of their
+    dependencies have results, longest remaining dependency chain first. Nested
+    decompositions run their own pools, while their LLM calls and executions share
+    the process-wide limit of get_call_semaphore().
     
     Args:
         client: The Anthropic API client
         task (str): The main task
         subproblems (list): List of subproblems
-        levels (list): Subproblems grouped by level
+        levels (list): Subproblems grouped by level, used for the directory layout
         depth (int): Current depth
         aggregation_code (str): Code to aggregate results
         task_dir (Path): Directory for storing task-related files
         task_id (str): The task ID.
         max_retries (int): Maximum number of retries for each subtask
+        max_parallel (int): Maximum number of subtasks to run concurrently
+            (default: MAX_PARALLEL_SUBTASKS or a CPU/provider based limit)
+        use_cache (bool): Whether subtasks may use the persistent response cache
+        budget (Budget): Budget shared by all subtasks
+        config (RunConfig): Configuration of the run, shared by all subtasks
+        results (dict): Optional dict receiving the result of each subproblem by ID
         
     Returns:
         The aggregated result or the last subproblem's result
     """
     start_time = time.time()
+    if max_parallel is None:
+        max_parallel = get_max_parallel_subtasks()
+        
     log_info(
         "EXECUTING SIMPLIFIED RECURSIVE PROCESS",
         task_id=task_id,
-        depth=depth
+        depth=depth,
+        data={"max_parallel": max_parallel}
     )
     
     # Directory for subtasks
@@ -507,118 +1224,115 @@ def execute_simplified_subproblems(client, task, subproblems, levels, depth, agg
     subtasks_dir.mkdir(exist_ok=True)
     
     # Dictionary to store results for each subproblem
-    results = {}
-    results_file = task_dir / "results.json"
+    results = {} if results is None else results
+    results_lock = threading.Lock()
     
-    # Process each level sequentially
+    # Subtask directories are still grouped by dependency level
+    level_dirs = {}
     for level_index, level in enumerate(levels):
-        log_info(
-            f"PROCESSING LEVEL {level_index} WITH {len(level)} TASKS",
-            task_id=task_id,
-            depth=depth
-        )
-        level_start_time = time.time()
-        
-        # Create a directory for this level
-        level_dir = subtasks_dir / f"level_{level_index}"
-        level_dir.mkdir(exist_ok=True)
-        
-        for subtask_id, task_template, deps in level:
-            clean_task = task_template.replace('"', '\\"').replace('\n', ' ')
-            log_task(
-                f"Task {subtask_id}: {clean_task}",
-                task_id=task_id,
-                subtask_id=subtask_id,
-                depth=depth,
-                parent_id=task_id
-            )
-            
-            # Create a directory for this subtask
-            subtask_dir = level_dir / subtask_id
-            subtask_dir.mkdir(exist_ok=True)
-            
-            task_success = False
-            subtask_retries = 0
-            last_subtask_error = None
-            
-            while not task_success and subtask_retries <= max_retries:
-                try:
-                    if not deps:
-                        # No dependencies, just execute the task directly
-                        results[subtask_id] = agent(task_template, depth - 1, max_retries)
-                    else:
-                        # With dependencies, include them in the task description
-                        deps_values = [results.get(d) for d in deps if d in results]
-                        input_str = str(deps_values)
-                        if len(input_str) > 100:
-                            input_str = input_str[:97] + "..."
-                        
-                        modified_task = f"{clean_task} with inputs {input_str}"
-                        results[subtask_id] = agent(modified_task, depth - 1, max_retries)
-                    
-                    task_success = True
-                    log_success(
-                        f"Task {subtask_id} completed successfully",
-                        task_id=task_id,
-                        subtask_id=subtask_id,
-                        depth=depth,
-                        parent_id=task_id
-                    )
-                    
-                    # Save this result to subtask directory
-                    save_json_to_file(results[subtask_id], subtask_dir / "result.json")
-                except Exception as e:
-                    subtask_retries += 1
-                    last_subtask_error = e
-                    if subtask_retries <= max_retries:
-                        log_warning(
-                            f"ERROR IN SUBTASK {subtask_id}: {str(e)}",
-                            task_id=task_id,
-                            subtask_id=subtask_id,
-                            depth=depth,
-                            parent_id=task_id
-                        )
-                        log_info(
-                            f"RETRYING SUBTASK ({subtask_retries}/{max_retries})...",
-                            task_id=task_id,
-                            subtask_id=subtask_id,
-                            depth=depth,
-                            parent_id=task_id
-                        )
-                        time.sleep(1)  # Short pause before retrying
-                    else:
-                        log_error(
-                            f"ALL RETRIES FAILED FOR SUBTASK {subtask_id}. LAST ERROR: {str(e)}",
-                            task_id=task_id,
-                            subtask_id=subtask_id,
-                            depth=depth,
-                            parent_id=task_id
-                        )
-                        # Store a placeholder result
-                        results[subtask_id] = f"Failed after {max_retries} retries: {str(e)}"
-                        
-                        # Save the error result
-                        with open(subtask_dir / "error.txt", 'w') as f:
-                            f.write(f"Failed after {max_retries} retries: {str(e)}")
-                        break
+        for subtask_id, _, _ in level:
+            level_dirs[subtask_id] = subtasks_dir / f"level_{level_index}"
             
-            # Save the current state of all results after each subtask
-            save_json_to_file(results, results_file)
+    def run_subtask(subtask_id, task_template, deps):
+        level_dir = level_dirs.get(subtask_id, subtasks_dir / "level_0")
+        level_dir.mkdir(exist_ok=True)
         
-        log_info(
-            f"Level {level_index} completed in {time.time() - level_start_time:.2f}s",
-            task_id=task_id,
-            depth=depth
+        result = execute_subtask(
+            subtask_id, task_template, deps, results, results_lock,
+            level_dir, depth, task_id, max_retries, max_parallel, use_cache, budget, config
         )
+        with results_lock:
+            save_subtask_results(results, subtask_id, result, subproblems, task_dir)
+        return result
+        
+    scheduler = DAGScheduler(
+        subproblems,
+        max_workers=min(max_parallel, len(subproblems)),
+        task_id=task_id,
+        depth=depth
+    )
+    scheduler.run(run_subtask)
+    
+    return finish_subproblems(results, levels, aggregation_code, task_dir, start_time, task_id, depth)
+
+
+def save_subtask_results(results, subtask_id, result, subproblems, task_dir):
+    """
+    Add the result of a subproblem to the results of a decomposed task and save them all.
+    
+    Args:
+        results (dict): Results of the subproblems solved so far
+        subtask_id (str): ID of the solved subproblem
+        result: Its result
+        subproblems (list): List of subproblems
+        task_dir (Path): Directory of the decomposed task
+    """
+    results[subtask_id] = result
+    # Saved in decomposition order regardless of which worker finished first
+    save_json_to_file(
+        {id: results[id] for id, _, _ in subproblems if id in results},
+        task_dir / "results.json"
+    )
+
+
+def finish_subproblems(results, levels, aggregation_code, task_dir, start_time, task_id=None, depth=None):
+    """
+    Select, log and save the final result of a decomposed task once its subproblems are solved.
+    
+    Args:
+        results (dict): Results by subproblem ID
+        levels (list): Subproblems grouped by level
+        aggregation_code (str): Code to aggregate results
+        task_dir (Path): Directory of the decomposed task
+        start_time (float): Time the subproblems started
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        
+    Returns:
+        The aggregated result or the last subproblem's result
+    """
+    final_result = select_final_result(results, levels, aggregation_code, task_id, depth)
+    
+    # Log summary of results
+    log_info(
+        f"SUBTASK PROCESSING COMPLETED IN {time.time() - start_time:.2f}s",
+        task_id=task_id,
+        depth=depth
+    )
+    
+    log_info(
+        "RESULTS BY TASK ID:",
+        task_id=task_id,
+        depth=depth,
+        data={"results": {k: str(v)[:50] + ('...' if len(str(v)) > 50 else '') for k, v in results.items()}}
+    )
+    
+    # Save the final consolidated result
+    save_json_to_file(final_result, task_dir / "final_result.json")
+    
+    return final_result
+
+
+def select_final_result(results, levels, aggregation_code, task_id=None, depth=None):
+    """
+    Pick the final result of a decomposed task from the results of its subproblems.
     
-    # Get the final result
+    Args:
+        results (dict): Results by subproblem ID
+        levels (list): Subproblems grouped by level
+        aggregation_code (str): Code to aggregate results
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        
+    Returns:
+        The aggregated result or the last subproblem's result
+    """
     try:
-        # Extract the key from the aggregation code
+        # Extract the key from the aggregation code, e.g. results.get('task_3', None)
         key = None
-        if "results.get" in aggregation_code:
-            key = aggregation_code.split('"')[1]
-        elif "results[" in aggregation_code:
-            key = aggregation_code.split('[')[1].split(']')[0].strip('"\'')
+        match = re.search(r"results(?:\.get\(|\[)\s*['\"]([^'\"]+)['\"]", aggregation_code)
+        if match:
+            key = match.group(1)
         
         if key and key in results:
             final_result = results[key]
@@ -638,84 +1352,103 @@ def execute_simplified_subproblems(client, task, subproblems, levels, depth, agg
         last_task_id = last_level[-1][0]
         final_result = results.get(last_task_id)
     
-    # Log summary of results
-    log_info(
-        f"SUBTASK PROCESSING COMPLETED IN {time.time() - start_time:.2f}s",
-        task_id=task_id,
-        depth=depth
-    )
-    
-    log_info(
-        "RESULTS BY TASK ID:",
-        task_id=task_id,
-        depth=depth,
-        data={"results": {k: str(v)[:50] + ('...' if len(str(v)) > 50 else '') for k, v in results.items()}}
-    )
-    
-    # Save the final consolidated result
-    save_json_to_file(final_result, task_dir / "final_result.json")
-    
-    return final_result 
+    return final_result
 
 
-def build_dependency_levels(subproblems):
+def build_dependency_levels(subproblems, strict=False):
     """
     Build levels of task execution based on dependencies.
     
+    Uses Kahn's algorithm over prebuilt indexes, so the cost is linear in the
+    number of subproblems and dependencies. Tasks keep their decomposition
+    order within a level. Dependencies on unknown IDs are ignored. A dependency
+    cycle is reported and broken by placing its earliest task in a level of its
+    own without the dependencies that are still unresolved.
+    
     Args:
         subproblems: List of (id, template, dependencies) tuples
+        strict (bool): Raise a ValueError on a dependency cycle instead of breaking it
         
     Returns:
         List of levels, where each level is a list of tasks that can be executed in parallel
     """
-    # Initialize level map
-    level_map = {}
+    # Index tasks by ID, keeping the first occurrence of duplicated IDs
+    by_id = {}
+    order = []
+    for subproblem in subproblems:
+        if subproblem[0] not in by_id:
+            by_id[subproblem[0]] = subproblem
+            order.append(subproblem[0])
+    position = {id: index for index, id in enumerate(order)}
+    
+    # In-degree counters and reverse adjacency (dependency -> dependents)
+    in_degree = {}
+    dependents = {id: [] for id in order}
+    for id in order:
+        known_deps = set(dep for dep in by_id[id][2] if dep in by_id)
+        in_degree[id] = len(known_deps)
+        for dep in known_deps:
+            dependents[dep].append(id)
     
-    # Get all task IDs
-    all_ids = set(id for id, _, _ in subproblems)
+    levels = []
+    placed = set()
+    next_unplaced = 0
+    current_level = [id for id in order if in_degree[id] == 0]
     
-    # Create a map of task ID to its dependencies
-    dep_map = {id: set(deps) for id, _, deps in subproblems}
+    while len(placed) < len(order):
+        if current_level:
+            levels.append([by_id[id] for id in current_level])
+        else:
+            # No task is ready, so the remaining tasks contain a cycle
+            while order[next_unplaced] in placed:
+                next_unplaced += 1
+            id = order[next_unplaced]
+            cycle = find_dependency_cycle(id, by_id, placed)
+            if strict:
+                raise ValueError(f"Circular dependency detected: {' -> '.join(cycle)}")
+            log_warning(
+                f"Circular dependency detected: {' -> '.join(cycle)}. Scheduling {id} first.",
+                data={"cycle": cycle}
+            )
+            
+            # Only include dependencies that have already been placed
+            _, template, deps = by_id[id]
+            levels.append([(id, template, [dep for dep in deps if dep not in by_id or dep in placed])])
+            current_level = [id]
+        
+        placed.update(current_level)
+        next_level = []
+        for id in current_level:
+            for dependent in dependents[id]:
+                if dependent in placed:
+                    continue
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    next_level.append(dependent)
+        next_level.sort(key=position.__getitem__)
+        current_level = next_level
     
-    # Tasks with no remaining dependencies are at level 0
-    remaining = set(all_ids)
-    level = 0
+    return levels
+
+
+def find_dependency_cycle(start_id, by_id, placed):
+    """
+    Find a dependency cycle reachable from a task whose dependencies cannot be resolved.
     
-    while remaining:
-        current_level = []
-        to_remove = set()
+    Args:
+        start_id: ID of a task that is blocked by a cycle
+        by_id: Mapping of task ID to its (id, template, dependencies) tuple
+        placed: IDs of the tasks that have already been scheduled
         
-        # Find tasks with no remaining dependencies
-        for task_id in remaining:
-            # If all dependencies have been processed (not in remaining)
-            if all(dep not in remaining for dep in dep_map[task_id]):
-                task_data = None
-                for id, template, deps in subproblems:
-                    if id == task_id:
-                        task_data = (id, template, deps)
-                        break
-                
-                if task_data:
-                    current_level.append(task_data)
-                    to_remove.add(task_id)
-        
-        # Handle circular dependencies by picking an arbitrary task
-        if not current_level and remaining:
-            # Choose the first remaining task
-            task_id = next(iter(remaining))
-            for id, template, deps in subproblems:
-                if id == task_id:
-                    # Only include dependencies that are not in remaining
-                    filtered_deps = [dep for dep in deps if dep not in remaining]
-                    task_data = (id, template, filtered_deps)
-                    current_level.append(task_data)
-                    to_remove.add(task_id)
-                    break
-        
-        remaining -= to_remove
-        level_map[level] = current_level
-        level += 1
-    
-    # Convert map to list of levels
-    levels = [level_map[l] for l in range(level)]
-    return levels 
\ No newline at end of file
+    Returns:
+        list: The IDs along the cycle, starting and ending with the same ID
+    """
+    path = []
+    seen = {}
+    id = start_id
+    while id not in seen:
+        seen[id] = len(path)
+        path.append(id)
+        # Every unplaced task still has at least one unplaced known dependency
+        id = next(dep for dep in by_id[id][2] if dep in by_id and dep not in placed)
+    return path[seen[id]:] + [id]
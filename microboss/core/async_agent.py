@@ -0,0 +1,418 @@
+"""
+Asynchronous agent functionality for the microboss package.
+"""
+
+import asyncio
+import time
+import weakref
+from contextlib import nullcontext
+
+from microboss.core.agent import (
+    Attempts, prepare_run, start_task, open_result_store, log_model_info, log_stored_result, log_task_completed,
+    save_decomposition, settle_revalidation, read_code_to_fix, save_fixed_code, start_subtask,
+    describe_subtask, finish_subtask, subtask_failed, save_subtask_results, finish_subproblems,
+    structure_decomposition, get_max_parallel_subtasks, is_failed_subtask_result, get_max_concurrent_calls
+)
+from microboss.core.budget import BudgetExceededError
+from microboss.core.singleflight import AsyncSingleFlight
+from microboss.core.speculative import (
+    async_run_speculative_candidates, plan_speculative_candidates
+)
+from microboss.utils.async_api import (
+    get_async_client, async_generate_code, async_fix_code, async_decompose_task_structured
+)
+from microboss.utils.batch import async_hold_unless_batched
+from microboss.utils.execution import execute_file_async
+from microboss.utils.file_utils import create_task_directory, save_code_to_file, read_code_from_file
+from microboss.utils.logging import log_info, log_error, log_code
+
+# Semaphores are bound to the event loop they are first used in
+_semaphores = weakref.WeakKeyDictionary()
+
+# Identical async agent calls in flight at the same time share a single solve
+_async_agent_flights = AsyncSingleFlight("async_agent")
+
+
+def get_call_semaphore():
+    """
+    Get the semaphore shared by all async agents running in the current event loop.
+
+    Returns:
+        asyncio.Semaphore: The semaphore bounding concurrent LLM calls and executions.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(get_max_concurrent_calls())
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def async_agent(task, depth=1, max_retries=3, max_parallel=None, use_cache=True, inputs=None, budget=None, config=None):
+    """
+    Asynchronous entry point for the agent that solves tasks.
+
+    Sibling subtasks are awaited concurrently, and LLM calls and code executions
+    never block the event loop, so many tasks can be driven from a single loop.
+    Identical calls (same task, inputs, depth and model) running concurrently in
+    the same loop are coalesced into a single solve.
+
+    Args:
+        task (str): Task to solve.
+        depth (int): Depth of recursion.
+        max_retries (int): Maximum number of retries on code execution failure.
+        max_parallel (int): Maximum number of independent subtasks to run concurrently
+            (default: MAX_PARALLEL_SUBTASKS or a CPU/provider based limit).
+        use_cache (bool): Whether LLM responses may be served from the persistent response cache.
+            Retries always bypass the cache so they do not repeat a cached failure.
+            Also controls whether previously solved tasks are served from the result store.
+        inputs (list): Values of the dependencies the task is solved with, used to
+            key the result store.
+        budget (Budget): Budget shared by the task and all of its subtasks
+            (default: a new budget with the limits of the run configuration).
+        config (RunConfig): Settings of the run, passed to all of its subtasks, API calls
+            and executions (default: read from the environment once, here).
+
+    Returns:
+        Generated result.
+
+    Raises:
+        BudgetExceededError: If the budget is exhausted. It is never retried.
+    """
+    use_cache, config, key = prepare_run(task, inputs, depth, use_cache, config)
+    return await _async_agent_flights.do(
+        key, async_solve_task, task, depth, max_retries, max_parallel, use_cache, inputs, budget, config
+    )
+
+
+def get_async_agent_flight_stats():
+    """
+    Get how many identical in-flight async agent calls were coalesced.
+
+    Returns:
+        dict: Per-key call and coalesced counts, and the number of calls in flight
+    """
+    return _async_agent_flights.stats()
+
+
+async def async_solve_task(task, depth=1, max_retries=3, max_parallel=None, use_cache=True, inputs=None, budget=None, config=None):
+    """
+    Solve a task without coalescing it with identical in-flight calls. See solve_task().
+
+    Args:
+        See async_agent().
+
+    Returns:
+        Generated result.
+    """
+    start_time = time.time()
+    semaphore = get_call_semaphore()
+    task_id, config, budget = start_task(task, depth, max_retries, max_parallel, use_cache, budget, config, is_async=True)
+
+    # Tasks solved before are served from the result store without any LLM call
+    store, result_key = open_result_store(task, inputs, depth, use_cache, config)
+    if store:
+        stored = await async_lookup_memoized_result(store, result_key, task, task_id, depth, budget, config)
+        if stored is not None:
+            return log_stored_result(stored, store, start_time, task_id, depth)
+
+    # Create a task directory for this run
+    task_dir = create_task_directory(task)
+
+    # Get the API client
+    client, model_info = get_async_client(config.provider, config.api_key)
+    log_model_info(model_info, task_id, depth)
+
+    attempts = Attempts(max_retries, budget, task_id, depth)
+    code_file_path = None
+    # Number of candidates raced on the first attempt of a direct solution
+    candidates = plan_speculative_candidates(config.speculative_candidates, budget) if depth <= 1 else 1
+    # Number of decomposition LLM calls made for this node (one per attempt)
+    decompose_calls = 0
+
+    while attempts.retries <= max_retries:
+        retries = attempts.retries
+        try:
+            attempts.begin()
+            if depth <= 1:
+                if retries == 0 and candidates > 1:
+                    # Race several diverse candidates and keep the first that works
+                    try:
+                        code_file_path, result = await async_run_speculative_candidates(
+                            client, task, task_dir, candidates, task_id, depth, use_cache, budget, semaphore, config
+                        )
+                    finally:
+                        # If every candidate failed, the retry fixes the first one generated
+                        if (task_dir / "main.py").exists():
+                            code_file_path = task_dir / "main.py"
+                else:
+                    if retries == 0 or code_file_path is None:
+                        async with async_hold_unless_batched(semaphore, client, config):
+                            code = await async_generate_code(
+                                client, task, use_cache=use_cache and retries == 0, budget=budget, config=config,
+                                task_id=task_id, depth=depth
+                            )
+                        code_file_path = save_code_to_file(code, task_dir / "main.py")
+
+                        log_code(
+                            "GENERATED CODE",
+                            code=code,
+                            task_id=task_id,
+                            depth=depth
+                        )
+                    else:
+                        log_info(
+                            f"EDITING EXISTING FILE: {code_file_path}",
+                            task_id=task_id,
+                            depth=depth
+                        )
+                        async with semaphore:
+                            await async_fix_code_file(
+                                client, code_file_path, attempts.fix_error, task_id, depth, use_cache, budget, config
+                            )
+
+                    budget.charge_execution()
+                    async with semaphore:
+                        with budget.time_execution():
+                            result = await execute_file_async(code_file_path, task_id, depth, config)
+                if store:
+                    store.set(result_key, task, depth, result, read_code_from_file(code_file_path))
+            else:
+                async with semaphore:
+                    subproblems, levels, aggregation_code = await async_decompose_complex_task(
+                        client, task, depth, task_id, use_cache=use_cache and retries == 0, budget=budget, config=config
+                    )
+                decompose_calls += 1
+                save_decomposition(task_dir, subproblems, levels, aggregation_code)
+
+                subtask_results = {}
+                result = await execute_subproblems_async(
+                    subproblems, levels, depth, aggregation_code, task_dir, task_id,
+                    max_retries, max_parallel, use_cache and retries == 0, budget, config, subtask_results
+                )
+                # A result built from failed subtasks must be solved again next time
+                if store and not any(map(is_failed_subtask_result, subtask_results.values())):
+                    store.set(result_key, task, depth, result)
+
+            return log_task_completed(result, start_time, task_id, depth, decompose_calls, budget)
+        except BudgetExceededError:
+            # Retrying cannot help once the budget is spent, fail the whole tree
+            raise
+        except Exception as e:
+            delay = attempts.failed(e)
+            if delay is None:
+                break
+            # Code errors go straight to the fix call, provider errors back off
+            await asyncio.sleep(delay)
+
+    return attempts.give_up()
+
+
+async def async_lookup_memoized_result(store, key, task, task_id=None, depth=None, budget=None, config=None):
+    """
+    Look up a previously solved task, re-executing its stored code if the store
+    is configured to re-validate results.
+
+    Args:
+        store (ResultStore): The result store
+        key (str): Key of the task in the store
+        task (str): The task, used to name the re-validation directory
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        budget: Optional Budget charged for the re-validation execution
+        config: Optional RunConfig of the run
+
+    Returns:
+        dict: {"code": ..., "result": ...}, or None if the task must be solved again
+    """
+    stored = store.get(key)
+    if stored is None or not store.revalidate or not stored["code"]:
+        return stored
+
+    if budget:
+        budget.charge_execution()
+    try:
+        code_file_path = save_code_to_file(stored["code"], create_task_directory(task) / "main.py")
+        async with get_call_semaphore():
+            with budget.time_execution() if budget else nullcontext():
+                result = await execute_file_async(code_file_path, task_id, depth, config)
+    except Exception as e:
+        return settle_revalidation(store, key, task, depth, stored, error=e, task_id=task_id)
+    return settle_revalidation(store, key, task, depth, stored, result, task_id=task_id)
+
+
+async def async_fix_code_file(client, file_path, error, task_id=None, depth=None, use_cache=True, budget=None, config=None):
+    """
+    Fix code in a file based on the error using the async AI API.
+
+    Args:
+        client: Async API client
+        file_path: Path to the file to fix
+        error: The error, or its message
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        use_cache: Whether to use the persistent response cache
+        budget: Optional Budget charged for the LLM call
+        config: Optional RunConfig of the run
+
+    Returns:
+        The fixed code
+    """
+    code, error = read_code_to_fix(file_path, error, task_id, depth)
+    try:
+        fixed_code = await async_fix_code(
+            client, code, error, use_cache=use_cache, budget=budget, config=config, task_id=task_id, depth=depth
+        )
+        return save_fixed_code(fixed_code, file_path, task_id, depth)
+    except Exception as e:
+        log_error(
+            f"ERROR FIXING CODE: {e}",
+            task_id=task_id,
+            depth=depth
+        )
+        raise
+
+
+async def async_decompose_complex_task(client, task, depth, task_id, use_cache=True, budget=None, config=None):
+    """
+    Decomposes a task into subproblems with dependencies using the async AI API.
+
+    Args:
+        See decompose_complex_task().
+
+    Returns:
+        tuple: (subproblems, levels, aggregation_code)
+    """
+    start_time = time.time()
+    log_info(
+        f"DECOMPOSING TASK: '{task}' AT DEPTH {depth}",
+        task_id=task_id,
+        depth=depth
+    )
+
+    # Get the subtasks, their dependencies and the aggregation key in one call
+    result = await async_decompose_task_structured(
+        client, task, depth, use_cache=use_cache, budget=budget, config=config, task_id=task_id
+    )
+
+    return structure_decomposition(result, task, depth, task_id, start_time)
+
+
+async def execute_subtask_async(subtask_id, task_template, deps, results, level_dir, depth, task_id, max_retries=3, max_parallel=None, use_cache=True, budget=None, config=None):
+    """
+    Execute a single subproblem with retries using the async agent.
+
+    Args:
+        subtask_id (str): ID of the subproblem
+        task_template (str): Description of the subproblem
+        deps (list): IDs of the subproblems this one depends on
+        results (dict): Results of the subproblems solved so far
+        level_dir (Path): Directory of the level this subproblem belongs to
+        depth (int): Current depth
+        task_id (str): The parent task ID.
+        max_retries (int): Maximum number of retries for the subtask
+        max_parallel (int): Maximum number of parallel subtasks for nested decompositions
+        use_cache (bool): Whether the first attempt may use the persistent response cache
+        budget (Budget): Budget shared with the parent task
+        config (RunConfig): Configuration of the parent task's run
+
+    Returns:
+        The result of the subproblem, or a failure placeholder if all retries failed
+
+    Raises:
+        BudgetExceededError: If the shared budget is exhausted
+    """
+    subtask_dir = start_subtask(subtask_id, task_template, level_dir, depth, task_id)
+    subtask, deps_values = describe_subtask(task_template, deps, results)
+
+    subtask_retries = 0
+    while True:
+        try:
+            result = await async_agent(
+                subtask, depth - 1, max_retries, max_parallel,
+                use_cache and subtask_retries == 0, inputs=deps_values, budget=budget, config=config
+            )
+            return finish_subtask(result, subtask_id, subtask_dir, depth, task_id)
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            subtask_retries += 1
+            delay, placeholder = subtask_failed(
+                e, subtask_retries, max_retries, budget, subtask_id, subtask_dir, depth, task_id
+            )
+            if placeholder is not None:
+                return placeholder
+            await asyncio.sleep(delay)
+
+
+async def execute_subproblems_async(subproblems, levels, depth, aggregation_code, task_dir, task_id, max_retries=3, max_parallel=None, use_cache=True, budget=None, config=None, results=None):
+    """
+    Execute subproblems concurrently, each one starting as soon as its dependencies are solved.
+
+    Args:
+        subproblems (list): List of subproblems
+        levels (list): Subproblems grouped by level
+        depth (int): Current depth
+        aggregation_code (str): Code to aggregate results
+        task_dir (Path): Directory for storing task-related files
+        task_id (str): The task ID.
+        max_retries (int): Maximum number of retries for each subtask
+        max_parallel (int): Maximum number of subtasks to run concurrently
+        use_cache (bool): Whether subtasks may use the persistent response cache
+        budget (Budget): Budget shared by all subtasks
+        config (RunConfig): Configuration of the run, shared by all subtasks
+        results (dict): Optional dict receiving the result of each subproblem by ID
+
+    Returns:
+        The aggregated result or the last subproblem's result
+    """
+    start_time = time.time()
+    if max_parallel is None:
+        max_parallel = get_max_parallel_subtasks()
+
+    log_info(
+        "EXECUTING ASYNC RECURSIVE PROCESS",
+        task_id=task_id,
+        depth=depth,
+        data={"max_parallel": max_parallel}
+    )
+
+    subtasks_dir = task_dir / "subtasks"
+    subtasks_dir.mkdir(exist_ok=True)
+
+    results = {} if results is None else results
+    semaphore = asyncio.Semaphore(max_parallel)
+    pending = {}
+
+    async def run_subtask(subtask_id, task_template, deps, level_dir):
+        # Levels are built so that dependencies always belong to an earlier level
+        dep_tasks = [pending[d] for d in deps if d in pending]
+        if dep_tasks:
+            await asyncio.gather(*dep_tasks)
+
+        async with semaphore:
+            result = await execute_subtask_async(
+                subtask_id, task_template, deps, results, level_dir,
+                depth, task_id, max_retries, max_parallel, use_cache, budget, config
+            )
+
+        save_subtask_results(results, subtask_id, result, subproblems, task_dir)
+        return result
+
+    for level_index, level in enumerate(levels):
+        level_dir = subtasks_dir / f"level_{level_index}"
+        level_dir.mkdir(exist_ok=True)
+        for subtask_id, task_template, deps in level:
+            pending[subtask_id] = asyncio.ensure_future(
+                run_subtask(subtask_id, task_template, deps, level_dir)
+            )
+
+    try:
+        await asyncio.gather(*pending.values())
+    except BaseException:
+        # Do not leave sibling subtasks running once one of them failed the tree
+        for pending_task in pending.values():
+            pending_task.cancel()
+        raise
+
+    return finish_subproblems(results, levels, aggregation_code, task_dir, start_time, task_id, depth)
@@ -0,0 +1,242 @@
+"""
+Retry and cost budget shared across the recursion tree of a task.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from microboss.utils.logging import log_error, log_warning
+
+
+class BudgetExceededError(Exception):
+    """Raised when a task has used up its budget. It is never retried."""
+
+    def __init__(self, message, usage=None):
+        super().__init__(message)
+        self.usage = usage or {}
+
+
+class Budget:
+    """
+    Limits on the LLM calls, tokens, wall-clock time and code executions of a task
+    and all of its subtasks. A limit of None means unlimited.
+
+    A single budget is passed down the whole recursion, so every retry loop at every
+    depth consumes from it, and it fails fast with BudgetExceededError once exhausted.
+    A budget with a parent also charges everything to the parent, so part of the
+    work can be measured and capped separately without escaping the overall limits.
+
+    The budget also accounts for what the task tree used: tokens by kind, estimated
+    cost, time spent waiting on the model and executing code, and calls per purpose.
+    """
+
+    def __init__(self, max_llm_calls=None, max_tokens=None, max_seconds=None, max_executions=None, parent=None):
+        self.max_llm_calls = max_llm_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.max_executions = max_executions
+        self.start_time = time.time()
+        self.llm_calls = 0
+        self.tokens = 0
+        self.executions = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.llm_seconds = 0.0
+        self.execution_seconds = 0.0
+        self.cache_hits = 0
+        self.purposes = {}
+        self.parent = parent
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a budget from the MICROBOSS_MAX_LLM_CALLS, MICROBOSS_MAX_TOKENS,
+        MICROBOSS_MAX_SECONDS and MICROBOSS_MAX_EXECUTIONS environment variables.
+
+        Returns:
+            Budget: The budget, unlimited for every variable that is not set
+        """
+        return cls(
+            max_llm_calls=_get_limit_env("MICROBOSS_MAX_LLM_CALLS", int),
+            max_tokens=_get_limit_env("MICROBOSS_MAX_TOKENS", int),
+            max_seconds=_get_limit_env("MICROBOSS_MAX_SECONDS", float),
+            max_executions=_get_limit_env("MICROBOSS_MAX_EXECUTIONS", int)
+        )
+
+    def elapsed(self):
+        """
+        Get the wall-clock time spent since the budget was created.
+
+        Returns:
+            float: Elapsed seconds
+        """
+        return time.time() - self.start_time
+
+    def remaining_seconds(self):
+        """
+        Get the wall-clock time left.
+
+        Returns:
+            float: Seconds left, or None if time is unlimited
+        """
+        remaining = None
+        if self.max_seconds is not None:
+            remaining = max(0.0, self.max_seconds - self.elapsed())
+        parent_remaining = self.parent.remaining_seconds() if self.parent else None
+        if parent_remaining is not None:
+            remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def usage(self):
+        """
+        Get the budget consumed so far.
+
+        Returns:
+            dict: Used amounts and limits
+        """
+        return {
+            "llm_calls": self.llm_calls,
+            "max_llm_calls": self.max_llm_calls,
+            "tokens": self.tokens,
+            "max_tokens": self.max_tokens,
+            "elapsed": round(self.elapsed(), 2),
+            "max_seconds": self.max_seconds,
+            "executions": self.executions,
+            "max_executions": self.max_executions,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost": round(self.cost, 6),
+            "llm_seconds": round(self.llm_seconds, 2),
+            "execution_seconds": round(self.execution_seconds, 2),
+            "cache_hits": self.cache_hits,
+            "purposes": {purpose: dict(entry) for purpose, entry in self.purposes.items()}
+        }
+
+    def check(self):
+        """
+        Fail if the budget is exhausted.
+
+        Raises:
+            BudgetExceededError: If any limit has been reached
+        """
+        with self._lock:
+            self._check()
+        if self.parent:
+            self.parent.check()
+
+    def charge_llm_call(self):
+        """
+        Consume one LLM call, failing if no calls, tokens or time are left.
+
+        Raises:
+            BudgetExceededError: If the call would exceed the budget
+        """
+        with self._lock:
+            self._check(self.max_llm_calls is not None and self.llm_calls >= self.max_llm_calls, "LLM calls")
+            if self.parent:
+                self.parent.charge_llm_call()
+            self.llm_calls += 1
+
+    def charge_tokens(self, tokens):
+        """
+        Record the tokens used by a completed LLM call. Overruns are detected by the next check.
+
+        Args:
+            tokens (int): Input and output tokens of the call
+        """
+        with self._lock:
+            self.tokens += tokens or 0
+        if self.parent:
+            self.parent.charge_tokens(tokens)
+
+    def record_llm_call(self, purpose, usage, latency, cost=0.0):
+        """
+        Record a completed LLM call: its tokens count against the budget, and its
+        usage, latency and cost are added to the accounting.
+
+        Args:
+            purpose (str): What the call was for (e.g. "generate code")
+            usage (Usage): Tokens used by the call
+            latency (float): Seconds spent waiting on the model
+            cost (float): Estimated cost in USD
+        """
+        with self._lock:
+            self.tokens += usage.total
+            self.input_tokens += usage.input_tokens
+            self.output_tokens += usage.output_tokens
+            self.cached_tokens += usage.cached_tokens
+            self.cost += cost
+            self.llm_seconds += latency
+            entry = self.purposes.setdefault(purpose, {"calls": 0, "tokens": 0, "output_tokens": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["tokens"] += usage.total
+            entry["output_tokens"] += usage.output_tokens
+            entry["seconds"] = round(entry["seconds"] + latency, 3)
+        if self.parent:
+            self.parent.record_llm_call(purpose, usage, latency, cost)
+
+    def record_cache_hit(self):
+        """Record an LLM call served by the response cache."""
+        with self._lock:
+            self.cache_hits += 1
+        if self.parent:
+            self.parent.record_cache_hit()
+
+    @contextmanager
+    def time_execution(self):
+        """Add the time spent in the block to the time spent executing code."""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self._add_execution_seconds(time.time() - start_time)
+
+    def _add_execution_seconds(self, seconds):
+        with self._lock:
+            self.execution_seconds += seconds
+        if self.parent:
+            self.parent._add_execution_seconds(seconds)
+
+    def charge_execution(self):
+        """
+        Consume one code execution, failing if no executions or time are left.
+
+        Raises:
+            BudgetExceededError: If the execution would exceed the budget
+        """
+        with self._lock:
+            self._check(self.max_executions is not None and self.executions >= self.max_executions, "code executions")
+            if self.parent:
+                self.parent.charge_execution()
+            self.executions += 1
+
+    def _check(self, exhausted=False, resource=None):
+        if not exhausted:
+            if self.max_tokens is not None and self.tokens >= self.max_tokens:
+                exhausted, resource = True, "tokens"
+            elif self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+                exhausted, resource = True, "wall-clock seconds"
+            elif self.max_llm_calls is not None and self.llm_calls > self.max_llm_calls:
+                exhausted, resource = True, "LLM calls"
+        if exhausted:
+            usage = self.usage()
+            log_error(f"BUDGET EXCEEDED: NO {resource.upper()} LEFT", data=usage)
+            raise BudgetExceededError(f"Budget exceeded: no {resource} left ({usage})", usage)
+
+
+def _get_limit_env(name, cast):
+    """Read an optional limit from the environment."""
+    value = os.environ.get(name)
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        log_warning(f"Invalid {name} value: {value}. Ignoring this limit.")
+        return None
@@ -0,0 +1,109 @@
+"""
+Per-run configuration of the agent for the microboss package.
+"""
+
+import os
+from collections import namedtuple
+
+from microboss.core.budget import Budget
+from microboss.core.speculative import get_speculative_candidates
+from microboss.utils.api import get_default_model, get_max_tokens
+from microboss.utils.batch import is_batch_mode
+from microboss.utils.execution import get_execution_timeout
+from microboss.utils.hedging import get_hedge_model, get_hedge_provider, is_hedging_enabled
+from microboss.utils.patch import get_fix_mode
+from microboss.utils.rate_limit import get_rate_limits
+from microboss.utils.streaming import is_streaming_enabled
+from microboss.utils.validation import is_validation_enabled
+
+
+class RunConfig(namedtuple("RunConfig", [
+    "model", "max_tokens", "provider", "use_cache", "execution_timeout",
+    "max_llm_calls", "max_total_tokens", "max_seconds", "max_executions",
+    "batch", "rate_limits", "streaming", "fix_mode", "hedge", "hedge_provider", "hedge_model",
+    "validation", "speculative_candidates", "api_key"
+])):
+    """
+    Settings of a single run, fixed when the run starts and passed down its whole
+    recursion, to every API call and every execution.
+
+    Reading them once instead of from the environment on every call means runs with
+    different settings can share a process: the environment only provides defaults.
+
+    Attributes:
+        model (str): Model every LLM call of the run is made with
+        max_tokens (int): Output token limit of each LLM call
+        provider (str): Provider backend name, or None to select it from the API keys
+        use_cache (bool): Whether responses and results may be reused from earlier runs
+        execution_timeout (float): Run time limit of generated code in seconds, or None
+        max_llm_calls (int): LLM call limit of the run's budget, or None
+        max_total_tokens (int): Token limit of the run's budget, or None
+        max_seconds (float): Wall-clock limit of the run's budget, or None
+        max_executions (int): Code execution limit of the run's budget, or None
+        batch (bool): Whether code generation requests are submitted as provider batch jobs
+        rate_limits (dict): Requests and tokens per minute of each provider and model, see get_rate_limits()
+        streaming (bool): Whether generated and fixed code is streamed
+        fix_mode (str): "patch" to fix code with targeted edits, or "full" to ask for the whole fixed file
+        hedge (bool): Whether slow LLM calls are hedged
+        hedge_provider (str): Provider hedge requests are sent to, or None for the fallback provider
+        hedge_model (str): Model of the hedge requests, or None for the model of the run
+        validation (bool): Whether generated code is validated before it is executed
+        speculative_candidates (int): Candidates raced on the first attempt of a direct solution
+        api_key (str): API key of the provider, or None to read it from the provider's environment variable
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        # The API key is never shown, e.g. in logs
+        return super(RunConfig, self._replace(api_key="***" if self.api_key else None)).__repr__()
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Create a run configuration from the environment.
+
+        Args:
+            **overrides: Settings replacing their environment value, those given as None are ignored
+
+        Returns:
+            RunConfig: The configuration
+        """
+        limits = Budget.from_env()
+        provider = overrides.get("provider") or os.environ.get("MICROBOSS_PROVIDER") or None
+        config = cls(
+            model=get_default_model(provider),
+            max_tokens=get_max_tokens(),
+            provider=provider,
+            use_cache=True,
+            execution_timeout=get_execution_timeout(),
+            max_llm_calls=limits.max_llm_calls,
+            max_total_tokens=limits.max_tokens,
+            max_seconds=limits.max_seconds,
+            max_executions=limits.max_executions,
+            batch=is_batch_mode(),
+            rate_limits=get_rate_limits(),
+            streaming=is_streaming_enabled(),
+            fix_mode=get_fix_mode(),
+            hedge=is_hedging_enabled(),
+            hedge_provider=get_hedge_provider(),
+            hedge_model=get_hedge_model(),
+            validation=is_validation_enabled(),
+            speculative_candidates=get_speculative_candidates(),
+            api_key=None
+        )
+        return config._replace(**{name: value for name, value in overrides.items() if value is not None})
+
+    def make_budget(self):
+        """
+        Create a budget with the limits of the run.
+
+        Returns:
+            Budget: A new budget
+        """
+        return Budget(
+            max_llm_calls=self.max_llm_calls,
+            max_tokens=self.max_total_tokens,
+            max_seconds=self.max_seconds,
+            max_executions=self.max_executions
+        )
@@ -0,0 +1,202 @@
+"""
+Failure classification and retry policy for the microboss package.
+"""
+
+import os
+import random
+import threading
+from enum import Enum
+
+from microboss.utils.execution import ExecutionError, ExecutionTimeoutError
+from microboss.utils.logging import log_warning
+
+# Markers of a generated file that failed to compile
+SYNTAX_ERROR_MARKERS = ("SyntaxError", "IndentationError", "TabError")
+
+
+class FailureClass(Enum):
+    """Kinds of failure, each handled differently by the retry policy."""
+    PROVIDER_TRANSIENT = "provider_transient"
+    PROVIDER_RATE_LIMIT = "provider_rate_limit"
+    CODE_RUNTIME = "code_runtime"
+    CODE_SYNTAX = "code_syntax"
+    TIMEOUT = "timeout"
+    UNKNOWN = "unknown"
+
+
+# Failures of the generated code are deterministic: waiting does not help, fixing does
+CODE_FAILURE_CLASSES = {FailureClass.CODE_RUNTIME, FailureClass.CODE_SYNTAX, FailureClass.TIMEOUT}
+
+
+def _error_chain(error):
+    """Yield an error and the errors it was raised from or while handling."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def classify_error(error):
+    """
+    Classify a failure by walking the error and the errors it was raised from.
+
+    Args:
+        error (Exception): The failure
+
+    Returns:
+        FailureClass: The class of the failure
+    """
+    for err in _error_chain(error):
+        if isinstance(err, ExecutionTimeoutError):
+            return FailureClass.TIMEOUT
+        if isinstance(err, ExecutionError):
+            if any(marker in err.stderr for marker in SYNTAX_ERROR_MARKERS):
+                return FailureClass.CODE_SYNTAX
+            return FailureClass.CODE_RUNTIME
+        if isinstance(err, SyntaxError):
+            return FailureClass.CODE_SYNTAX
+
+        # Anthropic and OpenAI errors share their names and status codes
+        status_code = getattr(err, "status_code", None)
+        if status_code == 429:
+            return FailureClass.PROVIDER_RATE_LIMIT
+        if isinstance(status_code, int) and (status_code >= 500 or status_code in (408, 409)):
+            return FailureClass.PROVIDER_TRANSIENT
+        if type(err).__name__ in ("APIConnectionError", "APITimeoutError") or isinstance(err, (ConnectionError, TimeoutError)):
+            return FailureClass.PROVIDER_TRANSIENT
+    return FailureClass.UNKNOWN
+
+
+def get_retry_after(error):
+    """
+    Get the delay requested by the provider in a rate-limit response.
+
+    Args:
+        error (Exception): The failure
+
+    Returns:
+        float: Seconds to wait, or None if the provider did not say
+    """
+    for err in _error_chain(error):
+        headers = getattr(getattr(err, "response", None), "headers", None)
+        if not headers:
+            continue
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            # HTTP-date values are not worth parsing, fall back to backoff
+            return None
+    return None
+
+
+class RetryPolicy:
+    """
+    Decides how long to wait before retrying a failure.
+
+    Provider failures back off exponentially with jitter, rate limits honour the
+    provider's retry-after, and failures of the generated code are retried
+    immediately so the fix call is not delayed. Failures are counted per class.
+    """
+
+    def __init__(self, base_delay=1.0, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counts = {failure_class.value: 0 for failure_class in FailureClass}
+        self._lock = threading.Lock()
+
+    def delay(self, failure_class, attempt, error=None):
+        """
+        Get the delay before a retry.
+
+        Args:
+            failure_class (FailureClass): The class of the failure
+            attempt (int): Number of the retry about to be made, starting at 1
+            error (Exception): The failure, used to read the provider's retry-after
+
+        Returns:
+            float: Seconds to wait
+        """
+        if failure_class in CODE_FAILURE_CLASSES:
+            return 0.0
+        if failure_class == FailureClass.UNKNOWN:
+            return self.base_delay
+
+        if failure_class == FailureClass.PROVIDER_RATE_LIMIT:
+            retry_after = get_retry_after(error) if error is not None else None
+            if retry_after is not None:
+                return retry_after + random.uniform(0, self.base_delay)
+
+        # Exponential backoff with equal jitter
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def on_failure(self, error, attempt, budget=None):
+        """
+        Classify and count a failure and get the delay before retrying it.
+
+        Args:
+            error (Exception): The failure
+            attempt (int): Number of the retry about to be made, starting at 1
+            budget (Budget): Optional budget whose remaining time bounds the delay
+
+        Returns:
+            tuple: (failure_class, delay) where delay is in seconds
+        """
+        failure_class = classify_error(error)
+        with self._lock:
+            self.counts[failure_class.value] += 1
+
+        delay = self.delay(failure_class, attempt, error)
+        remaining = budget.remaining_seconds() if budget else None
+        if remaining is not None:
+            delay = min(delay, remaining)
+        return failure_class, delay
+
+    def stats(self):
+        """
+        Get the failure counters.
+
+        Returns:
+            dict: Number of failures seen per class
+        """
+        with self._lock:
+            return dict(self.counts)
+
+
+_retry_policy = None
+_retry_policy_lock = threading.Lock()
+
+
+def _get_float_env(name, default):
+    """Read a float from the environment, falling back to a default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        log_warning(f"Invalid {name} value: {value}. Using default {default}.")
+        return default
+
+
+def get_retry_policy():
+    """
+    Get the process-wide retry policy, configured with MICROBOSS_RETRY_BASE_DELAY
+    and MICROBOSS_RETRY_MAX_DELAY.
+
+    Returns:
+        RetryPolicy: The retry policy
+    """
+    global _retry_policy
+
+    with _retry_policy_lock:
+        if _retry_policy is None:
+            _retry_policy = RetryPolicy(
+                base_delay=_get_float_env("MICROBOSS_RETRY_BASE_DELAY", 1.0),
+                max_delay=_get_float_env("MICROBOSS_RETRY_MAX_DELAY", 30.0)
+            )
+        return _retry_policy
@@ -0,0 +1,187 @@
+"""
+Dependency-driven scheduling of subproblems for the microboss package.
+"""
+
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from microboss.utils.logging import log_info, log_warning
+
+
+def compute_critical_path_priorities(subproblems):
+    """
+    Compute the length of the longest chain of dependents starting at each subproblem.
+
+    Args:
+        subproblems: List of (id, template, dependencies) tuples
+
+    Returns:
+        dict: Mapping of subproblem ID to the number of subproblems on the longest
+              remaining chain starting at it (1 for subproblems nothing depends on)
+    """
+    ids = [id for id, _, _ in subproblems]
+    known = set(ids)
+    dependents = {id: [] for id in ids}
+    in_degree = {id: 0 for id in ids}
+    for id, _, deps in subproblems:
+        for dep in set(deps):
+            if dep in known and dep != id:
+                dependents[dep].append(id)
+                in_degree[id] += 1
+
+    # Topological order (Kahn); nodes left over are part of a cycle
+    order = [id for id in ids if in_degree[id] == 0]
+    for id in order:
+        for dependent in dependents[id]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                order.append(dependent)
+
+    priorities = {id: 1 for id in ids}
+    for id in reversed(order):
+        for dependent in dependents[id]:
+            priorities[id] = max(priorities[id], priorities[dependent] + 1)
+    return priorities
+
+
+class DAGScheduler:
+    """
+    Ready-queue scheduler that dispatches a subproblem as soon as all of its
+    dependencies have results, instead of waiting for a whole level to finish.
+
+    Ready subproblems are dispatched in order of their critical path priority
+    (longest remaining chain first), falling back to decomposition order.
+    """
+
+    def __init__(self, subproblems, max_workers, task_id=None, depth=None):
+        """
+        Args:
+            subproblems: List of (id, template, dependencies) tuples
+            max_workers (int): Maximum number of subproblems executed concurrently
+            task_id: Optional task ID for logging
+            depth: Optional depth for logging
+        """
+        self.subproblems = list(subproblems)
+        self.max_workers = max(1, max_workers)
+        self.task_id = task_id
+        self.depth = depth
+        self.priorities = compute_critical_path_priorities(self.subproblems)
+        self.stats = {}
+
+    def run(self, execute):
+        """
+        Execute all subproblems.
+
+        Args:
+            execute: Callable taking (subtask_id, template, deps) and returning the result
+
+        Returns:
+            dict: Mapping of subproblem ID to result
+        """
+        start_time = time.time()
+        order = {id: index for index, (id, _, _) in enumerate(self.subproblems)}
+        by_id = {id: (id, template, deps) for id, template, deps in self.subproblems}
+
+        dependents = {id: [] for id in by_id}
+        waiting_on = {}
+        for id, _, deps in self.subproblems:
+            pending_deps = set(dep for dep in deps if dep in by_id and dep != id)
+            waiting_on[id] = pending_deps
+            for dep in pending_deps:
+                dependents[dep].append(id)
+
+        ready = []
+        ready_since = {}
+
+        def make_ready(id, now):
+            ready_since[id] = now
+            heapq.heappush(ready, (-self.priorities[id], order[id], id))
+
+        for id in by_id:
+            if not waiting_on[id]:
+                make_ready(id, start_time)
+
+        results = {}
+        running = {}
+        queue_waits = {}
+        idle_worker_time = 0.0
+        max_queue_depth = 0
+        cycles_broken = 0
+        last_tick = start_time
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(results) < len(by_id):
+                now = time.time()
+                idle_worker_time += (self.max_workers - len(running)) * (now - last_tick)
+                last_tick = now
+
+                if not ready and not running:
+                    # Only a dependency cycle can leave tasks with nothing to run;
+                    # break it by dispatching the earliest remaining task
+                    id = min((id for id in by_id if id not in results), key=order.get)
+                    log_warning(
+                        f"Circular dependency detected involving {id}. Dispatching it without "
+                        f"waiting for {sorted(waiting_on[id])}",
+                        task_id=self.task_id,
+                        depth=self.depth
+                    )
+                    waiting_on[id] = set()
+                    cycles_broken += 1
+                    make_ready(id, now)
+
+                max_queue_depth = max(max_queue_depth, len(ready))
+
+                while ready and len(running) < self.max_workers:
+                    _, _, id = heapq.heappop(ready)
+                    queue_waits[id] = now - ready_since[id]
+                    subtask_id, template, deps = by_id[id]
+                    log_info(
+                        f"DISPATCHING {subtask_id} (PRIORITY {self.priorities[id]})",
+                        task_id=self.task_id,
+                        subtask_id=subtask_id,
+                        depth=self.depth,
+                        data={
+                            "priority": self.priorities[id],
+                            "queue_wait": round(queue_waits[id], 4),
+                            "running": len(running) + 1,
+                            "ready": len(ready)
+                        }
+                    )
+                    running[executor.submit(execute, subtask_id, template, deps)] = id
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+                now = time.time()
+                idle_worker_time += (self.max_workers - len(running)) * (now - last_tick)
+                last_tick = now
+
+                for future in done:
+                    id = running.pop(future)
+                    results[id] = future.result()
+                    for dependent in dependents[id]:
+                        if id in waiting_on[dependent]:
+                            waiting_on[dependent].discard(id)
+                            if not waiting_on[dependent] and dependent not in results and dependent not in ready_since:
+                                make_ready(dependent, now)
+
+        elapsed = time.time() - start_time
+        self.stats = {
+            "tasks": len(by_id),
+            "max_workers": self.max_workers,
+            "elapsed": round(elapsed, 4),
+            "total_queue_wait": round(sum(queue_waits.values()), 4),
+            "max_queue_wait": round(max(queue_waits.values(), default=0.0), 4),
+            "idle_worker_time": round(idle_worker_time, 4),
+            "worker_utilization": round(1 - idle_worker_time / (elapsed * self.max_workers), 4) if elapsed > 0 else 1.0,
+            "max_queue_depth": max_queue_depth,
+            "cycles_broken": cycles_broken,
+            "critical_path_length": max(self.priorities.values(), default=0)
+        }
+        log_info(
+            "SCHEDULER STATS",
+            task_id=self.task_id,
+            depth=self.depth,
+            data=self.stats
+        )
+        return results
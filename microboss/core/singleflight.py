@@ -0,0 +1,172 @@
+"""
+Single-flight deduplication of identical concurrent requests for the microboss package.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+from microboss.utils.logging import log_info
+
+# Number of keys whose coalescing counters are kept for inspection
+MAX_TRACKED_KEYS = 1000
+
+
+class _Call:
+    """An in-flight call whose outcome is shared by all of its waiters."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _FlightStats:
+    """Per-key counters of calls and coalesced calls, bounded to the most recent keys."""
+
+    def __init__(self):
+        self._stats = OrderedDict()
+
+    def record(self, key, coalesced):
+        entry = self._stats.pop(key, None) or {"calls": 0, "coalesced": 0}
+        entry["calls"] += 1
+        if coalesced:
+            entry["coalesced"] += 1
+        self._stats[key] = entry
+        while len(self._stats) > MAX_TRACKED_KEYS:
+            self._stats.popitem(last=False)
+        return entry
+
+    def snapshot(self):
+        return {key: dict(entry) for key, entry in self._stats.items()}
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls made from different threads: while a call
+    for a key is running, later calls for the same key wait for it and receive its
+    result, or its exception, instead of running again.
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = _FlightStats()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) unless a call with the same key is already running.
+
+        Args:
+            key (str): Key identifying identical calls
+            func: The callable to run
+
+        Returns:
+            The result of the call that ran for this key
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            coalesced = call is not None
+            if coalesced:
+                call.waiters += 1
+            else:
+                call = _Call()
+                self._calls[key] = call
+            entry = self._stats.record(key, coalesced)
+
+        if coalesced:
+            log_info(
+                f"COALESCED IDENTICAL IN-FLIGHT REQUEST ({self.name})",
+                data={"key": key[:16], "waiters": call.waiters, **entry}
+            )
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """
+        Get the coalescing counters.
+
+        Returns:
+            dict: Mapping of key to {"calls": ..., "coalesced": ...} for the most recent keys,
+                  and the keys currently in flight under "in_flight"
+        """
+        with self._lock:
+            return {"keys": self._stats.snapshot(), "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent coroutine calls running in the same event loop.
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._calls = {}
+        self._stats = _FlightStats()
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs) unless a call with the same key is already running.
+
+        Args:
+            key (str): Key identifying identical calls
+            func: The coroutine function to run
+
+        Returns:
+            The result of the call that ran for this key
+        """
+        # Futures belong to a loop, so identical calls are only coalesced within one loop
+        flight_key = (id(asyncio.get_running_loop()), key)
+        future = self._calls.get(flight_key)
+        coalesced = future is not None
+        entry = self._stats.record(key, coalesced)
+
+        if coalesced:
+            log_info(
+                f"COALESCED IDENTICAL IN-FLIGHT REQUEST ({self.name})",
+                data={"key": key[:16], **entry}
+            )
+            # Shield the shared call so a cancelled waiter does not cancel it for the others
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(func(*args, **kwargs))
+        self._calls[flight_key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                del self._calls[flight_key]
+            else:
+                future.add_done_callback(lambda _: self._release(flight_key, future))
+
+    def _release(self, flight_key, future):
+        """Forget a call that finished after all of its waiters were cancelled."""
+        self._calls.pop(flight_key, None)
+        if not future.cancelled():
+            # Mark the exception as retrieved, nobody is left to await it
+            future.exception()
+
+    def stats(self):
+        """
+        Get the coalescing counters.
+
+        Returns:
+            dict: Mapping of key to {"calls": ..., "coalesced": ...} for the most recent keys,
+                  and the keys currently in flight under "in_flight"
+        """
+        return {"keys": self._stats.snapshot(), "in_flight": len(self._calls)}
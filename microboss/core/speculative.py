@@ -0,0 +1,358 @@
+"""
+Speculative multi-candidate code generation for the microboss package.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from microboss.core.budget import Budget, BudgetExceededError
+from microboss.utils.api import generate_code
+from microboss.utils.async_api import async_generate_code
+from microboss.utils.batch import hold_unless_batched, async_hold_unless_batched
+from microboss.utils.execution import execute_file, execute_file_async, ExecutionCancelledError
+from microboss.utils.file_utils import save_code_to_file, read_code_from_file
+from microboss.utils.logging import log_info, log_warning
+
+# Temperature and extra instruction of each candidate slot. Slot 0 is the regular
+# generation; slots beyond the list reuse it cyclically.
+SPECULATIVE_VARIANTS = [
+    (0, None),
+    (0.7, "Prefer the simplest approach that only uses the Python standard library."),
+    (0.7, "Validate inputs and handle edge cases explicitly."),
+    (1.0, "Use a different algorithm than the most obvious one."),
+]
+
+
+class CandidateCancelled(Exception):
+    """Raised inside a candidate that lost the race before its execution finished."""
+
+
+def get_speculative_candidates():
+    """
+    Get the number of candidates generated concurrently on the first attempt of a direct solution.
+
+    Returns:
+        int: The number of candidates (1 disables speculative generation)
+    """
+    candidates_str = os.environ.get("MICROBOSS_SPECULATIVE_CANDIDATES", "1")
+    try:
+        return max(1, int(candidates_str))
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_SPECULATIVE_CANDIDATES value: {candidates_str}. Using default 1.")
+        return 1
+
+
+def get_speculative_max_tokens():
+    """
+    Get the ceiling on the tokens all speculative rounds of the process may spend.
+
+    Returns:
+        int: The token ceiling, or None if MICROBOSS_SPECULATIVE_MAX_TOKENS is not set
+    """
+    max_tokens_str = os.environ.get("MICROBOSS_SPECULATIVE_MAX_TOKENS")
+    if not max_tokens_str:
+        return None
+    try:
+        return int(max_tokens_str)
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_SPECULATIVE_MAX_TOKENS value: {max_tokens_str}. Ignoring the ceiling.")
+        return None
+
+
+class SpeculationStats:
+    """Per-slot attempt and win counters, and the tokens spent by speculative rounds."""
+
+    def __init__(self):
+        self.attempts = {}
+        self.wins = {}
+        self.rounds = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def record_round(self, slots, winner, tokens):
+        """
+        Record the outcome of a speculative round.
+
+        Args:
+            slots (int): Number of candidates in the round
+            winner (int): Slot of the winning candidate, or None if all of them failed
+            tokens (int): Tokens spent by all candidates of the round
+        """
+        with self._lock:
+            self.rounds += 1
+            self.tokens += tokens
+            for slot in range(slots):
+                self.attempts[slot] = self.attempts.get(slot, 0) + 1
+            if winner is not None:
+                self.wins[winner] = self.wins.get(winner, 0) + 1
+
+    def win_rates(self):
+        """
+        Get the fraction of rounds won by each candidate slot.
+
+        Returns:
+            dict: Mapping of slot to win rate
+        """
+        with self._lock:
+            return {
+                slot: round(self.wins.get(slot, 0) / attempts, 4)
+                for slot, attempts in sorted(self.attempts.items())
+            }
+
+    def stats(self):
+        """
+        Get the speculation counters.
+
+        Returns:
+            dict: Rounds, tokens spent, and per-slot attempts, wins and win rates
+        """
+        win_rates = self.win_rates()
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "tokens": self.tokens,
+                "attempts": dict(self.attempts),
+                "wins": dict(self.wins),
+                "win_rates": win_rates
+            }
+
+
+_speculation_stats = SpeculationStats()
+
+
+def get_speculation_stats():
+    """
+    Get the speculation counters of the process.
+
+    Returns:
+        dict: See SpeculationStats.stats()
+    """
+    return _speculation_stats.stats()
+
+
+def plan_speculative_candidates(candidates, budget=None):
+    """
+    Get the number of candidates to generate, within the speculation token ceiling
+    and the LLM calls left in the budget.
+
+    Args:
+        candidates (int): Requested number of candidates
+        budget (Budget): Optional budget of the task
+
+    Returns:
+        int: The number of candidates, 1 when speculation is not worth or allowed to run
+    """
+    if candidates <= 1:
+        return 1
+
+    max_tokens = get_speculative_max_tokens()
+    if max_tokens is not None and _speculation_stats.tokens >= max_tokens:
+        log_warning(
+            "SPECULATIVE TOKEN CEILING REACHED, GENERATING A SINGLE CANDIDATE",
+            data={"tokens": _speculation_stats.tokens, "max_tokens": max_tokens}
+        )
+        return 1
+
+    if budget is not None and budget.max_llm_calls is not None:
+        candidates = min(candidates, max(1, budget.max_llm_calls - budget.llm_calls))
+    return candidates
+
+
+def _candidate_variant(slot):
+    return SPECULATIVE_VARIANTS[slot % len(SPECULATIVE_VARIANTS)]
+
+
+def _finish_round(task_dir, candidates, winner, ledgers, generated, errors, task_id, depth):
+    """Record a round and make the winning (or first generated) candidate the task's main.py."""
+    tokens = sum(ledger.tokens for ledger in ledgers)
+    _speculation_stats.record_round(candidates, winner, tokens)
+    log_info(
+        f"SPECULATIVE ROUND {'WON BY CANDIDATE ' + str(winner) if winner is not None else 'FAILED'}",
+        task_id=task_id,
+        depth=depth,
+        data={
+            "candidates": candidates,
+            "winner": winner,
+            "tokens": tokens,
+            "failures": {slot: type(error).__name__ for slot, error in errors.items()},
+            "win_rates": _speculation_stats.win_rates()
+        }
+    )
+
+    # Keep the layout of a regular attempt so retries can fix main.py
+    slot = winner if winner is not None else min(generated, default=None)
+    if slot is None:
+        return None
+    return save_code_to_file(read_code_from_file(generated[slot]), task_dir / "main.py")
+
+
+def run_speculative_candidates(client, task, task_dir, candidates, task_id=None, depth=None, use_cache=True, budget=None, semaphore=None, config=None):
+    """
+    Generate several diverse candidates concurrently, execute them in parallel, and
+    keep the first one that produces a result.
+
+    Once a winner is found, the other candidates are cancelled and their running
+    executions killed. Candidates sampled above temperature 0 bypass the response
+    cache, so reruns still explore different solutions.
+
+    Args:
+        client: The API client
+        task (str): The task to solve
+        task_dir (Path): Directory of the task
+        candidates (int): Number of candidates
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        use_cache (bool): Whether to use the persistent response cache
+        budget (Budget): Optional budget charged for every candidate
+        semaphore (threading.Semaphore): Optional semaphore bounding LLM calls and executions
+        config (RunConfig): Optional configuration of the run
+
+    Returns:
+        tuple: (code_file_path, result) of the winning candidate
+
+    Raises:
+        Exception: The failure of the first generated candidate if none of them succeeded.
+            Its code is saved as the task's main.py so it can be fixed.
+    """
+    candidates_dir = task_dir / "candidates"
+    candidates_dir.mkdir(exist_ok=True)
+    done = threading.Event()
+    semaphore = semaphore or threading.Semaphore(candidates)
+    ledgers = [Budget(parent=budget) for _ in range(candidates)]
+    generated = {}
+    errors = {}
+
+    def run_candidate(slot):
+        temperature, hint = _candidate_variant(slot)
+        with hold_unless_batched(semaphore, client, config):
+            code = generate_code(
+                client, task, use_cache=use_cache and temperature == 0, budget=ledgers[slot], temperature=temperature,
+                hint=hint, config=config, task_id=task_id, depth=depth
+            )
+        slot_dir = candidates_dir / f"candidate_{slot}"
+        slot_dir.mkdir(exist_ok=True)
+        generated[slot] = save_code_to_file(code, slot_dir / "main.py")
+        if done.is_set():
+            raise CandidateCancelled()
+        ledgers[slot].charge_execution()
+        with semaphore:
+            with ledgers[slot].time_execution():
+                try:
+                    result = execute_file(generated[slot], task_id, depth, config, cancel=done)
+                except ExecutionCancelledError as e:
+                    raise CandidateCancelled() from e
+        if result is None:
+            raise ValueError("Candidate produced no result")
+        return result
+
+    log_info(
+        f"GENERATING {candidates} SPECULATIVE CANDIDATES",
+        task_id=task_id,
+        depth=depth,
+        data={"candidates": candidates}
+    )
+
+    winner = None
+    result = None
+    executor = ThreadPoolExecutor(max_workers=candidates)
+    try:
+        futures = {executor.submit(run_candidate, slot): slot for slot in range(candidates)}
+        for future in as_completed(futures):
+            slot = futures[future]
+            try:
+                result = future.result()
+            except BudgetExceededError:
+                raise
+            except Exception as e:
+                errors[slot] = e
+                continue
+            winner = slot
+            break
+    finally:
+        done.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    code_file_path = _finish_round(task_dir, candidates, winner, ledgers, generated, errors, task_id, depth)
+    if winner is None:
+        raise errors[min(generated, default=min(errors))]
+    return code_file_path, result
+
+
+async def async_run_speculative_candidates(client, task, task_dir, candidates, task_id=None, depth=None, use_cache=True, budget=None, semaphore=None, config=None):
+    """
+    Asynchronous version of run_speculative_candidates.
+
+    Args:
+        client: The async API client
+        task (str): The task to solve
+        task_dir (Path): Directory of the task
+        candidates (int): Number of candidates
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        use_cache (bool): Whether to use the persistent response cache
+        budget (Budget): Optional budget charged for every candidate
+        semaphore (asyncio.Semaphore): Optional semaphore bounding LLM calls and executions
+        config (RunConfig): Optional configuration of the run
+
+    Returns:
+        tuple: (code_file_path, result) of the winning candidate
+    """
+    candidates_dir = task_dir / "candidates"
+    candidates_dir.mkdir(exist_ok=True)
+    semaphore = semaphore or asyncio.Semaphore(candidates)
+    ledgers = [Budget(parent=budget) for _ in range(candidates)]
+    generated = {}
+    errors = {}
+
+    async def run_candidate(slot):
+        temperature, hint = _candidate_variant(slot)
+        async with async_hold_unless_batched(semaphore, client, config):
+            code = await async_generate_code(
+                client, task, use_cache=use_cache and temperature == 0, budget=ledgers[slot], temperature=temperature,
+                hint=hint, config=config, task_id=task_id, depth=depth
+            )
+        slot_dir = candidates_dir / f"candidate_{slot}"
+        slot_dir.mkdir(exist_ok=True)
+        generated[slot] = save_code_to_file(code, slot_dir / "main.py")
+        ledgers[slot].charge_execution()
+        async with semaphore:
+            with ledgers[slot].time_execution():
+                result = await execute_file_async(generated[slot], task_id, depth, config)
+        if result is None:
+            raise ValueError("Candidate produced no result")
+        return result
+
+    log_info(
+        f"GENERATING {candidates} SPECULATIVE CANDIDATES",
+        task_id=task_id,
+        depth=depth,
+        data={"candidates": candidates, "async": True}
+    )
+
+    winner = None
+    result = None
+    pending = {asyncio.ensure_future(run_candidate(slot)): slot for slot in range(candidates)}
+    try:
+        while pending and winner is None:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                slot = pending.pop(future)
+                error = future.exception()
+                if isinstance(error, BudgetExceededError):
+                    raise error
+                if error is not None:
+                    errors[slot] = error
+                elif winner is None:
+                    winner, result = slot, future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    code_file_path = _finish_round(task_dir, candidates, winner, ledgers, generated, errors, task_id, depth)
+    if winner is None:
+        raise errors[min(generated, default=min(errors))]
+    return code_file_path, result
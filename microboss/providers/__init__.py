@@ -0,0 +1,25 @@
+"""
+LLM provider backends for the microboss package.
+"""
+
+from microboss.providers.base import (
+    ProviderBackend, register_backend, get_backend, get_backend_names, backend_for_client,
+    select_backend, response_tokens, response_usage, StreamEnd, Usage
+)
+from microboss.providers.anthropic_backend import AnthropicBackend
+from microboss.providers.openai_backend import OpenAIBackend
+from microboss.providers.local import LocalBackend, LocalClient
+from microboss.providers.replay import ReplayBackend, ReplayClient
+from microboss.providers.router import CircuitBreaker, get_circuit_breaker, get_provider_health, route
+
+# Registration order is the order clients are matched against backends
+register_backend(AnthropicBackend())
+register_backend(OpenAIBackend())
+register_backend(LocalBackend())
+register_backend(ReplayBackend())
+
+__all__ = [
+    "ProviderBackend", "register_backend", "get_backend", "get_backend_names", "backend_for_client",
+    "select_backend", "response_tokens", "response_usage", "StreamEnd", "Usage", "AnthropicBackend", "OpenAIBackend", "LocalBackend", "LocalClient",
+    "ReplayBackend", "ReplayClient", "CircuitBreaker", "get_circuit_breaker", "get_provider_health", "route"
+]
@@ -0,0 +1,151 @@
+"""
+Anthropic provider backend for the microboss package.
+"""
+
+import logging
+import os
+import sys
+
+from microboss.providers.base import ProviderBackend, StreamEnd, Usage, get_backend, response_usage
+from microboss.utils.clients import get_client_registry, make_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class AnthropicBackend(ProviderBackend):
+    """Anthropic Messages API, falling back to OpenAI when a call fails."""
+
+    name = "anthropic"
+    label = "Anthropic"
+
+    def is_configured(self):
+        return bool(os.environ.get("ANTHROPIC_API_KEY"))
+
+    def _client(self, is_async, api_key=None):
+        # The SDK is imported on first use, importing microboss does not load it
+        import anthropic
+
+        api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "Anthropic API key not found. Please set the ANTHROPIC_API_KEY environment variable "
+                "or create a .env file with ANTHROPIC_API_KEY=your-api-key."
+            )
+
+        base_url = os.environ.get("ANTHROPIC_BASE_URL")
+        model_name = os.environ.get("ANTHROPIC_MODEL", "Claude")
+        model_info = f"Anthropic {model_name}"
+
+        client_kwargs = {"api_key": api_key}
+        if base_url:
+            client_kwargs["base_url"] = base_url
+
+        # Clients are shared process-wide so every call reuses pooled keep-alive connections
+        try:
+            if is_async:
+                client = get_client_registry().get_async(
+                    ("anthropic", api_key, base_url),
+                    lambda limits: anthropic.AsyncAnthropic(
+                        **client_kwargs, http_client=make_http_client(anthropic, limits, is_async=True)
+                    )
+                )
+            else:
+                client = get_client_registry().get(
+                    ("anthropic", api_key, base_url),
+                    lambda limits: anthropic.Anthropic(**client_kwargs, http_client=make_http_client(anthropic, limits))
+                )
+            return client, model_info
+        except Exception as e:
+            logger.warning(f"Failed to initialize Anthropic client: {str(e)}")
+
+            # Try OpenAI as fallback
+            openai_backend = get_backend("openai")
+            if openai_backend.is_configured():
+                logger.info("Using OpenAI as fallback due to Anthropic client initialization failure")
+                return openai_backend.get_async_client() if is_async else openai_backend.get_client()
+            raise ValueError(f"Failed to initialize Anthropic client and no OpenAI fallback available: {str(e)}")
+
+    def get_client(self, api_key=None):
+        return self._client(is_async=False, api_key=api_key)
+
+    def get_async_client(self, api_key=None):
+        return self._client(is_async=True, api_key=api_key)
+
+    def owns(self, client):
+        # A client can only be an Anthropic client once the SDK has been imported
+        anthropic = sys.modules.get("anthropic")
+        return anthropic is not None and isinstance(client, (anthropic.Anthropic, anthropic.AsyncAnthropic))
+
+    def complete(self, client, system, prompt, model, max_tokens, temperature):
+        response = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=self.cache_messages(system, prompt)
+        )
+        return response.content[0].text.strip(), response_usage(response)
+
+    async def acomplete(self, client, system, prompt, model, max_tokens, temperature):
+        response = await client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=self.cache_messages(system, prompt)
+        )
+        return response.content[0].text.strip(), response_usage(response)
+
+    def stream(self, client, system, prompt, model, max_tokens, temperature):
+        response = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=self.cache_messages(system, prompt),
+            stream=True
+        )
+        # Closing the response when the consumer stops early stops the generation
+        try:
+            input_usage, output_tokens, stop_reason = Usage(0, 0, 0), 0, None
+            for event in response:
+                if event.type == "message_start":
+                    input_usage = response_usage(event.message)
+                elif event.type == "content_block_delta":
+                    yield event.delta.text
+                elif event.type == "message_delta":
+                    stop_reason = event.delta.stop_reason
+                    output_tokens = event.usage.output_tokens
+            yield StreamEnd(input_usage._replace(output_tokens=output_tokens), stop_reason == "max_tokens")
+        finally:
+            response.close()
+
+    async def astream(self, client, system, prompt, model, max_tokens, temperature):
+        response = await client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=self.cache_messages(system, prompt),
+            stream=True
+        )
+        try:
+            input_usage, output_tokens, stop_reason = Usage(0, 0, 0), 0, None
+            async for event in response:
+                if event.type == "message_start":
+                    input_usage = response_usage(event.message)
+                elif event.type == "content_block_delta":
+                    yield event.delta.text
+                elif event.type == "message_delta":
+                    stop_reason = event.delta.stop_reason
+                    output_tokens = event.usage.output_tokens
+            yield StreamEnd(input_usage._replace(output_tokens=output_tokens), stop_reason == "max_tokens")
+        finally:
+            await response.close()
+
+    def get_fallback_client(self, is_async=False):
+        openai_backend = get_backend("openai")
+        if not openai_backend.is_configured():
+            return None
+        client, _ = openai_backend.get_async_client() if is_async else openai_backend.get_client()
+        return client
@@ -0,0 +1,353 @@
+"""
+Provider backend interface and registry for the microboss package.
+"""
+
+import logging
+import os
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Registered backends by name, in registration order
+_backends = {}
+
+# Last event of a streamed response: the Usage of the call (None if unknown) and
+# whether the response was cut off by the max_tokens limit
+StreamEnd = namedtuple("StreamEnd", ["usage", "truncated"])
+
+
+class Usage(namedtuple("Usage", ["input_tokens", "output_tokens", "cached_tokens"])):
+    """Tokens used by an LLM call. Cached input tokens are counted in the input tokens too."""
+
+    __slots__ = ()
+
+    @property
+    def total(self):
+        """Input plus output tokens."""
+        return self.input_tokens + self.output_tokens
+
+
+def _count(value):
+    return value if isinstance(value, int) else 0
+
+
+def response_usage(response):
+    """
+    Get the tokens used by an LLM response.
+
+    Args:
+        response: An Anthropic message or OpenAI chat completion.
+
+    Returns:
+        Usage: The tokens used, all 0 if the response carries no usage.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return Usage(0, 0, 0)
+    # OpenAI reports prompt and completion tokens, with cached tokens among the prompt tokens
+    if hasattr(usage, "prompt_tokens"):
+        details = getattr(usage, "prompt_tokens_details", None)
+        return Usage(
+            _count(usage.prompt_tokens),
+            _count(getattr(usage, "completion_tokens", 0)),
+            _count(getattr(details, "cached_tokens", 0))
+        )
+    # Anthropic reports cache reads and writes separately from the other input tokens
+    cache_read = _count(getattr(usage, "cache_read_input_tokens", 0))
+    cache_creation = _count(getattr(usage, "cache_creation_input_tokens", 0))
+    return Usage(
+        _count(getattr(usage, "input_tokens", 0)) + cache_read + cache_creation,
+        _count(getattr(usage, "output_tokens", 0)),
+        cache_read
+    )
+
+
+def response_tokens(response):
+    """
+    Get the number of tokens used by an LLM response.
+
+    Args:
+        response: An Anthropic message or OpenAI chat completion.
+
+    Returns:
+        int: Input plus output tokens, or 0 if the response carries no usage.
+    """
+    return response_usage(response).total
+
+
+class ProviderBackend:
+    """
+    Interface of an LLM provider.
+
+    A backend creates the clients of its provider, recognises them, and sends
+    single-turn completions through them. The API functions are written against
+    this interface only, so adding a provider means registering a new backend.
+    """
+
+    # Name used to select the backend, e.g. with MICROBOSS_PROVIDER
+    name = None
+    # Human readable name used in logs
+    label = None
+    # Whether responses may be stored in the persistent response cache
+    cacheable = True
+    # Whether calls cost money, for the cost estimates
+    billed = True
+    # Whether requests can be submitted as batch jobs, see submit_batch()
+    supports_batch = False
+
+    def is_configured(self):
+        """
+        Check whether the backend can be used, e.g. because its API key is set.
+
+        Returns:
+            bool: True if the backend is configured
+        """
+        return True
+
+    def get_client(self, api_key=None):
+        """
+        Get the client of the provider.
+
+        Args:
+            api_key (str): Optional API key, read from the provider's environment variable if None
+
+        Returns:
+            tuple: (client, model_info)
+        """
+        raise NotImplementedError
+
+    def get_async_client(self, api_key=None):
+        """
+        Get the asynchronous client of the provider.
+
+        Args:
+            api_key (str): Optional API key, read from the provider's environment variable if None
+
+        Returns:
+            tuple: (client, model_info)
+        """
+        raise NotImplementedError
+
+    def owns(self, client):
+        """
+        Check whether a client belongs to this backend.
+
+        Args:
+            client: A sync or async client
+
+        Returns:
+            bool: True if the backend can send requests through the client
+        """
+        raise NotImplementedError
+
+    def resolve_model(self, model):
+        """
+        Map the configured default model to a model of this provider.
+
+        Args:
+            model (str): The configured model
+
+        Returns:
+            str: The model to request
+        """
+        return model
+
+    def cache_messages(self, system, prompt):
+        """
+        Get the messages identifying a request in the response cache.
+
+        Args:
+            system (str): The system prompt
+            prompt (str): The user message
+
+        Returns:
+            list: The chat messages sent to the provider
+        """
+        return [{"role": "user", "content": prompt}]
+
+    def complete(self, client, system, prompt, model, max_tokens, temperature):
+        """
+        Send a single-turn request.
+
+        Args:
+            client: A client owned by this backend
+            system (str): The system prompt
+            prompt (str): The user message
+            model (str): The model, as returned by resolve_model
+            max_tokens (int): Maximum number of tokens to generate
+            temperature (float): Sampling temperature
+
+        Returns:
+            tuple: (text, usage) where usage is the Usage of the call
+        """
+        raise NotImplementedError
+
+    async def acomplete(self, client, system, prompt, model, max_tokens, temperature):
+        """
+        Send a single-turn request through an async client. See complete().
+
+        Returns:
+            tuple: (text, usage) where usage is the Usage of the call
+        """
+        raise NotImplementedError
+
+    def stream(self, client, system, prompt, model, max_tokens, temperature):
+        """
+        Send a single-turn request and yield the response as it arrives.
+
+        Backends without streaming yield the whole response at once.
+
+        Yields:
+            str: Text deltas, followed by a final StreamEnd
+        """
+        text, usage = self.complete(client, system, prompt, model, max_tokens, temperature)
+        yield text
+        yield StreamEnd(usage, False)
+
+    async def astream(self, client, system, prompt, model, max_tokens, temperature):
+        """
+        Asynchronous version of stream().
+
+        Yields:
+            str: Text deltas, followed by a final StreamEnd
+        """
+        text, usage = await self.acomplete(client, system, prompt, model, max_tokens, temperature)
+        yield text
+        yield StreamEnd(usage, False)
+
+    def batch_client(self, client):
+        """
+        Get the sync client that submits and polls the batch jobs of a client's requests.
+
+        Args:
+            client: A sync or async client owned by this backend
+
+        Returns:
+            The sync client of the same account
+        """
+        return client
+
+    def submit_batch(self, client, requests):
+        """
+        Submit single-turn requests as one batch job.
+
+        Args:
+            client: A sync client owned by this backend
+            requests (list): Dicts with the custom_id, system, prompt, model, max_tokens and temperature of each request
+
+        Returns:
+            str: ID of the batch job
+        """
+        raise NotImplementedError
+
+    def poll_batch(self, client, batch_id):
+        """
+        Get the results of a batch job that have arrived so far.
+
+        Args:
+            client: A sync client owned by this backend
+            batch_id (str): ID returned by submit_batch
+
+        Returns:
+            tuple: (done, results) where results maps custom IDs to (text, usage),
+                   or to an Exception for a failed request. Results may be returned
+                   again by later polls.
+        """
+        raise NotImplementedError
+
+    def get_fallback_client(self, is_async=False):
+        """
+        Get the client to retry a failed request with, if any.
+
+        Args:
+            is_async (bool): Whether an async client is needed
+
+        Returns:
+            The fallback client, or None if the backend has no fallback
+        """
+        return None
+
+
+def register_backend(backend):
+    """
+    Register a provider backend, replacing any backend with the same name.
+
+    Args:
+        backend (ProviderBackend): The backend
+    """
+    _backends[backend.name] = backend
+
+
+def get_backend(name):
+    """
+    Get a registered backend.
+
+    Args:
+        name (str): Name of the backend
+
+    Returns:
+        ProviderBackend: The backend
+    """
+    backend = _backends.get(name.lower())
+    if backend is None:
+        raise ValueError(f"Unknown provider: {name}. Available providers: {', '.join(get_backend_names())}")
+    return backend
+
+
+def get_backend_names():
+    """
+    Get the names of the registered backends.
+
+    Returns:
+        list: Backend names, in registration order
+    """
+    return list(_backends)
+
+
+def backend_for_client(client):
+    """
+    Get the backend a client belongs to.
+
+    Args:
+        client: A sync or async client
+
+    Returns:
+        ProviderBackend: The backend owning the client
+    """
+    for backend in _backends.values():
+        if backend.owns(client):
+            return backend
+    raise ValueError(f"Unsupported client type: {type(client)}")
+
+
+def select_backend(name=None):
+    """
+    Select the backend to use: the replay backend in cassette replay mode, the one
+    named by the argument or MICROBOSS_PROVIDER, otherwise Anthropic if its API key
+    is set, falling back to OpenAI.
+
+    Args:
+        name (str): Optional backend name
+
+    Returns:
+        ProviderBackend: The selected backend
+    """
+    if os.environ.get("MICROBOSS_CASSETTE_MODE", "").lower() == "replay":
+        return get_backend("replay")
+
+    name = name or os.environ.get("MICROBOSS_PROVIDER")
+    if name:
+        return get_backend(name)
+
+    if get_backend("anthropic").is_configured():
+        return get_backend("anthropic")
+
+    logger.warning("Anthropic API key not found. Will try OpenAI as fallback.")
+    if get_backend("openai").is_configured():
+        logger.info("Using OpenAI as fallback")
+        return get_backend("openai")
+
+    raise ValueError(
+        "No API keys found. Please set either ANTHROPIC_API_KEY or OPENAI_API_KEY environment variable "
+        "or create a .env file with one of these keys."
+    )
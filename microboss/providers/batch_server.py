@@ -0,0 +1,246 @@
+"""
+Local stand-in of the OpenAI chat completion, file and batch endpoints.
+
+The server answers with the canned responses of the local backend, so the batch
+mode of the OpenAI backend can be exercised end to end with no API key and no
+network access. Point the OpenAI backend at it with OPENAI_API_BASE:
+
+    python -m microboss.providers.batch_server --port 8765 --turnaround 5
+    OPENAI_API_KEY=stand-in OPENAI_API_BASE=http://127.0.0.1:8765/v1 \
+        python -m microboss.cli "task" --provider openai --batch
+"""
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from microboss.providers.local import LocalBackend, LocalClient
+
+BATCH_PATH_PATTERN = re.compile(r"^/v1/batches/([\w-]+)$")
+FILE_CONTENT_PATH_PATTERN = re.compile(r"^/v1/files/([\w-]+)/content$")
+
+
+class StandInState:
+    """Files and batch jobs of a stand-in server."""
+
+    def __init__(self, latency="fixed:0", turnaround=1.0, seed=0):
+        self.client = LocalClient(latency=latency, seed=seed)
+        self.backend = LocalBackend()
+        self.turnaround = turnaround
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def respond(self, body):
+        """Get the chat completion answering a request body, and its simulated latency."""
+        messages = body.get("messages") or []
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        prompt = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        with self._lock:
+            text, usage, latency = self.backend._respond(self.client, system, prompt)
+            completion_id = f"chatcmpl-{next(self._ids)}"
+        completion = {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": usage.input_tokens,
+                "completion_tokens": usage.output_tokens,
+                "total_tokens": usage.total
+            }
+        }
+        return completion, latency
+
+    def add_file(self, data, filename, purpose):
+        with self._lock:
+            file_id = f"file-{next(self._ids)}"
+            self.files[file_id] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+        return self.file_object(file_id)
+
+    def file_object(self, file_id):
+        entry = self.files[file_id]
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(entry["data"]),
+            "created_at": entry["created_at"],
+            "filename": entry["filename"],
+            "purpose": entry["purpose"],
+            "status": "processed"
+        }
+
+    def create_batch(self, body):
+        """Answer every request of the input file now, to be released once the job is due."""
+        lines = []
+        slowest = 0.0
+        for line in self.files[body["input_file_id"]]["data"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            completion, latency = self.respond(request.get("body") or {})
+            slowest = max(slowest, latency)
+            lines.append(json.dumps({
+                "id": f"batch_req_{completion['id']}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": completion["id"], "body": completion},
+                "error": None
+            }))
+        now = time.time()
+        with self._lock:
+            batch_id = f"batch_{next(self._ids)}"
+            self.batches[batch_id] = {
+                "input_file_id": body["input_file_id"],
+                "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                "completion_window": body.get("completion_window", "24h"),
+                "created_at": now,
+                "due_at": now + self.turnaround + slowest,
+                "lines": lines,
+                "output_file_id": None
+            }
+        return self.batch_object(batch_id)
+
+    def batch_object(self, batch_id):
+        batch = self.batches[batch_id]
+        if batch["output_file_id"] is None and time.time() >= batch["due_at"]:
+            output = self.add_file("\n".join(batch["lines"]).encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+            batch["output_file_id"] = output["id"]
+        completed = batch["output_file_id"] is not None
+        return {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": batch["endpoint"],
+            "errors": None,
+            "input_file_id": batch["input_file_id"],
+            "completion_window": batch["completion_window"],
+            "status": "completed" if completed else "in_progress",
+            "output_file_id": batch["output_file_id"],
+            "error_file_id": None,
+            "created_at": int(batch["created_at"]),
+            "in_progress_at": int(batch["created_at"]),
+            "completed_at": int(batch["due_at"]) if completed else None,
+            "request_counts": {
+                "total": len(batch["lines"]),
+                "completed": len(batch["lines"]) if completed else 0,
+                "failed": 0
+            }
+        }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes the endpoints of the stand-in server."""
+
+    def log_message(self, format, *args):
+        # Keep the server quiet, the clients log their own calls
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._send_json({"error": {"message": f"Unknown endpoint {self.command} {self.path}"}}, 404)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        state = self.server.state
+        body = self._read_body()
+        if self.path == "/v1/chat/completions":
+            completion, latency = state.respond(json.loads(body))
+            if latency:
+                time.sleep(latency)
+            self._send_json(completion)
+        elif self.path == "/v1/files":
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+            )
+            data, filename, purpose = b"", "upload.jsonl", "batch"
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    data, filename = part.get_payload(decode=True), part.get_filename() or filename
+                elif name == "purpose":
+                    purpose = part.get_content().strip()
+            self._send_json(state.add_file(data, filename, purpose))
+        elif self.path == "/v1/batches":
+            payload = json.loads(body)
+            if payload.get("input_file_id") not in state.files:
+                self._send_json({"error": {"message": "Unknown input file"}}, 400)
+            else:
+                self._send_json(state.create_batch(payload))
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        state = self.server.state
+        batch_match = BATCH_PATH_PATTERN.match(self.path)
+        content_match = FILE_CONTENT_PATH_PATTERN.match(self.path)
+        if batch_match and batch_match.group(1) in state.batches:
+            self._send_json(state.batch_object(batch_match.group(1)))
+        elif content_match and content_match.group(1) in state.files:
+            data = state.files[content_match.group(1)]["data"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._not_found()
+
+
+def start_batch_server(host="127.0.0.1", port=0, latency="fixed:0", turnaround=1.0, seed=0):
+    """
+    Start a stand-in server in a background thread.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 for any free port
+        latency (str): Latency distribution of each request, see MICROBOSS_LOCAL_LATENCY
+        turnaround (float): Seconds a batch job takes on top of its slowest request
+        seed (int): Latency seed
+
+    Returns:
+        ThreadingHTTPServer: The server, whose base URL is http://host:server.server_port/v1
+    """
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.state = StandInState(latency, turnaround, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in of the OpenAI chat completion and batch endpoints")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Latency of each request, see MICROBOSS_LOCAL_LATENCY (default: fixed:0)")
+    parser.add_argument("--turnaround", type=float, default=1.0,
+                        help="Seconds a batch job takes on top of its slowest request (default: 1.0)")
+    parser.add_argument("--seed", type=int, default=0, help="Latency seed (default: 0)")
+    args = parser.parse_args()
+
+    server = start_batch_server(args.host, args.port, args.latency, args.turnaround, args.seed)
+    print(f"Stand-in batch server listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Deterministic offline provider backend for the microboss package.
+
+The local backend answers every request from canned responses without any network
+access, after a simulated latency. It is meant for benchmarking the orchestration,
+scheduler and executor on a machine with no API keys, and for tests.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+
+from microboss.providers.base import ProviderBackend, StreamEnd, Usage
+from microboss.utils.logging import log_warning
+
+# Characters per chunk of a streamed response, and share of the latency spent before the first chunk
+STREAM_CHUNK_CHARS = 16
+FIRST_CHUNK_LATENCY_SHARE = 0.5
+
+# Latency distributions understood by MICROBOSS_LOCAL_LATENCY, with their parameter count
+LATENCY_DISTRIBUTIONS = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+
+DECOMPOSE_PROMPT_PATTERN = re.compile(r"Decompose the following task into (\d+) subtasks: '(.*)'\s*$", re.DOTALL)
+GENERATE_PROMPT_PATTERN = re.compile(r"Generate Python code to solve: '(.*?)'(?:\n\n.*)?\s*$", re.DOTALL)
+
+
+class LocalClient:
+    """Client of the local backend. It holds no connection, only the settings of the backend."""
+
+    def __init__(self, latency="fixed:0", responses=None, seed=0, is_async=False):
+        self.latency = parse_latency(latency)
+        self.rules = load_response_rules(responses) if responses else []
+        self.seed = seed
+        self.is_async = is_async
+        self.calls = 0
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution such as "fixed:0.2", "uniform:0.1,0.5",
+    "lognormal:0.3,0.5" (median seconds, sigma) or "exponential:0.2" (mean seconds).
+
+    Args:
+        spec (str): The distribution
+
+    Returns:
+        tuple: (name, params), fixed at 0 seconds if the spec is invalid
+    """
+    name, _, params_str = (spec or "fixed:0").partition(":")
+    name = name.strip().lower()
+    try:
+        params = [float(param) for param in params_str.split(",") if param.strip()]
+    except ValueError:
+        params = []
+    if LATENCY_DISTRIBUTIONS.get(name) != len(params) or any(param < 0 for param in params):
+        log_warning(f"Invalid MICROBOSS_LOCAL_LATENCY value: {spec}. Using default fixed:0.")
+        return "fixed", [0.0]
+    return name, params
+
+
+def sample_latency(latency, rng):
+    """
+    Draw a latency from a distribution.
+
+    Args:
+        latency (tuple): (name, params) as returned by parse_latency
+        rng (random.Random): Source of randomness
+
+    Returns:
+        float: Seconds to wait
+    """
+    name, params = latency
+    if name == "uniform":
+        return rng.uniform(min(params), max(params))
+    if name == "lognormal":
+        return rng.lognormvariate(math.log(params[0]), params[1]) if params[0] > 0 else 0.0
+    if name == "exponential":
+        return rng.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+    return params[0]
+
+
+def load_response_rules(path):
+    """
+    Load canned responses from a JSON file holding a list of rules of the form
+    {"pattern": "<regex searched in the prompt>", "kind": "generate|fix|decompose|decompose_structured",
+    "response": "<text>"}. The kind is optional.
+
+    Args:
+        path (str): Path of the rules file
+
+    Returns:
+        list: Rules as (compiled pattern, kind, response) tuples
+    """
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+        return [
+            (re.compile(entry.get("pattern", "")), entry.get("kind"), str(entry["response"]))
+            for entry in entries
+        ]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, re.error) as e:
+        log_warning(f"Could not load local responses from {path}: {str(e)}. Using built-in responses.")
+        return []
+
+
+def request_kind(system):
+    """
+    Get the kind of request from its system prompt.
+
+    Args:
+        system (str): The system prompt
+
+    Returns:
+        str: "generate", "fix", "patch", "decompose" or "decompose_structured"
+    """
+    if '"subtasks"' in system:
+        return "decompose_structured"
+    if "decomposition" in system:
+        return "decompose"
+    if "targeted edits" in system:
+        return "patch"
+    if "fixing bugs" in system:
+        return "fix"
+    return "generate"
+
+
+def canned_response(kind, prompt, shape="fan-in"):
+    """
+    Build the built-in response to a request.
+
+    Generated code sets result to the task it was asked to solve, fixes set a constant
+    result, patches edit the assignment of result to set that constant, and
+    decompositions split the task into numbered parts.
+
+    Args:
+        kind (str): The kind of request, see request_kind()
+        prompt (str): The user message
+        shape (str): "fan-in" for independent subtasks combined by the last one,
+            or "chain" for subtasks each depending on the previous one
+
+    Returns:
+        str: The response text
+    """
+    if kind in ("decompose", "decompose_structured"):
+        match = DECOMPOSE_PROMPT_PATTERN.search(prompt)
+        depth, task = (int(match.group(1)), match.group(2)) if match else (2, prompt)
+        depth = max(1, depth)
+        subtasks = [f"Part {i + 1} of {depth} of: {task}" for i in range(depth)]
+        if kind == "decompose":
+            return json.dumps(subtasks)
+
+        entries = []
+        for i, subtask in enumerate(subtasks):
+            if shape == "chain":
+                depends_on = [f"task_{i}"] if i > 0 else []
+            else:
+                depends_on = [f"task_{j + 1}" for j in range(depth - 1)] if i == depth - 1 else []
+            entries.append({"id": f"task_{i + 1}", "task": subtask, "depends_on": depends_on})
+        return json.dumps({"subtasks": entries, "result": f"task_{depth}"})
+
+    if kind == "fix":
+        return "```python\nresult = 'fixed'\n```"
+
+    if kind == "patch":
+        # Edit the first assignment of result, code without one gets an edit that does not apply
+        code = prompt.partition("\n\nCODE:\n")[2]
+        line = next((line for line in code.splitlines() if line.lstrip().startswith("result =")), "result =")
+        indent = line[:len(line) - len(line.lstrip())]
+        return f"<<<<<<< SEARCH\n{line}\n=======\n{indent}result = 'fixed'\n>>>>>>> REPLACE"
+
+    match = GENERATE_PROMPT_PATTERN.search(prompt)
+    task = match.group(1) if match else prompt
+    return f"```python\nresult = {task[:200]!r}\n```"
+
+
+class LocalBackend(ProviderBackend):
+    """
+    Deterministic offline backend, configured with MICROBOSS_LOCAL_LATENCY,
+    MICROBOSS_LOCAL_RESPONSES, MICROBOSS_LOCAL_SEED and MICROBOSS_LOCAL_DECOMPOSITION.
+    """
+
+    name = "local"
+    label = "Local"
+    # Canned responses are cheap and may change with the settings, never persist them
+    cacheable = False
+    billed = False
+
+    def _client(self, is_async):
+        seed_str = os.environ.get("MICROBOSS_LOCAL_SEED", "0")
+        try:
+            seed = int(seed_str)
+        except ValueError:
+            log_warning(f"Invalid MICROBOSS_LOCAL_SEED value: {seed_str}. Using default 0.")
+            seed = 0
+        client = LocalClient(
+            latency=os.environ.get("MICROBOSS_LOCAL_LATENCY", "fixed:0"),
+            responses=os.environ.get("MICROBOSS_LOCAL_RESPONSES"),
+            seed=seed,
+            is_async=is_async
+        )
+        return client, "Local offline backend"
+
+    def get_client(self, api_key=None):
+        return self._client(is_async=False)
+
+    def get_async_client(self, api_key=None):
+        return self._client(is_async=True)
+
+    def owns(self, client):
+        return isinstance(client, LocalClient)
+
+    def _respond(self, client, system, prompt):
+        """Get the response text, usage and latency of a request."""
+        kind = request_kind(system)
+        text = None
+        for pattern, rule_kind, response in client.rules:
+            if (rule_kind is None or rule_kind == kind) and pattern.search(prompt):
+                text = response
+                break
+        if text is None:
+            shape = os.environ.get("MICROBOSS_LOCAL_DECOMPOSITION", "fan-in").lower()
+            text = canned_response(kind, prompt, shape)
+
+        # Seed per request so the same request always takes the same time
+        digest = hashlib.sha256(f"{client.seed}\0{system}\0{prompt}".encode("utf-8")).digest()
+        latency = sample_latency(client.latency, random.Random(digest))
+        client.calls += 1
+        # Roughly four characters per token
+        usage = Usage((len(system) + len(prompt)) // 4, len(text) // 4, 0)
+        return text.strip(), usage, latency
+
+    def complete(self, client, system, prompt, model, max_tokens, temperature):
+        text, usage, latency = self._respond(client, system, prompt)
+        if latency:
+            time.sleep(latency)
+        return text, usage
+
+    async def acomplete(self, client, system, prompt, model, max_tokens, temperature):
+        text, usage, latency = self._respond(client, system, prompt)
+        if latency:
+            await asyncio.sleep(latency)
+        return text, usage
+
+    def _chunks(self, client, system, prompt, max_tokens):
+        """Split a response into stream chunks, cut off at max_tokens like a real provider."""
+        text, usage, latency = self._respond(client, system, prompt)
+        truncated = len(text) > max_tokens * 4
+        if truncated:
+            text = text[:max_tokens * 4]
+            usage = usage._replace(output_tokens=max_tokens)
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+        delays = [latency * FIRST_CHUNK_LATENCY_SHARE]
+        delays += [latency * (1 - FIRST_CHUNK_LATENCY_SHARE) / len(chunks)] * (len(chunks) - 1)
+        return chunks, delays, StreamEnd(usage, truncated)
+
+    def stream(self, client, system, prompt, model, max_tokens, temperature):
+        chunks, delays, end = self._chunks(client, system, prompt, max_tokens)
+        for chunk, delay in zip(chunks, delays):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+        yield end
+
+    async def astream(self, client, system, prompt, model, max_tokens, temperature):
+        chunks, delays, end = self._chunks(client, system, prompt, max_tokens)
+        for chunk, delay in zip(chunks, delays):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+        yield end
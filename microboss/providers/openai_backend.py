@@ -0,0 +1,197 @@
+"""
+OpenAI provider backend for the microboss package.
+"""
+
+import json
+import os
+
+from microboss.providers.base import ProviderBackend, StreamEnd, Usage, response_usage
+from microboss.utils.clients import get_client_registry, make_http_client
+
+# Model used when the configured default model is not a GPT model
+DEFAULT_OPENAI_MODEL = "gpt-4o-2024-05-13"
+
+# Endpoint of the requests of a batch job, and the states in which a batch job produces no more results
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def _batch_line_result(line):
+    """Get the (text, usage) of a line of a batch output file, or the Exception of a failed request."""
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        error = line.get("error") or body.get("error") or {}
+        return ValueError(f"Batch request failed: {error.get('message') or response.get('status_code')}")
+    usage = body.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return (
+        body["choices"][0]["message"]["content"].strip(),
+        Usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), details.get("cached_tokens", 0))
+    )
+
+
+class OpenAIBackend(ProviderBackend):
+    """OpenAI Chat Completions API."""
+
+    name = "openai"
+    label = "OpenAI"
+    supports_batch = True
+
+    def is_configured(self):
+        return bool(os.environ.get("OPENAI_API_KEY"))
+
+    def _client(self, is_async, api_key=None):
+        # The SDK is imported on first use, importing microboss does not load it
+        import openai
+
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "OpenAI API key not found. Please set the OPENAI_API_KEY environment variable "
+                "or create a .env file with OPENAI_API_KEY=your-api-key."
+            )
+
+        # Check for custom base URL or organization
+        base_url = os.environ.get("OPENAI_API_BASE")
+        org_id = os.environ.get("OPENAI_ORGANIZATION")
+        kwargs = {"api_key": api_key}
+        if base_url:
+            kwargs["base_url"] = base_url
+        if org_id:
+            kwargs["organization"] = org_id
+
+        model_name = os.environ.get("OPENAI_MODEL", "GPT-4")
+        model_info = f"OpenAI {model_name}"
+
+        if is_async:
+            client = get_client_registry().get_async(
+                ("openai", api_key, base_url, org_id),
+                lambda limits: openai.AsyncOpenAI(**kwargs, http_client=make_http_client(openai, limits, is_async=True))
+            )
+        else:
+            client = get_client_registry().get(
+                ("openai", api_key, base_url, org_id),
+                lambda limits: openai.OpenAI(**kwargs, http_client=make_http_client(openai, limits))
+            )
+        return client, model_info
+
+    def get_client(self, api_key=None):
+        return self._client(is_async=False, api_key=api_key)
+
+    def get_async_client(self, api_key=None):
+        return self._client(is_async=True, api_key=api_key)
+
+    def owns(self, client):
+        return hasattr(client, "chat") and hasattr(client.chat, "completions")
+
+    def resolve_model(self, model):
+        return model if "gpt" in model else DEFAULT_OPENAI_MODEL
+
+    def cache_messages(self, system, prompt):
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+
+    def complete(self, client, system, prompt, model, max_tokens, temperature):
+        response = client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=self.cache_messages(system, prompt)
+        )
+        return response.choices[0].message.content.strip(), response_usage(response)
+
+    async def acomplete(self, client, system, prompt, model, max_tokens, temperature):
+        response = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=self.cache_messages(system, prompt)
+        )
+        return response.choices[0].message.content.strip(), response_usage(response)
+
+    def stream(self, client, system, prompt, model, max_tokens, temperature):
+        response = client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=self.cache_messages(system, prompt),
+            stream=True
+        )
+        # Streamed chat completions report no usage, the caller estimates the tokens
+        try:
+            finish_reason = None
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            yield StreamEnd(None, finish_reason == "length")
+        finally:
+            response.close()
+
+    async def astream(self, client, system, prompt, model, max_tokens, temperature):
+        response = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=self.cache_messages(system, prompt),
+            stream=True
+        )
+        try:
+            finish_reason = None
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            yield StreamEnd(None, finish_reason == "length")
+        finally:
+            await response.close()
+
+    def batch_client(self, client):
+        import openai
+
+        if not isinstance(client, openai.AsyncOpenAI):
+            return client
+        base_url = str(client.base_url)
+        return get_client_registry().get(
+            ("openai", client.api_key, base_url, client.organization),
+            lambda limits: openai.OpenAI(
+                api_key=client.api_key,
+                base_url=base_url,
+                organization=client.organization,
+                http_client=make_http_client(openai, limits)
+            )
+        )
+
+    def submit_batch(self, client, requests):
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {
+                    "model": request["model"],
+                    "temperature": request["temperature"],
+                    "messages": self.cache_messages(request["system"], request["prompt"])
+                }
+            })
+            for request in requests
+        ]
+        input_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+        return batch.id
+
+    def poll_batch(self, client, batch_id):
+        batch = client.batches.retrieve(batch_id)
+        done = batch.status in BATCH_FINAL_STATES
+        results = {}
+        # Output and error files are written when the batch job ends
+        for file_id in (batch.output_file_id, batch.error_file_id) if done else ():
+            if file_id:
+                for line in client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        entry = json.loads(line)
+                        results[entry["custom_id"]] = _batch_line_result(entry)
+        return done, results
@@ -0,0 +1,66 @@
+"""
+Cassette replay provider backend for the microboss package.
+"""
+
+import asyncio
+import time
+
+from microboss.providers.base import ProviderBackend, Usage
+from microboss.utils.cassette import get_cassette, get_replay_latency_scale
+
+
+def entry_usage(entry):
+    """Get the Usage of a recorded exchange, whose token breakdown older cassettes lack."""
+    if "input_tokens" in entry:
+        return Usage(entry["input_tokens"], entry.get("output_tokens", 0), entry.get("cached_tokens", 0))
+    return Usage(entry.get("tokens", 0), 0, 0)
+
+
+class ReplayClient:
+    """Client of the replay backend, serving the responses of a recorded cassette."""
+
+    def __init__(self, cassette, latency_scale=0.0, is_async=False):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.is_async = is_async
+
+
+class ReplayBackend(ProviderBackend):
+    """
+    Serves the responses recorded in a cassette (MICROBOSS_CASSETTE_PATH), waiting
+    for the recorded latency scaled by MICROBOSS_CASSETTE_LATENCY_SCALE.
+    """
+
+    name = "replay"
+    label = "Replay"
+    # Replayed responses already are recordings, never persist them
+    cacheable = False
+    billed = False
+
+    def _client(self, is_async):
+        cassette = get_cassette()
+        client = ReplayClient(cassette, get_replay_latency_scale(), is_async)
+        return client, f"Replay of {cassette.path.name}"
+
+    def get_client(self, api_key=None):
+        return self._client(is_async=False)
+
+    def get_async_client(self, api_key=None):
+        return self._client(is_async=True)
+
+    def owns(self, client):
+        return isinstance(client, ReplayClient)
+
+    def complete(self, client, system, prompt, model, max_tokens, temperature):
+        entry = client.cassette.next(system, prompt, temperature)
+        latency = entry.get("latency", 0) * client.latency_scale
+        if latency:
+            time.sleep(latency)
+        return entry["response"], entry_usage(entry)
+
+    async def acomplete(self, client, system, prompt, model, max_tokens, temperature):
+        entry = client.cassette.next(system, prompt, temperature)
+        latency = entry.get("latency", 0) * client.latency_scale
+        if latency:
+            await asyncio.sleep(latency)
+        return entry["response"], entry_usage(entry)
@@ -0,0 +1,288 @@
+"""
+Per-provider circuit breakers and health-aware routing of LLM calls.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from microboss.providers.base import backend_for_client
+from microboss.utils.logging import log_debug, log_info, log_warning
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one provider from the outcomes of its recent calls.
+
+    The breaker opens when the share of failed calls, or of calls slower than the
+    latency threshold, reaches the failure rate over the recent window. While open,
+    calls are routed to a healthy provider instead. After the open period a single
+    probe call is let through (half-open): its success closes the breaker, its
+    failure opens it again.
+    """
+
+    def __init__(self, name, failure_rate=0.5, slow_seconds=None, window=20, min_calls=5, open_seconds=30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.probe_started = None
+        self.times_opened = 0
+        self.rejected = 0
+        self.transitions = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    def _rates(self):
+        calls = len(self.outcomes)
+        if not calls:
+            return 0.0, 0.0
+        return (
+            sum(failed for failed, _ in self.outcomes) / calls,
+            sum(slow for _, slow in self.outcomes) / calls
+        )
+
+    def _transition(self, state, now, reason):
+        """Change state and emit the transition event. Called with the lock held."""
+        previous, self.state = self.state, state
+        error_rate, slow_rate = self._rates()
+        data = {
+            "provider": self.name,
+            "from": previous,
+            "to": state,
+            "reason": reason,
+            "error_rate": round(error_rate, 3),
+            "slow_rate": round(slow_rate, 3),
+            "calls": len(self.outcomes)
+        }
+        self.transitions.append(dict(data, time=datetime.now().isoformat()))
+        if state == OPEN:
+            self.opened_at = now
+            self.probe_started = None
+            self.times_opened += 1
+            log_warning("CIRCUIT BREAKER OPENED", data=data)
+        elif state == HALF_OPEN:
+            log_info("CIRCUIT BREAKER HALF-OPEN, PROBING PROVIDER", data=data)
+        else:
+            self.outcomes.clear()
+            self.probe_started = None
+            log_info("CIRCUIT BREAKER CLOSED", data=data)
+
+    def _refresh(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now, "open period elapsed")
+
+    @property
+    def healthy(self):
+        """Whether the breaker is closed."""
+        with self._lock:
+            return self.state == CLOSED
+
+    def allow(self):
+        """
+        Check whether a call may be sent to the provider, taking the probe slot if half-open.
+
+        Returns:
+            bool: True if the breaker is closed, or if the call is the probe of a half-open breaker
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self.state == CLOSED:
+                return True
+            # A probe that never reported back (e.g. cancelled) is replaced after the open period
+            if self.state == HALF_OPEN and (self.probe_started is None or now - self.probe_started >= self.open_seconds):
+                self.probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, latency=None, failed=False):
+        """
+        Record the outcome of a call.
+
+        Args:
+            latency (float): Seconds the call took, None if it failed
+            failed (bool): Whether the call raised an error
+        """
+        with self._lock:
+            now = time.monotonic()
+            slow = not failed and self.slow_seconds is not None and latency is not None and latency > self.slow_seconds
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN, now, "probe failed" if failed else "probe was slow")
+                else:
+                    self._transition(CLOSED, now, "probe succeeded")
+                return
+            if self.state == OPEN:
+                # Sent anyway because no provider was healthy: a success shows the provider is back
+                if not failed and not slow:
+                    self._transition(CLOSED, now, "call succeeded while open")
+                return
+
+            self.outcomes.append((failed, slow))
+            if len(self.outcomes) >= self.min_calls:
+                error_rate, slow_rate = self._rates()
+                if error_rate >= self.failure_rate:
+                    self._transition(OPEN, now, "error rate")
+                elif slow_rate >= self.failure_rate:
+                    self._transition(OPEN, now, "slow call rate")
+
+    def stats(self):
+        """
+        Get the breaker state.
+
+        Returns:
+            dict: State, rates over the recent window, counters and recent transitions
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            error_rate, slow_rate = self._rates()
+            return {
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "error_rate": round(error_rate, 3),
+                "slow_rate": round(slow_rate, 3),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in": round(max(0.0, self.opened_at + self.open_seconds - now), 1) if self.state == OPEN else None,
+                "transitions": list(self.transitions)
+            }
+
+
+def is_circuit_breaker_enabled():
+    """
+    Check whether calls are routed around unhealthy providers.
+
+    Returns:
+        bool: False if MICROBOSS_CIRCUIT_BREAKER is set to false
+    """
+    return os.environ.get("MICROBOSS_CIRCUIT_BREAKER", "true").lower() != "false"
+
+
+def _get_number_env(name, default, cast=float):
+    """Read a positive number from the environment."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        number = None
+    if number is None or number <= 0:
+        log_warning(f"Invalid {name} value: {value}. Using default {default}.")
+        return default
+    return number
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider):
+    """
+    Get the process-wide circuit breaker of a provider, configured with
+    MICROBOSS_CIRCUIT_FAILURE_RATE, MICROBOSS_CIRCUIT_SLOW_SECONDS,
+    MICROBOSS_CIRCUIT_WINDOW, MICROBOSS_CIRCUIT_MIN_CALLS and
+    MICROBOSS_CIRCUIT_OPEN_SECONDS.
+
+    Args:
+        provider (str): Name of the provider backend
+
+    Returns:
+        CircuitBreaker: The breaker, or None if MICROBOSS_CIRCUIT_BREAKER is false
+    """
+    if not is_circuit_breaker_enabled():
+        return None
+
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_rate=min(1.0, _get_number_env("MICROBOSS_CIRCUIT_FAILURE_RATE", 0.5)),
+                slow_seconds=_get_number_env("MICROBOSS_CIRCUIT_SLOW_SECONDS", None),
+                window=_get_number_env("MICROBOSS_CIRCUIT_WINDOW", 20, int),
+                min_calls=_get_number_env("MICROBOSS_CIRCUIT_MIN_CALLS", 5, int),
+                open_seconds=_get_number_env("MICROBOSS_CIRCUIT_OPEN_SECONDS", 30.0)
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+
+def is_healthy(backend):
+    """
+    Check whether a backend's circuit breaker is closed.
+
+    Args:
+        backend (ProviderBackend): The backend
+
+    Returns:
+        bool: True if the breaker is closed or breakers are disabled
+    """
+    breaker = get_circuit_breaker(backend.name)
+    return breaker is None or breaker.healthy
+
+
+def route(backend, client, is_async=False):
+    """
+    Choose the provider a call is sent to.
+
+    The backend of the client is used while its breaker allows it. Otherwise the
+    call goes straight to its fallback provider, without paying for a failing call
+    first. When no provider is healthy, the call is sent to the backend anyway.
+
+    Args:
+        backend (ProviderBackend): Backend of the client
+        client: The client the caller asked for
+        is_async (bool): Whether the client is async
+
+    Returns:
+        tuple: (backend, client) to send the call through
+    """
+    breaker = get_circuit_breaker(backend.name)
+    if breaker is None or breaker.allow():
+        return backend, client
+
+    fallback_client = backend.get_fallback_client(is_async)
+    if fallback_client is not None:
+        fallback_backend = backend_for_client(fallback_client)
+        fallback_breaker = get_circuit_breaker(fallback_backend.name)
+        if fallback_breaker.allow():
+            log_debug(
+                "ROUTING AROUND UNHEALTHY PROVIDER",
+                data={"provider": backend.name, "routed_to": fallback_backend.name}
+            )
+            return fallback_backend, fallback_client
+    return backend, client
+
+
+def record_outcome(backend, latency=None, failed=False):
+    """
+    Record the outcome of a call in its provider's circuit breaker. See CircuitBreaker.record().
+    """
+    breaker = get_circuit_breaker(backend.name)
+    if breaker is not None:
+        breaker.record(latency, failed)
+
+
+def get_provider_health():
+    """
+    Get the circuit breaker state of every provider called by the process.
+
+    Returns:
+        dict: Mapping of provider name to CircuitBreaker.stats()
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
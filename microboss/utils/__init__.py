@@ -1,23 +1,46 @@
 """
 Utility modules for the microboss package.
+
+The names below are imported from their modules on first access, so importing a
+single utility module does not import the API functions and their providers.
 """
 
-from microboss.utils.api import get_client, generate_code, fix_code, decompose_task
-from microboss.utils.execution import execute_file
-from microboss.utils.file_utils import (
-    create_task_directory, save_code_to_file, read_code_from_file,
-    save_json_to_file, read_json_from_file, create_safe_filename, ensure_run_directory
-)
-from microboss.utils.logging import (
-    event_logger, log_info, log_success, log_warning, log_error, log_debug,
-    log_task, log_code, log_result, log_execution, LogLevel, LogEvent
-)
-
-__all__ = [
-    "get_client", "generate_code", "fix_code", "decompose_task",
-    "execute_file", 
-    "create_task_directory", "save_code_to_file", "read_code_from_file",
-    "save_json_to_file", "read_json_from_file", "create_safe_filename", "ensure_run_directory",
-    "event_logger", "log_info", "log_success", "log_warning", "log_error", "log_debug",
-    "log_task", "log_code", "log_result", "log_execution", "LogLevel", "LogEvent"
-] 
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    "microboss.utils.api": [
+        "get_client", "generate_code", "fix_code", "decompose_task", "decompose_task_structured"
+    ],
+    "microboss.utils.async_api": [
+        "get_async_client", "async_generate_code", "async_fix_code", "async_decompose_task",
+        "async_decompose_task_structured"
+    ],
+    "microboss.utils.execution": [
+        "execute_file", "execute_file_async", "ExecutionError", "ExecutionTimeoutError"
+    ],
+    "microboss.utils.file_utils": [
+        "create_task_directory", "save_code_to_file", "read_code_from_file",
+        "save_json_to_file", "read_json_from_file", "create_safe_filename", "ensure_run_directory"
+    ],
+    "microboss.utils.logging": [
+        "event_logger", "log_info", "log_success", "log_warning", "log_error", "log_debug",
+        "log_task", "log_code", "log_result", "log_execution", "LogLevel", "LogEvent"
+    ]
+}
+
+_EXPORT_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_EXPORT_MODULES)
+
+
+def __getattr__(name):
+    module = _EXPORT_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
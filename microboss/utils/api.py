@@ -5,80 +5,86 @@ API utilities for the microboss package.
 import os
 import logging
 import json
-import requests
-import anthropic
-import openai
-from dotenv import load_dotenv
+import time
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
-# Load environment variables from .env file
-load_dotenv()
+from microboss.providers.base import backend_for_client, get_backend, select_backend
+from microboss.providers.router import record_outcome, route
+from microboss.utils.batch import get_batch_collector, get_batch_timeout, is_batch_mode
+from microboss.utils.cache import get_response_cache, make_cache_key
+from microboss.utils.cassette import record_exchange
+from microboss.utils.hedging import get_hedge_client, get_hedge_model, get_hedge_provider, get_hedger
+from microboss.utils.patch import get_fix_mode, try_apply_patch
+from microboss.utils.rate_limit import estimate_tokens, get_rate_limiter
+from microboss.utils.streaming import is_streaming_enabled, stream_code
+from microboss.utils.usage import record_llm_call
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-def get_client():
+# System prompts shared by the synchronous and asynchronous API functions
+GENERATE_SYSTEM_PROMPT = "You are an expert Python programmer tasked with generating concise, executable Python code. Your code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Do not include explanations, just the code."
+FIX_SYSTEM_PROMPT = "You are an expert Python programmer tasked with fixing bugs in code. Your fixed code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Return only the fixed code without explanations."
+PATCH_SYSTEM_PROMPT = (
+    "You are an expert Python programmer tasked with fixing bugs in code with targeted edits. The fixed code "
+    "should set a variable named 'result' to the final answer. Do not return the whole file, only the edits, "
+    "each as a block of the form:\n<<<<<<< SEARCH\n<lines of the current code>\n=======\n<replacement lines>\n"
+    ">>>>>>> REPLACE\nThe SEARCH lines must match the current code exactly, including indentation, and "
+    "identify a single place in it. Return only the edit blocks, without explanations."
+)
+DECOMPOSE_SYSTEM_PROMPT = "You are an expert in task decomposition. Your goal is to break down complex tasks into simpler, more manageable subtasks. Each subtask should be small enough to be accomplished with a single Python function. Provide your response as a JSON array of strings."
+DECOMPOSE_STRUCTURED_SYSTEM_PROMPT = (
+    "You are an expert in task decomposition. Your goal is to break down complex tasks into simpler, "
+    "more manageable subtasks. Each subtask should be small enough to be accomplished with a single "
+    "Python function. Provide your response as a single JSON object of the form "
+    '{"subtasks": [{"id": "task_1", "task": "...", "depends_on": []}], "result": "task_1"}, '
+    "where depends_on lists the IDs of the subtasks whose results are needed as inputs, and result "
+    "is the ID of the subtask whose result answers the whole task."
+)
+
+# Appended to a request whose streamed code was cut off by the output token limit
+TRUNCATION_HINT = "\n\nYour previous answer was cut off by the output token limit. Write a shorter solution."
+
+# A single-turn request, passed whole to its retries and fallbacks so none of its settings is lost
+LLMRequest = namedtuple(
+    "LLMRequest", ["system", "prompt", "purpose", "use_cache", "budget", "temperature", "stream", "batch", "config", "task_id", "depth"]
+)
+
+_environment_loaded = False
+
+
+def load_environment():
+    """
+    Load the variables of the .env file into the environment, once per process.
+    
+    Called on first use rather than on import, so importing microboss stays cheap.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        
+        load_dotenv()
+        _environment_loaded = True
+
+
+def get_client(provider=None, api_key=None):
     """
-    Get the Anthropic API client.
+    Get the API client of the selected provider.
+    
+    The provider is named by the argument or MICROBOSS_PROVIDER ("anthropic", "openai"
+    or "local"). Without it, Anthropic is used if its API key is set, falling back to OpenAI.
     
+    Args:
+        provider: Optional provider backend name.
+        api_key: Optional API key of the provider, read from its environment variable if None.
+        
     Returns:
         tuple: (client, model_info) where client is the API client and model_info is a string 
                describing which model is being used (e.g., "Anthropic Claude" or "OpenAI GPT-4").
     """
-    # Get the API key from environment variable
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    
-    if not api_key:
-        logger.warning("Anthropic API key not found. Will try OpenAI as fallback.")
-        # Check if OpenAI key is available
-        openai_key = os.environ.get("OPENAI_API_KEY")
-        if openai_key:
-            logger.info("Using OpenAI as fallback")
-            client, model_info = get_openai_client()
-            return client, model_info
-        else:
-            raise ValueError(
-                "No API keys found. Please set either ANTHROPIC_API_KEY or OPENAI_API_KEY environment variable "
-                "or create a .env file with one of these keys."
-            )
-    
-    # Use the official Anthropic client with safe initialization
-    # Avoid passing "proxies" parameter which seems to be causing issues
-    try:
-        # Try importing and inspecting the Anthropic client to handle version differences
-        import inspect
-        client_params = inspect.signature(anthropic.Anthropic.__init__).parameters
-        client_kwargs = {"api_key": api_key}
-        
-        # Only include supported parameters
-        if 'base_url' in client_params:
-            # This might be used in some environments
-            base_url = os.environ.get("ANTHROPIC_BASE_URL")
-            if base_url:
-                client_kwargs["base_url"] = base_url
-                
-        # Create the client with only supported parameters
-        model_name = os.environ.get("ANTHROPIC_MODEL", "Claude")
-        model_info = f"Anthropic {model_name}"
-        return anthropic.Anthropic(**client_kwargs), model_info
-    except Exception as e:
-        logger.warning(f"Error creating Anthropic client with inspection: {str(e)}")
-        
-        # Try simple initialization
-        try:
-            model_name = os.environ.get("ANTHROPIC_MODEL", "Claude")
-            model_info = f"Anthropic {model_name}"
-            return anthropic.Anthropic(api_key=api_key), model_info
-        except Exception as e:
-            logger.warning(f"Failed to initialize Anthropic client: {str(e)}")
-            
-            # Try OpenAI as fallback
-            openai_key = os.environ.get("OPENAI_API_KEY")
-            if openai_key:
-                logger.info("Using OpenAI as fallback due to Anthropic client initialization failure")
-                client, model_info = get_openai_client()
-                return client, model_info
-            else:
-                raise ValueError(f"Failed to initialize Anthropic client and no OpenAI fallback available: {str(e)}")
+    load_environment()
+    return select_backend(provider).get_client(api_key)
 
 
 def get_openai_client():
@@ -89,45 +95,27 @@ def get_openai_client():
         tuple: (client, model_info) where client is the OpenAI API client and model_info
                is a string describing which model is being used.
     """
-    # Get API key
-    api_key = os.environ.get("OPENAI_API_KEY")
-    
-    if not api_key:
-        raise ValueError(
-            "OpenAI API key not found. Please set the OPENAI_API_KEY environment variable "
-            "or create a .env file with OPENAI_API_KEY=your-api-key."
-        )
-    
-    # Check for custom base URL or organization
-    base_url = os.environ.get("OPENAI_API_BASE")
-    org_id = os.environ.get("OPENAI_ORGANIZATION")
-    
-    # Create the client with supported parameters
-    kwargs = {"api_key": api_key}
-    if base_url:
-        kwargs["base_url"] = base_url
-    if org_id:
-        kwargs["organization"] = org_id
-    
-    # Get the model name from env or use a default
-    model_name = os.environ.get("OPENAI_MODEL", "GPT-4")
-    model_info = f"OpenAI {model_name}"
-    
-    return openai.OpenAI(**kwargs), model_info
+    load_environment()
+    return get_backend("openai").get_client()
 
 
-def get_default_model():
+def get_default_model(provider=None):
     """
     Get the default model to use.
     
+    Args:
+        provider: Optional name of the provider backend of the run.
+        
     Returns:
         str: The model name.
     """
     # Get the model from the environment
     model = os.environ.get("DEFAULT_MODEL")
     
-    # If no model specified, use defaults based on available API
+    # If no model specified, use defaults based on the provider or the available API
     if not model:
+        if provider == "anthropic":
+            return "claude-3-7-sonnet-20250219"
         # Check which API keys are available to determine the default model
         if os.environ.get("ANTHROPIC_API_KEY"):
             return "claude-3-7-sonnet-20250219"  # Latest Claude model
@@ -156,204 +144,567 @@ def get_max_tokens():
         return 4096
 
 
-def generate_code(client, task):
+def get_model_settings(config=None):
     """
-    Generate code to solve a task using the AI API.
+    Get the model and output token limit of the LLM calls of a run.
     
     Args:
-        client: The API client (Anthropic or OpenAI).
-        task: The task to solve.
+        config: Optional RunConfig of the run, the environment is read without one.
         
     Returns:
-        str: The generated code.
+        tuple: (model, max_tokens)
+    """
+    if config is None:
+        return get_default_model(), get_max_tokens()
+    return config.model, config.max_tokens
+
+
+def clean_generated_code(code):
     """
-    model = get_default_model()
-    max_tokens = get_max_tokens()
+    Clean up code returned by the AI API.
     
-    # Try with Anthropic first
-    if isinstance(client, anthropic.Anthropic):
-        try:
-            # Use Messages API (newer)
-            response = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=0,
-                system="You are an expert Python programmer tasked with generating concise, executable Python code. Your code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Do not include explanations, just the code.",
-                messages=[
-                    {"role": "user", "content": f"Generate Python code to solve: '{task}'"}
-                ]
-            )
-            
-            # Extract the code from the response
-            code = response.content[0].text.strip()
+    Args:
+        code: The raw text of the response.
+        
+    Returns:
+        str: The code without markdown fences, guaranteed to set a 'result' variable.
+    """
+    # Remove markdown code blocks if present
+    if code.startswith("```python"):
+        code = code[len("```python"):].strip()
+    elif code.startswith("```"):
+        code = code[len("```"):].strip()
+        
+    if code.endswith("```"):
+        code = code[:-len("```")].strip()
+        
+    # Ensure the code sets a 'result' variable
+    if "result =" not in code and "result=" not in code:
+        code += "\nresult = None  # Default result if not set"
+        
+    return code
+
+
+def _split_subtask_lines(decomposition_text):
+    """Split a decomposition response into subtasks, removing list markers and numbering."""
+    lines = [line.strip() for line in decomposition_text.split("\n") if line.strip()]
+    
+    subtasks = []
+    for line in lines:
+        if line.startswith(("- ", "* ", "• ")):
+            subtasks.append(line[2:].strip())
+        elif len(line) > 2 and line[0].isdigit() and line[1] == ".":
+            subtasks.append(line[2:].strip())
+        elif len(line) > 3 and line[0].isdigit() and line[1].isdigit() and line[2] == ".":
+            subtasks.append(line[3:].strip())
+        else:
+            subtasks.append(line)
+    return subtasks
+
+
+def parse_subtasks(decomposition_text, depth):
+    """
+    Parse the list of subtasks from a decomposition response.
+    
+    Args:
+        decomposition_text: The raw text of the response.
+        depth: The requested number of subtasks.
+        
+    Returns:
+        list: The list of subtasks.
+    """
+    # Try to parse JSON array from the response
+    try:
+        # Find JSON array in the response
+        start_idx = decomposition_text.find("[")
+        end_idx = decomposition_text.rfind("]") + 1
+        
+        if start_idx >= 0 and end_idx > start_idx:
+            json_str = decomposition_text[start_idx:end_idx]
+            subtasks = json.loads(json_str)
             
-            # Remove markdown code blocks if present
-            if code.startswith("```python"):
-                code = code[len("```python"):].strip()
-            elif code.startswith("```"):
-                code = code[len("```"):].strip()
-                
-            if code.endswith("```"):
-                code = code[:-len("```")].strip()
+            # Ensure we have the right number of subtasks
+            if len(subtasks) != depth:
+                logger.warning(f"Expected {depth} subtasks, but got {len(subtasks)}. Using as is.")
+            return subtasks
+        
+        # Fallback to splitting by newlines if no JSON array found
+        logger.warning("Could not find JSON array in response. Falling back to line splitting.")
+    except json.JSONDecodeError:
+        # Fallback to splitting by newlines if JSON parsing fails
+        logger.warning("Failed to parse JSON from response. Falling back to line splitting.")
+    
+    subtasks = _split_subtask_lines(decomposition_text)
+    
+    # Limit to the requested depth
+    return subtasks[:depth] if len(subtasks) >= depth else subtasks
+
+
+def parse_structured_decomposition(decomposition_text, depth):
+    """
+    Parse a structured decomposition response.
+    
+    Falls back to a linear chain of subtasks when the response is a plain list.
+    
+    Args:
+        decomposition_text: The raw text of the response.
+        depth: The requested number of subtasks.
+        
+    Returns:
+        dict: {"subproblems": [(id, task, dependencies), ...], "aggregation_key": id}
+    """
+    start_idx = decomposition_text.find("{")
+    end_idx = decomposition_text.rfind("}") + 1
+    
+    if start_idx >= 0 and end_idx > start_idx:
+        try:
+            data = json.loads(decomposition_text[start_idx:end_idx])
+            entries = data.get("subtasks") if isinstance(data, dict) else None
+            if isinstance(entries, list) and entries:
+                subproblems = []
+                for i, entry in enumerate(entries):
+                    if isinstance(entry, dict):
+                        subtask_id = str(entry.get("id") or f"task_{i+1}")
+                        subtask = str(entry.get("task") or entry.get("description") or "")
+                        deps = entry.get("depends_on") or entry.get("dependencies") or []
+                    else:
+                        subtask_id, subtask, deps = f"task_{i+1}", str(entry), []
+                    if isinstance(deps, str):
+                        deps = [deps]
+                    subproblems.append((subtask_id, subtask, [str(dep) for dep in deps]))
                 
-            # Ensure the code sets a 'result' variable
-            if "result =" not in code and "result=" not in code:
-                code += "\nresult = None  # Default result if not set"
+                if len(subproblems) != depth:
+                    logger.warning(f"Expected {depth} subtasks, but got {len(subproblems)}. Using as is.")
                 
-            return code
-            
-        except Exception as e:
-            logger.error(f"Failed to generate code with Anthropic: {str(e)}")
-            
-            # Try OpenAI fallback if available
-            openai_key = os.environ.get("OPENAI_API_KEY")
-            if openai_key:
-                logger.info("Falling back to OpenAI for code generation")
-                openai_client = get_openai_client()
-                return generate_code(openai_client, task)
-            else:
-                raise ValueError(f"Failed to generate code: {str(e)}")
-    
-    # If we're using OpenAI client (fallback or direct)
-    elif hasattr(client, 'chat') and hasattr(client.chat, 'completions'):
+                aggregation_key = data.get("result")
+                if aggregation_key is None:
+                    aggregation_key = subproblems[-1][0]
+                return {"subproblems": subproblems, "aggregation_key": str(aggregation_key)}
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            pass
+    
+    # Fall back to a plain list of subtasks, each depending on the previous one
+    logger.warning("Could not find a structured decomposition in response. Using sequential subtasks.")
+    subtasks = parse_subtasks(decomposition_text, depth)
+    subproblems = [
+        (f"task_{i+1}", str(subtask), [f"task_{i}"] if i > 0 else [])
+        for i, subtask in enumerate(subtasks)
+    ]
+    return {
+        "subproblems": subproblems,
+        "aggregation_key": subproblems[-1][0] if subproblems else None
+    }
+
+
+def make_request(system, prompt, purpose, use_cache=True, budget=None, temperature=0, stream=False, batch=False, config=None, task_id=None, depth=None):
+    """
+    Build a single-turn request to the AI API.
+    
+    Args:
+        system: The system prompt.
+        prompt: The user message.
+        purpose: What the request is for, used in error messages (e.g. "generate code").
+        use_cache: Whether to serve and store the response in the persistent response cache.
+        budget: Optional Budget charged for the call and its tokens, and accounting for its usage. Cache hits are free.
+        temperature: Sampling temperature.
+        stream: Whether to stream the response and return its code as soon as the code block is complete.
+        batch: Whether to submit the request as part of a batch job, if the provider supports it.
+        config: Optional RunConfig of the run, whose model and token limit are used.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        depth: Optional depth of the calling task, recorded with the call's usage.
+        
+    Returns:
+        LLMRequest: The request.
+    """
+    return LLMRequest(system, prompt, purpose, use_cache, budget, temperature, stream, batch, config, task_id, depth)
+
+
+def generate_request(task, use_cache=True, budget=None, temperature=0, hint=None, config=None, task_id=None, depth=None):
+    """Build the request of generate_code()."""
+    return make_request(
+        GENERATE_SYSTEM_PROMPT,
+        f"Generate Python code to solve: '{task}'" + (f"\n\n{hint}" if hint else ""),
+        "generate code",
+        use_cache,
+        budget,
+        temperature,
+        config.streaming if config else is_streaming_enabled(),
+        config.batch if config else is_batch_mode(),
+        config,
+        task_id,
+        depth
+    )
+
+
+def patch_request(code, error, use_cache=True, budget=None, config=None, task_id=None, depth=None):
+    """Build the request of fix_code() asking for targeted edits."""
+    return make_request(
+        PATCH_SYSTEM_PROMPT,
+        build_fix_prompt(code, error, patch=True),
+        "patch code",
+        use_cache,
+        budget,
+        config=config,
+        task_id=task_id,
+        depth=depth
+    )
+
+
+def fix_request(code, error, use_cache=True, budget=None, config=None, task_id=None, depth=None):
+    """Build the request of fix_code() asking for the whole fixed file."""
+    return make_request(
+        FIX_SYSTEM_PROMPT,
+        build_fix_prompt(code, error),
+        "fix code",
+        use_cache,
+        budget,
+        stream=config.streaming if config else is_streaming_enabled(),
+        config=config,
+        task_id=task_id,
+        depth=depth
+    )
+
+
+def decompose_request(task, depth, use_cache=True, budget=None, config=None, structured=False, task_id=None):
+    """Build the request of decompose_task(), or of decompose_task_structured() if structured."""
+    return make_request(
+        DECOMPOSE_STRUCTURED_SYSTEM_PROMPT if structured else DECOMPOSE_SYSTEM_PROMPT,
+        f"Decompose the following task into {depth} subtasks: '{task}'",
+        "decompose task",
+        use_cache,
+        budget,
+        config=config,
+        task_id=task_id,
+        depth=depth
+    )
+
+
+def response_cache_key(backend, request, model, max_tokens):
+    """
+    Get the key of a request in the response cache, for the provider and model that answer it.
+    
+    Args:
+        backend: Backend the request is sent to.
+        request: The LLMRequest.
+        model: The model, as resolved by the backend.
+        max_tokens: Output token limit of the request.
+        
+    Returns:
+        str: The cache key.
+    """
+    messages = backend.cache_messages(request.system, request.prompt)
+    return make_cache_key(backend.name, model, request.system, messages, max_tokens, request.temperature)
+
+
+def lookup_cached_response(backend, request, model, max_tokens):
+    """
+    Serve a request from the persistent response cache.
+    
+    Args:
+        backend: Backend the request is sent to.
+        request: The LLMRequest.
+        model: The model, as resolved by the backend.
+        max_tokens: Output token limit of the request.
+        
+    Returns:
+        tuple: (cache, text) where cache is None if the response must not be cached,
+               and text is the cached response or None on a miss.
+    """
+    cache = get_response_cache() if request.use_cache and backend.cacheable else None
+    if not cache:
+        return None, None
+    
+    cached = cache.get(response_cache_key(backend, request, model, max_tokens))
+    if cached is not None:
+        record_exchange(
+            request.system, request.prompt, request.temperature, cached, request.purpose, backend.name, model, cached=True
+        )
+        if request.budget:
+            request.budget.record_cache_hit()
+    return cache, cached
+
+
+def plan_hedge(backend, client, request, run_model, is_async=False):
+    """
+    Get how a call is hedged, with the hedge settings of the request's run.
+    
+    Args:
+        backend: Backend the call is sent to.
+        client: Client the call is sent with.
+        request: The LLMRequest.
+        run_model: The model of the run.
+        is_async: Whether an asynchronous hedge client is needed.
+        
+    Returns:
+        tuple: (hedger, hedge_client, hedge_model), or (None, None, None) if the call is not hedged.
+    """
+    config = request.config
+    hedger = get_hedger(config.hedge if config else None)
+    # A batched request already waits for its whole job, hedging it would not help
+    if hedger is None or request.batch:
+        return None, None, None
+    
+    hedge_client = get_hedge_client(
+        backend, client, is_async, config.hedge_provider if config else get_hedge_provider()
+    )
+    if hedge_client is None:
+        return None, None, None
+    hedge_model = (config.hedge_model if config else get_hedge_model()) or run_model
+    return hedger, hedge_client, backend_for_client(hedge_client).resolve_model(hedge_model)
+
+
+def get_fallback_client(backend, request, error, is_async=False):
+    """
+    Get the client to send a failed request to instead.
+    
+    Args:
+        backend: Backend the request failed with.
+        request: The LLMRequest.
+        error: The error of the request.
+        is_async: Whether an asynchronous client is needed.
+        
+    Returns:
+        The client of the backend's fallback provider.
+        
+    Raises:
+        ValueError: If the backend has no fallback provider.
+    """
+    logger.error(f"Failed to {request.purpose} with {backend.label}: {str(error)}")
+    
+    fallback_client = backend.get_fallback_client(is_async=is_async)
+    if fallback_client is None:
+        raise ValueError(f"Failed to {request.purpose}: {str(error)}") from error
+    logger.info(f"Falling back to {backend_for_client(fallback_client).label} to {request.purpose}")
+    return fallback_client
+
+
+def finish_response(request, backend, model, max_tokens, text, usage, latency, truncated, cache):
+    """
+    Record a response and store it in the response cache.
+    
+    Args:
+        request: The LLMRequest.
+        backend: Backend that answered the request.
+        model: The model that answered the request.
+        max_tokens: Output token limit of the request.
+        text: The text of the response, or its code when streamed.
+        usage: Token usage of the response.
+        latency: Latency of the response in seconds.
+        truncated: Whether the code was cut off by the output token limit.
+        cache: The response cache, or None.
+        
+    Returns:
+        LLMRequest: The request to send again for code that fits in the output limit, or None.
+    """
+    record_exchange(
+        request.system, request.prompt, request.temperature, text, request.purpose, backend.name, model, usage, latency
+    )
+    
+    # Ask once more for code that fits in the output limit, rather than executing cut off code
+    if truncated and TRUNCATION_HINT not in request.prompt:
+        return request._replace(prompt=request.prompt + TRUNCATION_HINT)
+    
+    # Key the response by the provider and model that answered it, which the circuit
+    # breaker may have switched since the lookup, so no run replays another provider's answer
+    if cache and not truncated and backend.cacheable:
+        cache.set(response_cache_key(backend, request, model, max_tokens), text, provider=backend.name, model=model)
+    return None
+
+
+def settle_call(backend, request, model, usage, latency):
+    """
+    Account for an answered call.
+    
+    Args:
+        backend: Backend the call was sent to.
+        request: The LLMRequest.
+        model: The model of the call.
+        usage: Token usage of the response.
+        latency: Latency of the response in seconds.
+    """
+    record_outcome(backend, latency)
+    record_llm_call(
+        request.budget, request.purpose, backend, model, usage, latency, task_id=request.task_id, depth=request.depth
+    )
+
+
+def _call(backend, client, request, model, max_tokens):
+    """
+    Send a request through a backend, once the rate limiter allows it, and account for its usage.
+    In batch mode the request is added to the provider's next batch job instead.
+    
+    Returns:
+        tuple: (text, usage, truncated, latency)
+    """
+    system, prompt, temperature = request.system, request.prompt, request.temperature
+    collector = get_batch_collector(backend, client) if request.batch else None
+    if collector is not None:
+        # Batch jobs have their own quota, so they skip the rate limiter
+        future = collector.submit(system, prompt, model, max_tokens, temperature)
         try:
-            # Use ChatCompletions API
-            response = client.chat.completions.create(
-                model=model if "gpt" in model else "gpt-4o-2024-05-13",  # Ensure we use a GPT model
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": "You are an expert Python programmer tasked with generating concise, executable Python code. Your code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Do not include explanations, just the code."},
-                    {"role": "user", "content": f"Generate Python code to solve: '{task}'"}
-                ]
+            text, usage, latency = future.result(timeout=get_batch_timeout(request.budget))
+        except FutureTimeoutError:
+            # Left out of the batch job if it has not been submitted yet
+            future.cancel()
+            raise
+        record_llm_call(
+            request.budget, request.purpose, backend, model, usage, latency, batch=True,
+            task_id=request.task_id, depth=request.depth
+        )
+        return text, usage, False, latency
+    
+    # Queue behind other callers of the same provider and model when a rate limit is set
+    limiter = get_rate_limiter(backend.name, model, request.config.rate_limits if request.config else None)
+    reservation = limiter.acquire(estimate_tokens(system, prompt)) if limiter else None
+    
+    usage = None
+    try:
+        start_time = time.perf_counter()
+        truncated = False
+        if request.stream:
+            text, usage, truncated = stream_code(
+                backend.stream(client, system, prompt, model, max_tokens, temperature), system, prompt, request.purpose
             )
+        else:
+            text, usage = backend.complete(client, system, prompt, model, max_tokens, temperature)
+        latency = time.perf_counter() - start_time
+    except Exception:
+        record_outcome(backend, failed=True)
+        raise
+    finally:
+        # Also reached when the caller is interrupted, so the reserved tokens are never kept
+        if reservation:
+            reservation.reconcile(usage.total if usage else 0)
+    
+    settle_call(backend, request, model, usage, latency)
+    return text, usage, truncated, latency
+
+
+def _complete(client, request):
+    """
+    Send a single-turn request to the AI API and return the response text.
+    
+    Args:
+        client: The API client of any registered provider backend.
+        request: The LLMRequest, see make_request().
+        
+    Returns:
+        str: The text of the response, or its code when streamed.
+    """
+    backend = backend_for_client(client)
+    run_model, max_tokens = get_model_settings(request.config)
+    cache, cached = lookup_cached_response(backend, request, backend.resolve_model(run_model), max_tokens)
+    if cached is not None:
+        return cached
+    
+    if request.budget:
+        request.budget.charge_llm_call()
+    
+    # Go straight to a healthy provider while the circuit breaker of this one is open
+    backend, client = route(backend, client)
+    model = backend.resolve_model(run_model)
+    
+    try:
+        hedger, hedge_client, hedge_model = plan_hedge(backend, client, request, run_model)
+        if hedger is None:
+            text, usage, truncated, latency = _call(backend, client, request, model, max_tokens)
+        else:
+            hedge_backend = backend_for_client(hedge_client)
             
-            # Extract the code
-            code = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if code.startswith("```python"):
-                code = code[len("```python"):].strip()
-            elif code.startswith("```"):
-                code = code[len("```"):].strip()
-                
-            if code.endswith("```"):
-                code = code[:-len("```")].strip()
-                
-            # Ensure the code sets a 'result' variable
-            if "result =" not in code and "result=" not in code:
-                code += "\nresult = None  # Default result if not set"
-                
-            return code
+            def send_hedge():
+                if request.budget:
+                    request.budget.charge_llm_call()
+                return _call(hedge_backend, hedge_client, request, hedge_model, max_tokens)
             
-        except Exception as e:
-            logger.error(f"Failed to generate code with OpenAI: {str(e)}")
-            raise ValueError(f"Failed to generate code: {str(e)}")
+            (text, usage, truncated, latency), hedged = hedger.run(
+                (backend.name, model, request.purpose),
+                lambda: _call(backend, client, request, model, max_tokens),
+                send_hedge,
+                hedge_backend.label
+            )
+            if hedged:
+                backend, model = hedge_backend, hedge_model
+    except Exception as e:
+        # Try the backend's fallback provider if available
+        return _complete(get_fallback_client(backend, request, e), request)
     
-    # Unknown client type
-    else:
-        raise ValueError(f"Unsupported client type: {type(client)}")
+    retry_request = finish_response(request, backend, model, max_tokens, text, usage, latency, truncated, cache)
+    if retry_request is not None:
+        return _complete(client, retry_request)
+    return text
 
 
-def fix_code(client, code, error):
+def generate_code(client, task, use_cache=True, budget=None, temperature=0, hint=None, config=None, task_id=None, depth=None):
+    """
+    Generate code to solve a task using the AI API.
+    
+    Args:
+        client: The API client (Anthropic or OpenAI).
+        task: The task to solve.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        temperature: Sampling temperature.
+        hint: Optional extra instruction steering the solution, e.g. for diverse candidates.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        depth: Optional depth of the calling task, recorded with the call's usage.
+        
+    Returns:
+        str: The generated code.
+    """
+    request = generate_request(task, use_cache, budget, temperature, hint, config, task_id, depth)
+    return clean_generated_code(_complete(client, request))
+
+
+def build_fix_prompt(code, error, patch=False):
+    """
+    Build the user message asking to fix some code.
+    
+    Args:
+        code: The code to fix.
+        error: The error message.
+        patch: Whether targeted edits are asked for rather than the whole fixed file.
+        
+    Returns:
+        str: The prompt.
+    """
+    if patch:
+        return f"Fix this Python code that has the following error, with targeted edits:\n\nERROR: {error}\n\nCODE:\n{code}"
+    return f"Fix this Python code that has the following error:\n\nERROR: {error}\n\nCODE:\n{code}"
+
+
+def fix_code(client, code, error, use_cache=True, budget=None, config=None, task_id=None, depth=None):
     """
     Fix code using the AI API.
     
+    The fix mode comes from the run's RunConfig.fix_mode (MICROBOSS_FIX_MODE,
+    "full" by default). In the "patch" mode the model returns targeted edits,
+    which are applied and checked locally, so only the changed lines are
+    generated. The whole fixed file is asked for when the edits do not apply.
+    
     Args:
         client: The API client (Anthropic or OpenAI).
         code: The code to fix.
         error: The error message.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        depth: Optional depth of the calling task, recorded with the call's usage.
         
     Returns:
         str: The fixed code.
     """
-    model = get_default_model()
-    max_tokens = get_max_tokens()
+    if (config.fix_mode if config else get_fix_mode()) == "patch":
+        patch = _complete(client, patch_request(code, error, use_cache, budget, config, task_id, depth))
+        patched_code = try_apply_patch(code, patch)
+        if patched_code is not None:
+            return clean_generated_code(patched_code)
     
-    # Try with Anthropic first
-    if isinstance(client, anthropic.Anthropic):
-        try:
-            # Use Messages API (newer)
-            response = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=0,
-                system="You are an expert Python programmer tasked with fixing bugs in code. Your fixed code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Return only the fixed code without explanations.",
-                messages=[
-                    {"role": "user", "content": f"Fix this Python code that has the following error:\n\nERROR: {error}\n\nCODE:\n{code}"}
-                ]
-            )
-            
-            # Extract the code from the response
-            fixed_code = response.content[0].text.strip()
-            
-            # Remove markdown code blocks if present
-            if fixed_code.startswith("```python"):
-                fixed_code = fixed_code[len("```python"):].strip()
-            elif fixed_code.startswith("```"):
-                fixed_code = fixed_code[len("```"):].strip()
-                
-            if fixed_code.endswith("```"):
-                fixed_code = fixed_code[:-len("```")].strip()
-                
-            # Ensure the code sets a 'result' variable
-            if "result =" not in fixed_code and "result=" not in fixed_code:
-                fixed_code += "\nresult = None  # Default result if not set"
-                
-            return fixed_code
-            
-        except Exception as e:
-            logger.error(f"Failed to fix code with Anthropic: {str(e)}")
-            
-            # Try OpenAI fallback if available
-            openai_key = os.environ.get("OPENAI_API_KEY")
-            if openai_key:
-                logger.info("Falling back to OpenAI for code fixing")
-                openai_client = get_openai_client()
-                return fix_code(openai_client, code, error)
-            else:
-                raise ValueError(f"Failed to fix code: {str(e)}")
-    
-    # If we're using OpenAI client (fallback or direct)
-    elif hasattr(client, 'chat') and hasattr(client.chat, 'completions'):
-        try:
-            # Use ChatCompletions API
-            response = client.chat.completions.create(
-                model=model if "gpt" in model else "gpt-4o-2024-05-13",  # Ensure we use a GPT model
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": "You are an expert Python programmer tasked with fixing bugs in code. Your fixed code should set a variable named 'result' to the final answer. Make sure to handle edge cases appropriately. Return only the fixed code without explanations."},
-                    {"role": "user", "content": f"Fix this Python code that has the following error:\n\nERROR: {error}\n\nCODE:\n{code}"}
-                ]
-            )
-            
-            # Extract the code
-            fixed_code = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if fixed_code.startswith("```python"):
-                fixed_code = fixed_code[len("```python"):].strip()
-            elif fixed_code.startswith("```"):
-                fixed_code = fixed_code[len("```"):].strip()
-                
-            if fixed_code.endswith("```"):
-                fixed_code = fixed_code[:-len("```")].strip()
-                
-            # Ensure the code sets a 'result' variable
-            if "result =" not in fixed_code and "result=" not in fixed_code:
-                fixed_code += "\nresult = None  # Default result if not set"
-                
-            return fixed_code
-            
-        except Exception as e:
-            logger.error(f"Failed to fix code with OpenAI: {str(e)}")
-            raise ValueError(f"Failed to fix code: {str(e)}")
-    
-    # Unknown client type
-    else:
-        raise ValueError(f"Unsupported client type: {type(client)}")
+    return clean_generated_code(_complete(client, fix_request(code, error, use_cache, budget, config, task_id, depth)))
 
 
-def decompose_task(client, task, depth):
+def decompose_task(client, task, depth, use_cache=True, budget=None, config=None, task_id=None):
     """
     Decompose a task into subtasks using the AI API.
     
@@ -361,170 +712,35 @@ def decompose_task(client, task, depth):
         client: The API client (Anthropic or OpenAI).
         task: The task to decompose.
         depth: The depth of decomposition.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
         
     Returns:
         list: The list of subtasks.
     """
-    model = get_default_model()
-    max_tokens = get_max_tokens()
+    decomposition_text = _complete(client, decompose_request(task, depth, use_cache, budget, config, task_id=task_id))
+    return parse_subtasks(decomposition_text, depth)
+
+
+def decompose_task_structured(client, task, depth, use_cache=True, budget=None, config=None, task_id=None):
+    """
+    Decompose a task into subtasks with explicit dependencies using a single AI API call.
     
-    # Try with Anthropic first
-    if isinstance(client, anthropic.Anthropic):
-        try:
-            # Use Messages API (newer)
-            response = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=0,
-                system="You are an expert in task decomposition. Your goal is to break down complex tasks into simpler, more manageable subtasks. Each subtask should be small enough to be accomplished with a single Python function. Provide your response as a JSON array of strings.",
-                messages=[
-                    {"role": "user", "content": f"Decompose the following task into {depth} subtasks: '{task}'"}
-                ]
-            )
-            
-            # Extract the text from the response
-            decomposition_text = response.content[0].text.strip()
-            
-            # Try to parse JSON array from the response
-            try:
-                # Find JSON array in the response
-                start_idx = decomposition_text.find("[")
-                end_idx = decomposition_text.rfind("]") + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_str = decomposition_text[start_idx:end_idx]
-                    subtasks = json.loads(json_str)
-                    
-                    # Ensure we have the right number of subtasks
-                    if len(subtasks) == depth:
-                        return subtasks
-                    else:
-                        logger.warning(f"Expected {depth} subtasks, but got {len(subtasks)}. Using as is.")
-                        return subtasks
-                else:
-                    # Fallback to splitting by newlines if no JSON array found
-                    logger.warning("Could not find JSON array in response. Falling back to line splitting.")
-                    lines = [line.strip() for line in decomposition_text.split("\n") if line.strip()]
-                    
-                    # Remove numbered prefixes like "1.", "2.", etc.
-                    subtasks = []
-                    for line in lines:
-                        if line.startswith(("- ", "* ", "• ")):
-                            subtasks.append(line[2:].strip())
-                        elif len(line) > 2 and line[0].isdigit() and line[1] == ".":
-                            subtasks.append(line[2:].strip())
-                        elif len(line) > 3 and line[0].isdigit() and line[1].isdigit() and line[2] == ".":
-                            subtasks.append(line[3:].strip())
-                        else:
-                            subtasks.append(line)
-                    
-                    # Limit to the requested depth
-                    return subtasks[:depth] if len(subtasks) >= depth else subtasks
-            except json.JSONDecodeError:
-                # Fallback to splitting by newlines if JSON parsing fails
-                logger.warning("Failed to parse JSON from response. Falling back to line splitting.")
-                lines = [line.strip() for line in decomposition_text.split("\n") if line.strip()]
-                
-                # Process lines to remove markers and numbering
-                subtasks = []
-                for line in lines:
-                    if line.startswith(("- ", "* ", "• ")):
-                        subtasks.append(line[2:].strip())
-                    elif len(line) > 2 and line[0].isdigit() and line[1] == ".":
-                        subtasks.append(line[2:].strip())
-                    elif len(line) > 3 and line[0].isdigit() and line[1].isdigit() and line[2] == ".":
-                        subtasks.append(line[3:].strip())
-                    else:
-                        subtasks.append(line)
-                
-                # Limit to the requested depth
-                return subtasks[:depth] if len(subtasks) >= depth else subtasks
-        except Exception as e:
-            logger.error(f"Failed to decompose task with Anthropic: {str(e)}")
-            
-            # Try OpenAI fallback if available
-            openai_key = os.environ.get("OPENAI_API_KEY")
-            if openai_key:
-                logger.info("Falling back to OpenAI for task decomposition")
-                openai_client = get_openai_client()
-                return decompose_task(openai_client, task, depth)
-            else:
-                raise ValueError(f"Failed to decompose task: {str(e)}")
-    
-    # If we're using OpenAI client (fallback or direct)
-    elif hasattr(client, 'chat') and hasattr(client.chat, 'completions'):
-        try:
-            # Use ChatCompletions API
-            response = client.chat.completions.create(
-                model=model if "gpt" in model else "gpt-4o-2024-05-13",  # Ensure we use a GPT model
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": "You are an expert in task decomposition. Your goal is to break down complex tasks into simpler, more manageable subtasks. Each subtask should be small enough to be accomplished with a single Python function. Provide your response as a JSON array of strings."},
-                    {"role": "user", "content": f"Decompose the following task into {depth} subtasks: '{task}'"}
-                ]
-            )
-            
-            # Extract the text
-            decomposition_text = response.choices[0].message.content.strip()
-            
-            # Try to parse JSON array from the response
-            try:
-                # Find JSON array in the response
-                start_idx = decomposition_text.find("[")
-                end_idx = decomposition_text.rfind("]") + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_str = decomposition_text[start_idx:end_idx]
-                    subtasks = json.loads(json_str)
-                    
-                    # Ensure we have the right number of subtasks
-                    if len(subtasks) == depth:
-                        return subtasks
-                    else:
-                        logger.warning(f"Expected {depth} subtasks, but got {len(subtasks)}. Using as is.")
-                        return subtasks
-                else:
-                    # Fallback to splitting by newlines if no JSON array found
-                    logger.warning("Could not find JSON array in response. Falling back to line splitting.")
-                    lines = [line.strip() for line in decomposition_text.split("\n") if line.strip()]
-                    
-                    # Remove numbered prefixes like "1.", "2.", etc.
-                    subtasks = []
-                    for line in lines:
-                        if line.startswith(("- ", "* ", "• ")):
-                            subtasks.append(line[2:].strip())
-                        elif len(line) > 2 and line[0].isdigit() and line[1] == ".":
-                            subtasks.append(line[2:].strip())
-                        elif len(line) > 3 and line[0].isdigit() and line[1].isdigit() and line[2] == ".":
-                            subtasks.append(line[3:].strip())
-                        else:
-                            subtasks.append(line)
-                    
-                    # Limit to the requested depth
-                    return subtasks[:depth] if len(subtasks) >= depth else subtasks
-            except json.JSONDecodeError:
-                # Fallback to splitting by newlines if JSON parsing fails
-                logger.warning("Failed to parse JSON from response. Falling back to line splitting.")
-                lines = [line.strip() for line in decomposition_text.split("\n") if line.strip()]
-                
-                # Process lines to remove markers and numbering
-                subtasks = []
-                for line in lines:
-                    if line.startswith(("- ", "* ", "• ")):
-                        subtasks.append(line[2:].strip())
-                    elif len(line) > 2 and line[0].isdigit() and line[1] == ".":
-                        subtasks.append(line[2:].strip())
-                    elif len(line) > 3 and line[0].isdigit() and line[1].isdigit() and line[2] == ".":
-                        subtasks.append(line[3:].strip())
-                    else:
-                        subtasks.append(line)
-                
-                # Limit to the requested depth
-                return subtasks[:depth] if len(subtasks) >= depth else subtasks
-        except Exception as e:
-            logger.error(f"Failed to decompose task with OpenAI: {str(e)}")
-            raise ValueError(f"Failed to decompose task: {str(e)}")
-    
-    # Unknown client type
-    else:
-        raise ValueError(f"Unsupported client type: {type(client)}")
\ No newline at end of file
+    Args:
+        client: The API client (Anthropic or OpenAI).
+        task: The task to decompose.
+        depth: The depth of decomposition.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        
+    Returns:
+        dict: The decomposition, as returned by parse_structured_decomposition.
+    """
+    decomposition_text = _complete(
+        client, decompose_request(task, depth, use_cache, budget, config, structured=True, task_id=task_id)
+    )
+    return parse_structured_decomposition(decomposition_text, depth)
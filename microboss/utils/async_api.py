@@ -0,0 +1,244 @@
+"""
+Asynchronous API utilities for the microboss package.
+"""
+
+import asyncio
+import logging
+import time
+
+from microboss.providers.base import backend_for_client, get_backend, select_backend
+from microboss.providers.router import record_outcome, route
+from microboss.utils.api import (
+    get_model_settings, clean_generated_code, parse_subtasks, parse_structured_decomposition,
+    generate_request, patch_request, fix_request, decompose_request, lookup_cached_response,
+    plan_hedge, get_fallback_client, finish_response, settle_call, load_environment
+)
+from microboss.utils.batch import get_batch_collector, get_batch_timeout
+from microboss.utils.patch import get_fix_mode, try_apply_patch
+from microboss.utils.rate_limit import estimate_tokens, get_rate_limiter
+from microboss.utils.streaming import async_stream_code
+from microboss.utils.usage import record_llm_call
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+def get_async_client(provider=None, api_key=None):
+    """
+    Get the asynchronous API client of the selected provider. See get_client().
+
+    Args:
+        provider: Optional provider backend name.
+        api_key: Optional API key of the provider, read from its environment variable if None.
+
+    Returns:
+        tuple: (client, model_info) where client is the async API client and model_info is a string
+               describing which model is being used (e.g., "Anthropic Claude" or "OpenAI GPT-4").
+    """
+    load_environment()
+    return select_backend(provider).get_async_client(api_key)
+
+
+def get_async_openai_client():
+    """
+    Get the asynchronous OpenAI API client.
+
+    Returns:
+        tuple: (client, model_info) where client is the async OpenAI API client and model_info
+               is a string describing which model is being used.
+    """
+    load_environment()
+    return get_backend("openai").get_async_client()
+
+
+async def _call(backend, client, request, model, max_tokens):
+    """
+    Send a request through a backend, once the rate limiter allows it, and account for its usage.
+    In batch mode the request is added to the provider's next batch job instead.
+
+    Returns:
+        tuple: (text, usage, truncated, latency)
+    """
+    system, prompt, temperature = request.system, request.prompt, request.temperature
+    collector = get_batch_collector(backend, client) if request.batch else None
+    if collector is not None:
+        # Batch jobs have their own quota, so they skip the rate limiter. On timeout the
+        # request is cancelled, which leaves it out of the batch job if not submitted yet
+        future = asyncio.wrap_future(collector.submit(system, prompt, model, max_tokens, temperature))
+        text, usage, latency = await asyncio.wait_for(future, get_batch_timeout(request.budget))
+        record_llm_call(
+            request.budget, request.purpose, backend, model, usage, latency, batch=True,
+            task_id=request.task_id, depth=request.depth
+        )
+        return text, usage, False, latency
+
+    # Queue behind other callers of the same provider and model when a rate limit is set
+    limiter = get_rate_limiter(backend.name, model, request.config.rate_limits if request.config else None)
+    reservation = await limiter.acquire_async(estimate_tokens(system, prompt)) if limiter else None
+
+    usage = None
+    try:
+        start_time = time.perf_counter()
+        truncated = False
+        if request.stream:
+            text, usage, truncated = await async_stream_code(
+                backend.astream(client, system, prompt, model, max_tokens, temperature), system, prompt, request.purpose
+            )
+        else:
+            text, usage = await backend.acomplete(client, system, prompt, model, max_tokens, temperature)
+        latency = time.perf_counter() - start_time
+    except Exception:
+        record_outcome(backend, failed=True)
+        raise
+    finally:
+        # CancelledError is not an Exception: a cancelled hedge loser gives its reserved tokens back here
+        if reservation:
+            reservation.reconcile(usage.total if usage else 0)
+
+    settle_call(backend, request, model, usage, latency)
+    return text, usage, truncated, latency
+
+
+async def _complete(client, request):
+    """
+    Send a single-turn request to the AI API and return the response text. See api._complete().
+
+    Args:
+        client: The async API client of any registered provider backend.
+        request: The LLMRequest, see make_request().
+
+    Returns:
+        str: The text of the response, or its code when streamed.
+    """
+    backend = backend_for_client(client)
+    run_model, max_tokens = get_model_settings(request.config)
+    cache, cached = lookup_cached_response(backend, request, backend.resolve_model(run_model), max_tokens)
+    if cached is not None:
+        return cached
+
+    if request.budget:
+        request.budget.charge_llm_call()
+
+    # Go straight to a healthy provider while the circuit breaker of this one is open
+    backend, client = route(backend, client, is_async=True)
+    model = backend.resolve_model(run_model)
+
+    try:
+        hedger, hedge_client, hedge_model = plan_hedge(backend, client, request, run_model, is_async=True)
+        if hedger is None:
+            text, usage, truncated, latency = await _call(backend, client, request, model, max_tokens)
+        else:
+            hedge_backend = backend_for_client(hedge_client)
+
+            async def send_hedge():
+                if request.budget:
+                    request.budget.charge_llm_call()
+                return await _call(hedge_backend, hedge_client, request, hedge_model, max_tokens)
+
+            (text, usage, truncated, latency), hedged = await hedger.run_async(
+                (backend.name, model, request.purpose),
+                lambda: _call(backend, client, request, model, max_tokens),
+                send_hedge,
+                hedge_backend.label
+            )
+            if hedged:
+                backend, model = hedge_backend, hedge_model
+    except Exception as e:
+        # Try the backend's fallback provider if available
+        return await _complete(get_fallback_client(backend, request, e, is_async=True), request)
+
+    retry_request = finish_response(request, backend, model, max_tokens, text, usage, latency, truncated, cache)
+    if retry_request is not None:
+        return await _complete(client, retry_request)
+    return text
+
+
+async def async_generate_code(client, task, use_cache=True, budget=None, temperature=0, hint=None, config=None, task_id=None, depth=None):
+    """
+    Generate code to solve a task using the async AI API.
+
+    Args:
+        client: The async API client (Anthropic or OpenAI).
+        task: The task to solve.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        temperature: Sampling temperature.
+        hint: Optional extra instruction steering the solution, e.g. for diverse candidates.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        depth: Optional depth of the calling task, recorded with the call's usage.
+
+    Returns:
+        str: The generated code.
+    """
+    code = await _complete(client, generate_request(task, use_cache, budget, temperature, hint, config, task_id, depth))
+    return clean_generated_code(code)
+
+
+async def async_fix_code(client, code, error, use_cache=True, budget=None, config=None, task_id=None, depth=None):
+    """
+    Fix code using the async AI API. See fix_code().
+
+    Args:
+        client: The async API client (Anthropic or OpenAI).
+        code: The code to fix.
+        error: The error message.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+        depth: Optional depth of the calling task, recorded with the call's usage.
+
+    Returns:
+        str: The fixed code.
+    """
+    if (config.fix_mode if config else get_fix_mode()) == "patch":
+        patch = await _complete(client, patch_request(code, error, use_cache, budget, config, task_id, depth))
+        patched_code = try_apply_patch(code, patch)
+        if patched_code is not None:
+            return clean_generated_code(patched_code)
+
+    fixed_code = await _complete(client, fix_request(code, error, use_cache, budget, config, task_id, depth))
+    return clean_generated_code(fixed_code)
+
+
+async def async_decompose_task(client, task, depth, use_cache=True, budget=None, config=None, task_id=None):
+    """
+    Decompose a task into subtasks using the async AI API.
+
+    Args:
+        client: The async API client (Anthropic or OpenAI).
+        task: The task to decompose.
+        depth: The depth of decomposition.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+
+    Returns:
+        list: The list of subtasks.
+    """
+    decomposition_text = await _complete(client, decompose_request(task, depth, use_cache, budget, config, task_id=task_id))
+    return parse_subtasks(decomposition_text, depth)
+
+
+async def async_decompose_task_structured(client, task, depth, use_cache=True, budget=None, config=None, task_id=None):
+    """
+    Decompose a task into subtasks with explicit dependencies using a single async AI API call.
+
+    Args:
+        client: The async API client (Anthropic or OpenAI).
+        task: The task to decompose.
+        depth: The depth of decomposition.
+        use_cache: Whether to use the persistent response cache.
+        budget: Optional Budget charged for the LLM call.
+        config: Optional RunConfig of the run.
+        task_id: Optional ID of the calling task, recorded with the call's usage.
+
+    Returns:
+        dict: The decomposition, as returned by parse_structured_decomposition.
+    """
+    decomposition_text = await _complete(
+        client, decompose_request(task, depth, use_cache, budget, config, structured=True, task_id=task_id)
+    )
+    return parse_structured_decomposition(decomposition_text, depth)
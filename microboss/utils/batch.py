@@ -0,0 +1,361 @@
+"""
+Batch submission of LLM requests for the microboss package.
+"""
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+
+from microboss.providers.base import backend_for_client
+from microboss.utils.logging import log_info, log_warning
+
+# Providers complete batch jobs within 24 hours, callers stop waiting after that by default
+DEFAULT_BATCH_TIMEOUT = 24 * 3600.0
+
+
+def is_batch_mode():
+    """
+    Check whether code generation requests are submitted as batch jobs by default.
+    Each run reads it once, into its RunConfig.
+
+    Returns:
+        bool: True if MICROBOSS_BATCH is set to true
+    """
+    return os.environ.get("MICROBOSS_BATCH", "false").lower() == "true"
+
+
+def is_batched_generation(client, config=None):
+    """
+    Check whether the code generations of a run are sent as batch requests with a client.
+
+    Args:
+        client: The API client of the run
+        config (RunConfig): Optional configuration of the run
+
+    Returns:
+        bool: True if batch mode is on and the client's provider has a batch interface
+    """
+    batch = config.batch if config else is_batch_mode()
+    return batch and backend_for_client(client).supports_batch
+
+
+@contextmanager
+def hold_unless_batched(semaphore, client, config=None):
+    """
+    Hold the call semaphore around a code generation, unless it is sent as a batch request.
+
+    A batch request waits for its whole job, up to MICROBOSS_BATCH_TIMEOUT. Holding a slot
+    meanwhile would cap each batch job at the size of the semaphore and stall every other
+    call of the process until the job completes.
+
+    Args:
+        semaphore (threading.Semaphore): The semaphore bounding concurrent calls
+        client: The API client of the run
+        config (RunConfig): Optional configuration of the run
+    """
+    if is_batched_generation(client, config):
+        yield
+    else:
+        with semaphore:
+            yield
+
+
+@asynccontextmanager
+async def async_hold_unless_batched(semaphore, client, config=None):
+    """
+    Asynchronous version of hold_unless_batched.
+
+    Args:
+        semaphore (asyncio.Semaphore): The semaphore bounding concurrent calls
+        client: The async API client of the run
+        config (RunConfig): Optional configuration of the run
+    """
+    if is_batched_generation(client, config):
+        yield
+    else:
+        async with semaphore:
+            yield
+
+
+def _fail_future(future, error):
+    """Resolve a Future with an error, unless its caller cancelled it before it was submitted."""
+    if future.done() or not (future.running() or future.set_running_or_notify_cancel()):
+        return False
+    future.set_exception(error)
+    return True
+
+
+class BatchCollector:
+    """
+    Collects the requests of one provider into batch jobs and resolves them as results arrive.
+
+    Requests made within the collection window of the first pending one, or
+    until the batch is full, are submitted as one job by a background thread,
+    which then polls the open jobs. Each caller waits on the Future of its own
+    request, so it resumes as soon as its result is in, whatever the rest of
+    the job is doing.
+    """
+
+    def __init__(self, backend, client, window=2.0, max_size=1000, poll_interval=5.0):
+        self.backend = backend
+        self.client = client
+        self.window = window
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.batches = 0
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self._pending = []
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, system, prompt, model, max_tokens, temperature):
+        """
+        Add a request to the next batch job.
+
+        Args:
+            system (str): The system prompt
+            prompt (str): The user message
+            model (str): The model
+            max_tokens (int): Maximum number of tokens to generate
+            temperature (float): Sampling temperature
+
+        Returns:
+            Future: Resolved with (text, usage, latency), or with the error of the request.
+                    Cancelling it before the batch job is submitted leaves the request out.
+        """
+        future = Future()
+        request = {
+            "custom_id": f"request-{next(self._ids)}",
+            "system": system,
+            "prompt": prompt,
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        with self._condition:
+            self._pending.append((time.monotonic(), request, future))
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"batch-{self.backend.name}", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def _take_batch(self):
+        """Wait for a batch to be due or a poll to be needed. Returns the requests to submit."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._pending and (
+                    len(self._pending) >= self.max_size or now - self._pending[0][0] >= self.window
+                ):
+                    batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+                    return batch
+                if self._jobs:
+                    # Open jobs are polled on every pass
+                    timeout = self.poll_interval
+                    if self._pending:
+                        timeout = min(timeout, self.window - (now - self._pending[0][0]))
+                    self._condition.wait(max(0.0, timeout))
+                    return []
+                timeout = self.window - (now - self._pending[0][0]) if self._pending else None
+                self._condition.wait(timeout)
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._take_batch()
+                if batch:
+                    self._submit(batch)
+                    batch = []
+                self._poll()
+        except Exception as e:
+            # Nothing would resolve the requests anymore, fail them so their callers do not wait forever
+            log_warning(f"Batch collector of {self.backend.label} stopped: {str(e)}")
+            self._fail_all(batch, e)
+
+    def _fail_all(self, batch, error):
+        """Fail every request not resolved yet, and let the next submit() start a new thread."""
+        with self._condition:
+            futures = [future for _, _, future in batch + self._pending]
+            for job in self._jobs.values():
+                futures.extend(job["futures"].values())
+            self._pending = []
+            self._jobs = {}
+            self._thread = None
+        failed = sum(_fail_future(future, error) for future in futures)
+        with self._condition:
+            self.failed += failed
+
+    def _submit(self, batch):
+        # Requests whose caller stopped waiting before the job is submitted are left out
+        batch = [(queued, request, future) for queued, request, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        futures = {request["custom_id"]: future for _, request, future in batch}
+        try:
+            batch_id = self.backend.submit_batch(self.client, [request for _, request, _ in batch])
+        except Exception as e:
+            log_warning(f"Failed to submit a batch of {len(batch)} requests to {self.backend.label}: {str(e)}")
+            for future in futures.values():
+                future.set_exception(e)
+            with self._condition:
+                self.failed += len(futures)
+            return
+        with self._condition:
+            self.batches += 1
+            self._jobs[batch_id] = {"futures": futures, "submitted": time.monotonic()}
+        log_info(
+            "BATCH JOB SUBMITTED",
+            data={"provider": self.backend.name, "batch_id": batch_id, "requests": len(batch)}
+        )
+
+    def _poll(self):
+        with self._condition:
+            jobs = list(self._jobs.items())
+        for batch_id, job in jobs:
+            try:
+                done, results = self.backend.poll_batch(self.client, batch_id)
+            except Exception as e:
+                log_warning(f"Failed to poll batch job {batch_id} of {self.backend.label}: {str(e)}")
+                continue
+
+            latency = time.monotonic() - job["submitted"]
+            completed = failed = 0
+            for custom_id, result in results.items():
+                future = job["futures"].pop(custom_id, None)
+                if future is None:
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                    failed += 1
+                else:
+                    future.set_result(result + (latency,))
+                    completed += 1
+            if done:
+                for future in job["futures"].values():
+                    future.set_exception(ValueError(f"Batch job {batch_id} ended without a result for the request"))
+                    failed += 1
+            with self._condition:
+                self.completed += completed
+                self.failed += failed
+                if done:
+                    del self._jobs[batch_id]
+            if done:
+                log_info(
+                    "BATCH JOB ENDED",
+                    data={"provider": self.backend.name, "batch_id": batch_id, "seconds": round(latency, 3),
+                          "missing": len(job["futures"])}
+                )
+
+    def stats(self):
+        """
+        Get the batch counters.
+
+        Returns:
+            dict: Jobs submitted, requests, completed and failed requests, and pending and open counts
+        """
+        with self._condition:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "completed": self.completed,
+                "failed": self.failed,
+                "pending": len(self._pending),
+                "open_jobs": len(self._jobs)
+            }
+
+
+def _get_seconds_env(name, default):
+    """Read a positive number of seconds from the environment."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = -1
+    if seconds <= 0:
+        log_warning(f"Invalid {name} value: {value}. Using default {default}.")
+        return default
+    return seconds
+
+
+def get_batch_timeout(budget=None):
+    """
+    Get how long a caller waits for the result of a batch request: MICROBOSS_BATCH_TIMEOUT
+    seconds, or less if the budget runs out of time first.
+
+    Args:
+        budget (Budget): Optional budget of the calling task
+
+    Returns:
+        float: Seconds to wait
+    """
+    timeout = _get_seconds_env("MICROBOSS_BATCH_TIMEOUT", DEFAULT_BATCH_TIMEOUT)
+    remaining = budget.remaining_seconds() if budget else None
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+_collectors = {}
+_collectors_lock = threading.Lock()
+
+
+def get_batch_collector(backend, client):
+    """
+    Get the process-wide batch collector of a provider and client, configured with
+    MICROBOSS_BATCH_WINDOW, MICROBOSS_BATCH_MAX_SIZE and MICROBOSS_BATCH_POLL_INTERVAL.
+    Clients are pooled per account, so the runs of one account share its batch jobs.
+
+    Args:
+        backend (ProviderBackend): The backend
+        client: The caller's client of the backend
+
+    Returns:
+        BatchCollector: The collector, or None if the provider has no batch interface
+    """
+    if not backend.supports_batch:
+        with _collectors_lock:
+            if backend.name not in _collectors:
+                log_warning(f"{backend.label} has no batch interface. Sending its requests one by one.")
+                _collectors[backend.name] = None
+        return None
+
+    # Batch jobs are submitted and polled from the collector's thread, with a sync client
+    client = backend.batch_client(client)
+    with _collectors_lock:
+        key = (backend.name, id(client))
+        if key not in _collectors:
+            _collectors[key] = BatchCollector(
+                backend,
+                client,
+                window=_get_seconds_env("MICROBOSS_BATCH_WINDOW", 2.0),
+                max_size=int(_get_seconds_env("MICROBOSS_BATCH_MAX_SIZE", 1000)),
+                poll_interval=_get_seconds_env("MICROBOSS_BATCH_POLL_INTERVAL", 5.0)
+            )
+        return _collectors[key]
+
+
+def get_batch_stats():
+    """
+    Get the counters of the batch collectors of the process.
+
+    Returns:
+        dict: Mapping of provider name to the BatchCollector.stats() of its collectors, added up
+    """
+    with _collectors_lock:
+        collectors = [collector for collector in _collectors.values() if collector is not None]
+    stats = {}
+    for collector in collectors:
+        totals = stats.setdefault(collector.backend.name, {})
+        for name, value in collector.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return stats
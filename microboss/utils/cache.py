@@ -0,0 +1,239 @@
+"""
+Persistent LLM response cache for the microboss package.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from microboss.utils.logging import log_debug, log_warning
+
+# Defaults for the cache bounds
+DEFAULT_CACHE_PATH = "run/.cache/responses.sqlite3"
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+DEFAULT_CACHE_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+def make_cache_key(provider, model, system, messages, max_tokens, temperature=0):
+    """
+    Build the cache key of an LLM request.
+
+    Args:
+        provider (str): Name of the provider (e.g. "anthropic" or "openai")
+        model (str): Model name
+        system (str): System prompt
+        messages (list): Chat messages sent to the model
+        max_tokens (int): Maximum number of tokens to generate
+        temperature (float): Sampling temperature
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "system": system,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses backed by SQLite in WAL mode.
+
+    Entries expire after a TTL, and the least recently used entries are evicted
+    once the cache holds more than max_entries entries or max_bytes of responses.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+        max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        ttl=DEFAULT_CACHE_TTL
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            str: The cached response, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+        log_debug(
+            f"LLM CACHE {'HIT' if row is not None else 'MISS'}",
+            data={"cache": "hit" if row is not None else "miss", "key": key[:16], **self.stats()}
+        )
+        return row[0] if row is not None else None
+
+    def set(self, key, response, provider=None, model=None):
+        """
+        Store a response and evict entries beyond the cache bounds.
+
+        Args:
+            key (str): Cache key from make_cache_key
+            response (str): The response text
+            provider (str): Name of the provider, for inspection
+            model (str): Model name, for inspection
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Remove expired entries, then least recently used ones beyond the bounds."""
+        evicted = 0
+        if self.ttl:
+            evicted += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+
+        count, total_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count > self.max_entries or total_size > self.max_bytes:
+            # Walk entries from least to most recently used until within bounds
+            to_delete = []
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC"
+            ):
+                if count <= self.max_entries and total_size <= self.max_bytes:
+                    break
+                to_delete.append((key,))
+                count -= 1
+                total_size -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+            evicted += len(to_delete)
+
+        self.evictions += evicted
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate and evictions since the cache was opened
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def _get_int_env(name, default):
+    """Read an integer from the environment, falling back to a default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        log_warning(f"Invalid {name} value: {value}. Using default {default}.")
+        return default
+
+
+def get_response_cache():
+    """
+    Get the process-wide response cache.
+
+    Returns:
+        ResponseCache: The cache, or None if caching is disabled with MICROBOSS_CACHE=false
+    """
+    global _response_cache
+
+    if os.environ.get("MICROBOSS_CACHE", "true").lower() != "true":
+        return None
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            try:
+                _response_cache = ResponseCache(
+                    path=os.environ.get("MICROBOSS_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    max_entries=_get_int_env("MICROBOSS_CACHE_MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES),
+                    max_bytes=_get_int_env("MICROBOSS_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES),
+                    ttl=_get_int_env("MICROBOSS_CACHE_TTL", DEFAULT_CACHE_TTL)
+                )
+            except sqlite3.Error as e:
+                log_warning(f"Could not open LLM response cache: {e}. Caching disabled.")
+                return None
+        return _response_cache
@@ -0,0 +1,306 @@
+"""
+Record/replay cassettes of LLM traffic for the microboss package.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from microboss.utils.logging import log_info, log_warning
+
+# Directory of the cassettes recorded when MICROBOSS_CASSETTE_PATH is not set
+DEFAULT_CASSETTE_DIR = "run/.cassettes"
+CASSETTE_FORMAT_VERSION = 1
+
+
+class CassetteMissError(Exception):
+    """Raised when a replayed cassette holds no response for a request."""
+
+
+def make_request_hash(system, prompt, temperature=0):
+    """
+    Build the replay key of an LLM request.
+
+    The provider and model are left out so a cassette recorded with one
+    provider can be replayed whatever model the replay is configured with.
+
+    Args:
+        system (str): System prompt
+        prompt (str): User message
+        temperature (float): Sampling temperature
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    payload = json.dumps({"system": system, "prompt": prompt, "temperature": temperature}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cassette_mode():
+    """
+    Get the cassette mode.
+
+    Returns:
+        str: "record", "replay", or None if MICROBOSS_CASSETTE_MODE is not set
+    """
+    mode = os.environ.get("MICROBOSS_CASSETTE_MODE", "").lower()
+    if not mode or mode == "off":
+        return None
+    if mode not in ("record", "replay"):
+        log_warning(f"Invalid MICROBOSS_CASSETTE_MODE value: {mode}. Cassettes disabled.")
+        return None
+    return mode
+
+
+def _open_cassette(path, mode):
+    """Open a cassette as text, gzip-compressed when its name ends with .gz."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class CassetteRecorder:
+    """
+    Appends every LLM request/response pair of the process to a cassette.
+
+    A cassette is a JSON lines file, gzip-compressed by default: a header line
+    followed by one line per exchange holding the request hash, purpose, provider,
+    model, start offset, latency, token usage and response text. Prompts are not
+    stored, which keeps cassettes compact.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.start_time = time.time()
+        self.exchanges = 0
+        self._lock = threading.Lock()
+        self._file = _open_cassette(self.path, "w")
+        self._write({"cassette": CASSETTE_FORMAT_VERSION, "created": datetime.now().isoformat()})
+        atexit.register(self.close)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        # Flush every line so a cassette stays readable if the process is killed
+        self._file.flush()
+
+    def record(self, system, prompt, temperature, text, purpose, provider, model, usage=None, latency=0.0, cached=False):
+        """
+        Append an exchange to the cassette.
+
+        Args:
+            system (str): System prompt
+            prompt (str): User message
+            temperature (float): Sampling temperature
+            text (str): Response text
+            purpose (str): What the request was for (e.g. "generate code")
+            provider (str): Name of the provider backend
+            model (str): Model name
+            usage (Usage): Tokens used by the call
+            latency (float): Seconds the call took
+            cached (bool): Whether the response was served by the response cache
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self.exchanges += 1
+            self._write({
+                "seq": self.exchanges,
+                "key": make_request_hash(system, prompt, temperature),
+                "purpose": purpose,
+                "provider": provider,
+                "model": model,
+                # The recorder is opened by the first exchange, which started just before it
+                "start": round(max(0.0, time.time() - latency - self.start_time), 4),
+                "latency": round(latency, 4),
+                "input_tokens": usage.input_tokens if usage else 0,
+                "output_tokens": usage.output_tokens if usage else 0,
+                "cached_tokens": usage.cached_tokens if usage else 0,
+                "cached": cached,
+                "response": text
+            })
+
+    def close(self):
+        """Close the cassette file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                log_info("CASSETTE RECORDED", data={"path": str(self.path), "exchanges": self.exchanges})
+
+
+class Cassette:
+    """
+    A recorded cassette served back in replay mode, either in recorded order or by
+    request hash. Identical requests recorded several times are answered in the
+    order they were recorded, and the last answer is repeated once they run out.
+    """
+
+    def __init__(self, path, match="hash"):
+        self.path = Path(path)
+        self.match = match
+        self.entries = load_cassette(self.path)
+        self.served = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._by_key = {}
+        for entry in self.entries:
+            self._by_key.setdefault(entry["key"], deque()).append(entry)
+
+    def next(self, system, prompt, temperature=0):
+        """
+        Get the recorded exchange answering a request.
+
+        Args:
+            system (str): System prompt
+            prompt (str): User message
+            temperature (float): Sampling temperature
+
+        Returns:
+            dict: The recorded exchange
+
+        Raises:
+            CassetteMissError: If the cassette has no response for the request
+        """
+        with self._lock:
+            if self.match == "order":
+                if self._cursor >= len(self.entries):
+                    self.misses += 1
+                    raise CassetteMissError(f"Cassette {self.path} exhausted after {len(self.entries)} exchanges")
+                entry = self.entries[self._cursor]
+                self._cursor += 1
+            else:
+                key = make_request_hash(system, prompt, temperature)
+                queue = self._by_key.get(key)
+                if not queue:
+                    self.misses += 1
+                    raise CassetteMissError(f"Cassette {self.path} has no response for request {key[:16]}")
+                entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.served += 1
+            return entry
+
+    def stats(self):
+        """
+        Get the replay counters.
+
+        Returns:
+            dict: Number of recorded exchanges, served responses and misses
+        """
+        with self._lock:
+            return {"exchanges": len(self.entries), "served": self.served, "misses": self.misses}
+
+
+def load_cassette(path):
+    """
+    Read the exchanges of a cassette.
+
+    Args:
+        path (Path): Path of the cassette
+
+    Returns:
+        list: Recorded exchanges, in recorded order
+    """
+    entries = []
+    try:
+        with _open_cassette(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if "key" in entry:
+                        entries.append(entry)
+    except EOFError:
+        # A cassette of a killed process ends with an unterminated gzip stream
+        log_warning(f"Cassette {path} is truncated. Replaying the {len(entries)} complete exchanges.")
+    return entries
+
+
+_recorder = None
+_cassettes = {}
+_cassette_lock = threading.Lock()
+
+
+def get_cassette_recorder():
+    """
+    Get the process-wide cassette recorder.
+
+    Returns:
+        CassetteRecorder: The recorder, or None unless MICROBOSS_CASSETTE_MODE=record
+    """
+    global _recorder
+
+    if get_cassette_mode() != "record":
+        return None
+
+    with _cassette_lock:
+        if _recorder is None:
+            path = os.environ.get("MICROBOSS_CASSETTE_PATH")
+            if not path:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                path = f"{DEFAULT_CASSETTE_DIR}/{timestamp}_{os.getpid()}.jsonl.gz"
+            try:
+                _recorder = CassetteRecorder(path)
+            except OSError as e:
+                log_warning(f"Could not open cassette {path} for recording: {e}. Recording disabled.")
+                return None
+        return _recorder
+
+
+def record_exchange(system, prompt, temperature, text, purpose, provider, model, usage=None, latency=0.0, cached=False):
+    """
+    Record an exchange if MICROBOSS_CASSETTE_MODE=record. See CassetteRecorder.record().
+    """
+    recorder = get_cassette_recorder()
+    if recorder is not None:
+        recorder.record(system, prompt, temperature, text, purpose, provider, model, usage, latency, cached)
+
+
+def get_cassette():
+    """
+    Get the cassette replayed by the process, read from MICROBOSS_CASSETTE_PATH and
+    matched as set by MICROBOSS_CASSETTE_MATCH ("hash" or "order").
+
+    Returns:
+        Cassette: The cassette, loaded once per path and match mode
+    """
+    path = os.environ.get("MICROBOSS_CASSETTE_PATH")
+    if not path:
+        raise ValueError("No cassette to replay. Please set the MICROBOSS_CASSETTE_PATH environment variable.")
+
+    match = os.environ.get("MICROBOSS_CASSETTE_MATCH", "hash").lower()
+    if match not in ("hash", "order"):
+        log_warning(f"Invalid MICROBOSS_CASSETTE_MATCH value: {match}. Using default hash.")
+        match = "hash"
+
+    with _cassette_lock:
+        cassette = _cassettes.get((path, match))
+        if cassette is None:
+            try:
+                cassette = Cassette(path, match)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Could not load cassette {path}: {str(e)}") from e
+            _cassettes[(path, match)] = cassette
+            log_info("CASSETTE LOADED FOR REPLAY", data={"path": path, "exchanges": len(cassette.entries), "match": match})
+        return cassette
+
+
+def get_replay_latency_scale():
+    """
+    Get the factor applied to recorded latencies in replay mode.
+
+    Returns:
+        float: The factor, from MICROBOSS_CASSETTE_LATENCY_SCALE (0 replays instantly)
+    """
+    scale_str = os.environ.get("MICROBOSS_CASSETTE_LATENCY_SCALE", "0")
+    try:
+        return max(0.0, float(scale_str))
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_CASSETTE_LATENCY_SCALE value: {scale_str}. Using default 0.")
+        return 0.0
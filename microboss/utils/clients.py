@@ -0,0 +1,171 @@
+"""
+Process-wide registry of pooled API clients for the microboss package.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+from microboss.utils.logging import log_debug, log_warning
+
+# Defaults for the HTTP connection pool shared by all calls to a provider
+DEFAULT_HTTP_POOL_SIZE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+
+def get_http_pool_size():
+    """
+    Get the maximum number of pooled connections per client.
+
+    Returns:
+        int: The pool size, from MICROBOSS_HTTP_POOL_SIZE
+    """
+    pool_size_str = os.environ.get("MICROBOSS_HTTP_POOL_SIZE", str(DEFAULT_HTTP_POOL_SIZE))
+    try:
+        return max(1, int(pool_size_str))
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_HTTP_POOL_SIZE value: {pool_size_str}. Using default {DEFAULT_HTTP_POOL_SIZE}.")
+        return DEFAULT_HTTP_POOL_SIZE
+
+
+def get_http_limits():
+    """
+    Get the connection limits of pooled clients.
+
+    Returns:
+        httpx.Limits: Limits keeping up to the pool size of connections alive
+    """
+    import httpx
+
+    pool_size = get_http_pool_size()
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY
+    )
+
+
+def make_http_client(sdk, limits, is_async=False):
+    """
+    Create the httpx client an SDK client pools its connections in.
+
+    Args:
+        sdk: The anthropic or openai module
+        limits (httpx.Limits): Connection limits
+        is_async (bool): Whether to create an async client
+
+    Returns:
+        httpx.Client or httpx.AsyncClient: The HTTP client, with the SDK's defaults when it provides them
+    """
+    default_client = getattr(sdk, "DefaultAsyncHttpxClient" if is_async else "DefaultHttpxClient", None)
+    if default_client is not None:
+        return default_client(limits=limits)
+    import httpx
+
+    http_client = httpx.AsyncClient if is_async else httpx.Client
+    return http_client(limits=limits, timeout=httpx.Timeout(600.0, connect=5.0), follow_redirects=True)
+
+
+class ClientRegistry:
+    """
+    Thread-safe cache of API clients keyed by provider and credentials.
+
+    Synchronous clients are shared by every thread of the process, so recursive
+    subtasks, web task threads and the CLI reuse the same keep-alive connections.
+    Asynchronous clients hold connections bound to an event loop, so they are
+    shared per loop instead.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, key, factory):
+        """
+        Get the client for a key, creating it on first use.
+
+        Args:
+            key (tuple): Provider and settings identifying the client
+            factory: Callable creating the client from the httpx limits to pool with
+
+        Returns:
+            The shared client
+        """
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory(get_http_limits())
+                self._clients[key] = client
+                self.created += 1
+                log_debug("CREATED POOLED API CLIENT", data={"provider": key[0], "pool_size": get_http_pool_size()})
+            else:
+                self.reused += 1
+            return client
+
+    def get_async(self, key, factory):
+        """
+        Get the async client for a key in the running event loop, creating it on first use.
+
+        Args:
+            key (tuple): Provider and settings identifying the client
+            factory: Callable creating the client from the httpx limits to pool with
+
+        Returns:
+            The async client shared within the running loop, or a new unshared
+            client if there is no running loop
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return factory(get_http_limits())
+
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = factory(get_http_limits())
+                clients[key] = client
+                self.created += 1
+                log_debug("CREATED POOLED ASYNC API CLIENT", data={"provider": key[0], "pool_size": get_http_pool_size()})
+            else:
+                self.reused += 1
+            return client
+
+    def close(self):
+        """Close the synchronous clients and forget all clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._async_clients = weakref.WeakKeyDictionary()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """
+        Get the registry counters.
+
+        Returns:
+            dict: Number of clients created and reused
+        """
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "clients": len(self._clients)}
+
+
+_client_registry = ClientRegistry()
+
+
+def get_client_registry():
+    """
+    Get the process-wide client registry.
+
+    Returns:
+        ClientRegistry: The registry
+    """
+    return _client_registry
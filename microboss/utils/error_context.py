@@ -0,0 +1,257 @@
+"""
+Bounded summaries of execution errors for the fix prompts of the microboss package.
+"""
+
+import os
+import re
+
+from microboss.utils.execution import ExecutionError
+from microboss.utils.logging import log_debug, log_warning
+from microboss.utils.rate_limit import CHARS_PER_TOKEN, estimate_tokens
+
+# Default limit on the size of the error context of a fix prompt, in tokens
+DEFAULT_ERROR_CONTEXT_TOKENS = 800
+
+# Lines of source shown around each line of the generated file named by the error
+SOURCE_CONTEXT_LINES = 1
+
+TRACEBACK_HEADER = "Traceback (most recent call last):"
+CHAINED_EXCEPTION_MARKERS = ("During handling of the above exception", "The above exception was the direct cause")
+FRAME_PATTERN = re.compile(r'^\s*File "(?P<path>.+)", line (?P<line>\d+)(?:, in (?P<name>.+))?$')
+REPEATED_PATTERN = re.compile(r"^\s*\[Previous line repeated (\d+) more times?\]$")
+DIAGNOSTIC_LINE_PATTERN = re.compile(r"^line (\d+): ")
+LIBRARY_PATH_PATTERN = re.compile(r"^.*[/\\](?:site-packages|dist-packages|lib[/\\]python\d+(?:\.\d+)?)[/\\]")
+
+
+def get_error_context_tokens():
+    """
+    Get the maximum size of the error context of a fix prompt.
+
+    Returns:
+        int: Limit in tokens (MICROBOSS_ERROR_CONTEXT_TOKENS)
+    """
+    tokens_str = os.environ.get("MICROBOSS_ERROR_CONTEXT_TOKENS")
+    if not tokens_str:
+        return DEFAULT_ERROR_CONTEXT_TOKENS
+    try:
+        tokens = int(tokens_str)
+        if tokens <= 0:
+            raise ValueError(tokens_str)
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_ERROR_CONTEXT_TOKENS value: {tokens_str}. Using default {DEFAULT_ERROR_CONTEXT_TOKENS}.")
+        return DEFAULT_ERROR_CONTEXT_TOKENS
+    return tokens
+
+
+class Frame:
+    """A frame of a traceback, repeated consecutively count times."""
+
+    def __init__(self, path, line, name, source):
+        self.path = path
+        self.line = line
+        self.name = name
+        self.source = source
+        self.count = 1
+
+    def key(self):
+        return self.path, self.line, self.name
+
+
+def parse_tracebacks(stderr):
+    """
+    Parse the tracebacks printed by Python, chained exceptions included.
+
+    Args:
+        stderr (str): Standard error of the process
+
+    Returns:
+        tuple: (blocks, other_lines), each block a (chain_line, frames, exception_lines)
+        tuple in printed order, and the number of lines that belong to no traceback
+    """
+    blocks = []
+    frames, exception_lines = None, None
+    chain_line = None
+    other_lines = 0
+
+    def close_block():
+        if frames is not None:
+            blocks.append((chain_line, frames, exception_lines))
+
+    for line in stderr.splitlines():
+        frame_match = FRAME_PATTERN.match(line)
+        if line.strip() == TRACEBACK_HEADER or (frame_match and (frames is None or exception_lines)):
+            # A syntax error of the script itself is printed without a header
+            close_block()
+            frames, exception_lines = [], []
+            if not frame_match:
+                continue
+        if frames is None:
+            if line.strip():
+                other_lines += 1
+        elif line.startswith(CHAINED_EXCEPTION_MARKERS):
+            close_block()
+            frames, exception_lines = None, None
+            chain_line = line.strip()
+        elif frame_match and not exception_lines:
+            frames.append(Frame(frame_match["path"], int(frame_match["line"]), frame_match["name"], None))
+        elif REPEATED_PATTERN.match(line) and frames and not exception_lines:
+            frames[-1].count += int(REPEATED_PATTERN.match(line).group(1))
+        elif line.startswith((" ", "\t")) and frames and not exception_lines:
+            # The source line of the frame, then its caret markers
+            if frames[-1].source is None and line.strip() and set(line.strip()) - set("^~ "):
+                frames[-1].source = line.strip()
+        elif line.strip():
+            exception_lines.append(line.rstrip())
+    close_block()
+    return blocks, other_lines
+
+
+def _dedupe(frames):
+    deduped = []
+    for frame in frames:
+        if deduped and deduped[-1].key() == frame.key():
+            deduped[-1].count += frame.count
+        else:
+            deduped.append(frame)
+    return deduped
+
+
+def format_source(code_lines, line):
+    """
+    Format a line of the generated file with the lines around it.
+
+    Args:
+        code_lines (list): Lines of the code sent to the model
+        line (int): Line number
+
+    Returns:
+        list: Numbered lines, the given one marked with >
+    """
+    if not 1 <= line <= len(code_lines):
+        return ["    (in the result-saving code appended to the file for execution)"]
+    width = len(str(min(line + SOURCE_CONTEXT_LINES, len(code_lines))))
+    formatted = []
+    for number in range(max(1, line - SOURCE_CONTEXT_LINES), min(len(code_lines), line + SOURCE_CONTEXT_LINES) + 1):
+        marker = ">" if number == line else " "
+        formatted.append(f"    {marker} {number:>{width}} | {code_lines[number - 1]}")
+    return formatted
+
+
+def _format_block(frames, code_lines, file_name):
+    """Format the frames of the generated file, collapsing the library frames between them."""
+    rendered = []
+    frames = _dedupe(frames)
+    index = 0
+    while index < len(frames):
+        frame = frames[index]
+        repeated = f" (repeated {frame.count} times)" if frame.count > 1 else ""
+        if os.path.basename(frame.path) == file_name:
+            name = f", in {frame.name}" if frame.name else ""
+            rendered.append([f"  {file_name}, line {frame.line}{name}{repeated}"] + format_source(code_lines, frame.line))
+            index += 1
+            continue
+        end = index
+        while end < len(frames) and os.path.basename(frames[end].path) != file_name:
+            end += 1
+        if end < len(frames):
+            rendered.append([f"  ... {end - index} library frame{'s' if end - index > 1 else ''}"])
+        else:
+            # Show where the error was raised
+            last = frames[end - 1]
+            if end - 1 > index:
+                rendered.append([f"  ... {end - 1 - index} library frame{'s' if end - 1 - index > 1 else ''}"])
+            name = f", in {last.name}" if last.name else ""
+            repeated = f" (repeated {last.count} times)" if last.count > 1 else ""
+            path = LIBRARY_PATH_PATTERN.sub("", last.path)
+            lines = [f"  {path}, line {last.line}{name}{repeated}"]
+            if last.source:
+                lines.append(f"      {last.source}")
+            rendered.append(lines)
+        index = end
+    return rendered
+
+
+def _fit(sections, limit, file_name):
+    """Drop the frames of the generated file furthest from the outermost and innermost ones until the text fits."""
+    while estimate_tokens("\n".join(line for section in sections for line in section)) > limit:
+        frame_indexes = [i for i, section in enumerate(sections) if section[0].startswith(f"  {file_name}, line ")]
+        if len(frame_indexes) <= 2:
+            break
+        drop = frame_indexes[len(frame_indexes) // 2]
+        sections[drop] = ["  ... frames omitted"]
+        # Merge runs of omission markers
+        merged = []
+        for section in sections:
+            if merged and section[0].startswith("  ... ") and merged[-1][0].startswith("  ... "):
+                merged[-1] = ["  ... frames omitted"]
+            else:
+                merged.append(section)
+        sections[:] = merged
+    return "\n".join(line for section in sections for line in section)
+
+
+def _truncate(text, limit):
+    """Keep the start and the end of a text, cut at line boundaries where there are any."""
+    max_chars = limit * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars * 2 // 3]
+    tail = text[len(text) - (max_chars - len(head)):]
+    if "\n" in head:
+        head = head[:head.rindex("\n")]
+    if "\n" in tail:
+        tail = tail[tail.index("\n") + 1:]
+    return f"{head}\n... ({len(text) - len(head) - len(tail)} characters omitted) ...\n{tail}"
+
+
+def build_error_context(error, code, file_name="main.py", max_tokens=None):
+    """
+    Summarise an execution error for a fix prompt.
+
+    The frames of the generated file are kept with their source lines, repeated
+    frames are merged, library frames are collapsed to where the error was raised,
+    warnings and other output are dropped, and the result is capped in size.
+
+    Args:
+        error: The exception, or its message
+        code (str): The code sent to the model, whose line numbers the traceback uses
+        file_name (str): Name of the executed file
+        max_tokens (int): Size limit, MICROBOSS_ERROR_CONTEXT_TOKENS by default
+
+    Returns:
+        str: The error context
+    """
+    limit = max_tokens or get_error_context_tokens()
+    message = str(error)
+    stderr = error.stderr if isinstance(error, ExecutionError) else ""
+    code_lines = code.splitlines()
+
+    blocks, other_lines = parse_tracebacks(stderr or message)
+    if not blocks:
+        lines = []
+        for line in message.splitlines():
+            lines.append(line)
+            match = DIAGNOSTIC_LINE_PATTERN.match(line)
+            if match:
+                lines.extend(format_source(code_lines, int(match.group(1))))
+        context = _truncate("\n".join(lines), limit)
+    else:
+        headline = message.replace(stderr, "").rstrip(": \n") if stderr else ""
+        sections = [[headline]] if headline else []
+        for number, (chain_line, frames, exception_lines) in enumerate(blocks):
+            if number and chain_line:
+                sections.append([chain_line])
+            rendered = _format_block(frames, code_lines, file_name)
+            if rendered:
+                sections.append([TRACEBACK_HEADER])
+                sections.extend(rendered)
+            sections.append(exception_lines or ["(no exception message)"])
+        if other_lines:
+            sections.append([f"({other_lines} lines of other output omitted)"])
+        context = _truncate(_fit(sections, limit, file_name), limit)
+
+    log_debug(
+        "ERROR CONTEXT SUMMARISED",
+        data={"original_tokens": estimate_tokens(message), "tokens": estimate_tokens(context)}
+    )
+    return context
@@ -2,39 +2,124 @@
 Code execution utilities for the microboss package.
 """
 
+import asyncio
 import os
 import subprocess
+import sys
 import time
 from pathlib import Path
 
 from microboss.utils.file_utils import read_code_from_file, save_code_to_file, read_json_from_file
 from microboss.utils.logging import log_info, log_error, log_success, log_execution, log_result, log_warning
+from microboss.utils.validation import format_issues, is_validation_enabled, validate_file
 
+# Default limit on the run time of a generated file, in seconds
+DEFAULT_EXECUTION_TIMEOUT = 300
 
-def execute_file(file_path, task_id=None, depth=None):
+# Generated files run with this interpreter, whose installed modules validation checks imports against
+PYTHON_EXECUTABLE = sys.executable or "python"
+
+# Interval at which a cancellable execution checks whether it was cancelled, in seconds
+CANCEL_POLL_INTERVAL = 0.05
+
+# First line of the result-saving harness appended to a generated file
+HARNESS_MARKER = "# Get the absolute path of the result file"
+
+
+class ExecutionError(Exception):
+    """Raised when a generated file exits with a non-zero return code."""
+
+    def __init__(self, message, returncode=None, stderr=""):
+        super().__init__(message)
+        self.returncode = returncode
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(errors="replace")
+        self.stderr = stderr or ""
+
+
+class ExecutionTimeoutError(ExecutionError):
+    """Raised when a generated file runs longer than the execution timeout."""
+
+
+class CodeValidationError(ExecutionError):
+    """Raised when a generated file fails static validation and is not executed."""
+
+
+class ExecutionCancelledError(ExecutionError):
+    """Raised when the caller cancels a running execution, whose process is killed."""
+
+
+def get_execution_timeout():
     """
-    Executes a Python file and returns the result.
+    Get the maximum run time of a generated file.
+    
+    Returns:
+        float: Timeout in seconds, or None if MICROBOSS_EXECUTION_TIMEOUT is 0
+    """
+    timeout_str = os.environ.get("MICROBOSS_EXECUTION_TIMEOUT")
+    if not timeout_str:
+        return DEFAULT_EXECUTION_TIMEOUT
+    try:
+        timeout = float(timeout_str)
+    except ValueError:
+        log_warning(f"Invalid MICROBOSS_EXECUTION_TIMEOUT value: {timeout_str}. Using default {DEFAULT_EXECUTION_TIMEOUT}.")
+        return DEFAULT_EXECUTION_TIMEOUT
+    return timeout if timeout > 0 else None
+
+
+def strip_execution_harness(code):
+    """
+    Remove the result-saving harness added by prepare_file_for_execution.
     
     Args:
-        file_path: Path to the Python file to execute
-        task_id: Optional task ID for logging
-        depth: Optional depth for logging
+        code: Code of an executed file
         
     Returns:
-        The value stored in the result.json file
+        str: The code as generated, the harness is added again by the next execution
     """
-    start_time = time.time()
-    # Convert file_path to a Path object if it's a string
-    file_path = Path(file_path)
+    index = code.find("\n" + HARNESS_MARKER)
+    if index < 0:
+        return code
+    return code[:index].rstrip() + "\n"
+
+
+def check_file_before_execution(file_path, task_id=None, depth=None, config=None):
+    """
+    Validate a generated file so that code bound to fail is fixed without being run.
     
-    log_info(
-        f"EXECUTING FILE: {file_path}",
+    Args:
+        file_path: Path to the Python file, before the harness is added
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        config: Optional RunConfig of the run, whose validation setting is used
+        
+    Raises:
+        CodeValidationError: If the code does not compile, reads undefined names, or imports missing modules
+    """
+    if not (config.validation if config else is_validation_enabled()):
+        return
+    issues = validate_file(file_path)
+    if not issues:
+        return
+    diagnostic = format_issues(issues)
+    log_warning(
+        "CODE VALIDATION FAILED, SKIPPING EXECUTION",
         task_id=task_id,
-        depth=depth
+        depth=depth,
+        data={"file": str(file_path), "issues": diagnostic}
     )
+    # The diagnostic reads like a traceback so that the retry policy classifies it
+    raise CodeValidationError(f"Code validation failed before execution:\n{diagnostic}", stderr=diagnostic)
+
+
+def prepare_file_for_execution(file_path):
+    """
+    Adds the result-saving harness to a generated Python file.
     
-    # Create a result file path
-    result_file = file_path.parent / "result.json"
+    Args:
+        file_path: Path to the Python file to prepare
+    """
+    file_path = Path(file_path)
     
     # Modify the file to write the result to a JSON file
     code = read_code_from_file(file_path)
@@ -86,7 +171,7 @@ print(f"Factorial of 10 is: {result}")
         
         # Add new result saving code with proper path handling
         result_code = f"""
-# Get the absolute path of the result file
+{HARNESS_MARKER}
 current_dir = os.path.dirname(os.path.abspath(__file__))
 result_file_path = os.path.join(current_dir, "result.json")
 
@@ -102,129 +187,278 @@ except Exception as e:
         
         # Save the modified code
         save_code_to_file(code, file_path)
+
+
+def collect_execution_result(file_path, returncode, stdout, stderr, start_time, task_id=None, depth=None):
+    """
+    Checks the outcome of an executed Python file and reads its result.
     
-    # Execute the file as a subprocess
-    try:
-        # Change to the directory of the file to ensure relative paths work
-        original_dir = os.getcwd()
-        os.chdir(file_path.parent)
-        
-        # Use the file name only, not the full path, since we've changed directory
-        file_name = file_path.name
+    Args:
+        file_path: Path to the executed Python file
+        returncode: Exit code of the process
+        stdout: Standard output of the process
+        stderr: Standard error of the process
+        start_time: Time the execution started, for logging
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
         
-        process = subprocess.run(
-            ["python", file_name],
-            capture_output=True,
-            text=True,
-            check=False  # Don't raise an exception on non-zero exit
+    Returns:
+        The value stored in the result.json file
+    """
+    file_path = Path(file_path)
+    
+    # Check for execution errors
+    if returncode != 0:
+        log_error(
+            f"ERROR EXECUTING FILE: {stderr}",
+            task_id=task_id,
+            depth=depth
         )
+        raise ExecutionError(f"Execution failed with return code {returncode}: {stderr}", returncode, stderr)
+
+    # Log standard output and error
+    if stdout or stderr:
+        log_execution(
+            "EXECUTION OUTPUT",
+            stdout=stdout[:500] + ("..." if len(stdout) > 500 else ""),
+            stderr=stderr[:500] + ("..." if len(stderr) > 500 else ""),
+            task_id=task_id,
+            depth=depth
+        )
+
+    # Read the result from the JSON file
+    result = None
+    result_file_in_parent = file_path.parent / "result.json"
+
+    # Try different potential locations for the result file
+    for possible_result_file in [result_file_in_parent]:
+        if possible_result_file.exists():
+            try:
+                result_data = read_json_from_file(possible_result_file)
+                # Check if result is in a "result" key or directly
+                if isinstance(result_data, dict) and "result" in result_data:
+                    result = result_data["result"]
+                else:
+                    result = result_data
+                break
+            except Exception as e:
+                log_error(
+                    f"Error reading result file {possible_result_file}: {e}",
+                    task_id=task_id,
+                    depth=depth
+                )
+
+    # If result file not found, try to extract from stdout
+    if result is None:
+        log_error(
+            f"Result file not found, trying to extract from output",
+            task_id=task_id,
+            depth=depth
+        )
+
+        # Check for factorial output
+        if "Factorial of 10 is:" in stdout:
+            try:
+                result_line = [line for line in stdout.split('\n') if "Factorial of 10 is:" in line][0]
+                result = int(result_line.split("Factorial of 10 is:")[1].strip())
+                log_info(
+                    f"Successfully extracted factorial result from stdout: {result}",
+                    task_id=task_id,
+                    depth=depth
+                )
+            except Exception as e:
+                log_error(
+                    f"Failed to extract result from stdout: {e}",
+                    task_id=task_id,
+                    depth=depth
+                )
+
+    execution_time = time.time() - start_time
+
+    # Log the result
+    if result is not None:
+        result_str = str(result)
+        if len(result_str) > 100:
+            result_str = result_str[:97] + "..."
+
+        log_success(
+            f"EXECUTION COMPLETE ({execution_time:.2f}s)",
+            task_id=task_id,
+            depth=depth,
+            data={
+                "result_type": type(result).__name__,
+                "result_preview": result_str
+            }
+        )
+
+        # Log the result specifically 
+        log_result(
+            f"CALCULATION RESULT: {result_str}",
+            result=result,
+            task_id=task_id,
+            depth=depth
+        )
+    else:
+        log_warning(
+            f"Execution completed but no result was found",
+            task_id=task_id,
+            depth=depth
+        )
+
+    return result
+
+
+def run_process(args, cwd, timeout=None, cancel=None):
+    """
+    Run a process to completion, killing it on timeout or once cancel is set.
+    
+    Args:
+        args: The command line
+        cwd: Working directory of the process
+        timeout: Optional limit on the run time, in seconds
+        cancel: Optional threading.Event that stops the process when set
         
-        # Change back to the original directory
-        os.chdir(original_dir)
-        
-        # Check for execution errors
-        if process.returncode != 0:
-            log_error(
-                f"ERROR EXECUTING FILE: {process.stderr}",
-                task_id=task_id,
-                depth=depth
-            )
-            raise Exception(f"Execution failed with return code {process.returncode}: {process.stderr}")
-        
-        # Log standard output and error
-        if process.stdout or process.stderr:
-            log_execution(
-                "EXECUTION OUTPUT",
-                stdout=process.stdout[:500] + ("..." if len(process.stdout) > 500 else ""),
-                stderr=process.stderr[:500] + ("..." if len(process.stderr) > 500 else ""),
-                task_id=task_id,
-                depth=depth
-            )
-        
-        # Read the result from the JSON file
-        result = None
-        result_file_in_parent = file_path.parent / "result.json"
-        
-        # Try different potential locations for the result file
-        for possible_result_file in [result_file_in_parent]:
-            if possible_result_file.exists():
-                try:
-                    result_data = read_json_from_file(possible_result_file)
-                    # Check if result is in a "result" key or directly
-                    if isinstance(result_data, dict) and "result" in result_data:
-                        result = result_data["result"]
-                    else:
-                        result = result_data
-                    break
-                except Exception as e:
-                    log_error(
-                        f"Error reading result file {possible_result_file}: {e}",
-                        task_id=task_id,
-                        depth=depth
-                    )
+    Returns:
+        tuple: (returncode, stdout, stderr)
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with subprocess.Popen(
+        args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    ) as process:
+        while True:
+            wait = max(0, deadline - time.monotonic()) if deadline is not None else None
+            if cancel is not None:
+                wait = CANCEL_POLL_INTERVAL if wait is None else min(wait, CANCEL_POLL_INTERVAL)
+            try:
+                stdout, stderr = process.communicate(timeout=wait)
+                return process.returncode, stdout, stderr
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    process.kill()
+                    _, stderr = process.communicate()
+                    raise ExecutionCancelledError("Execution cancelled", stderr=stderr)
+                if deadline is not None and time.monotonic() >= deadline:
+                    process.kill()
+                    _, stderr = process.communicate()
+                    raise ExecutionTimeoutError(f"Execution timed out after {timeout}s", stderr=stderr)
+
+
+def execute_file(file_path, task_id=None, depth=None, config=None, cancel=None):
+    """
+    Executes a Python file and returns the result.
+    
+    Args:
+        file_path: Path to the Python file to execute
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        config: Optional RunConfig whose execution timeout and validation setting apply instead of the environment
+        cancel: Optional threading.Event; once set, the running file is killed with ExecutionCancelledError
         
-        # If result file not found, try to extract from stdout
-        if result is None:
-            log_error(
-                f"Result file not found, trying to extract from output",
-                task_id=task_id,
-                depth=depth
-            )
-            
-            # Check for factorial output
-            if "Factorial of 10 is:" in process.stdout:
-                try:
-                    result_line = [line for line in process.stdout.split('\n') if "Factorial of 10 is:" in line][0]
-                    result = int(result_line.split("Factorial of 10 is:")[1].strip())
-                    log_info(
-                        f"Successfully extracted factorial result from stdout: {result}",
-                        task_id=task_id,
-                        depth=depth
-                    )
-                except Exception as e:
-                    log_error(
-                        f"Failed to extract result from stdout: {e}",
-                        task_id=task_id,
-                        depth=depth
-                    )
+    Returns:
+        The value stored in the result.json file
+    """
+    start_time = time.time()
+    # Convert file_path to a Path object if it's a string
+    file_path = Path(file_path)
+    
+    log_info(
+        f"EXECUTING FILE: {file_path}",
+        task_id=task_id,
+        depth=depth
+    )
+    
+    check_file_before_execution(file_path, task_id, depth, config)
+    prepare_file_for_execution(file_path)
+    
+    # Execute the file as a subprocess
+    try:
+        # Run from the directory of the file to ensure relative paths work.
+        # The working directory is passed to the subprocess instead of calling
+        # os.chdir, which is process-wide and unsafe with concurrent subtasks.
+        file_name = file_path.name
+        timeout = config.execution_timeout if config else get_execution_timeout()
+        returncode, stdout, stderr = run_process([PYTHON_EXECUTABLE, file_name], file_path.parent, timeout, cancel)
         
-        execution_time = time.time() - start_time
+        return collect_execution_result(
+            file_path, returncode, stdout, stderr,
+            start_time, task_id, depth
+        )
+    except Exception as e:
+        log_error(
+            f"ERROR EXECUTING FILE: {e}",
+            task_id=task_id,
+            depth=depth
+        )
+        raise
+
+
+async def kill_process_async(process):
+    """
+    Kill an asyncio subprocess, if still running, and wait for it to exit.
+    
+    Args:
+        process: The asyncio.subprocess.Process
+    """
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+    await process.wait()
+
+
+async def execute_file_async(file_path, task_id=None, depth=None, config=None):
+    """
+    Executes a Python file without blocking the event loop and returns the result.
+    
+    Args:
+        file_path: Path to the Python file to execute
+        task_id: Optional task ID for logging
+        depth: Optional depth for logging
+        config: Optional RunConfig whose execution timeout and validation setting apply instead of the environment
         
-        # Log the result
-        if result is not None:
-            result_str = str(result)
-            if len(result_str) > 100:
-                result_str = result_str[:97] + "..."
-                
-            log_success(
-                f"EXECUTION COMPLETE ({execution_time:.2f}s)",
-                task_id=task_id,
-                depth=depth,
-                data={
-                    "result_type": type(result).__name__,
-                    "result_preview": result_str
-                }
-            )
-            
-            # Log the result specifically 
-            log_result(
-                f"CALCULATION RESULT: {result_str}",
-                result=result,
-                task_id=task_id,
-                depth=depth
-            )
-        else:
-            log_warning(
-                f"Execution completed but no result was found",
-                task_id=task_id,
-                depth=depth
-            )
+    Returns:
+        The value stored in the result.json file
+    """
+    start_time = time.time()
+    file_path = Path(file_path)
+    
+    log_info(
+        f"EXECUTING FILE: {file_path}",
+        task_id=task_id,
+        depth=depth
+    )
+    
+    check_file_before_execution(file_path, task_id, depth, config)
+    prepare_file_for_execution(file_path)
+    
+    try:
+        process = await asyncio.create_subprocess_exec(
+            PYTHON_EXECUTABLE, file_path.name,
+            cwd=file_path.parent,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        timeout = config.execution_timeout if config else get_execution_timeout()
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError as e:
+            await kill_process_async(process)
+            raise ExecutionTimeoutError(f"Execution timed out after {timeout}s") from e
+        except asyncio.CancelledError:
+            # Do not leave the process running when the caller gave up on it, and reap
+            # it before the event loop closes so its transport is not left behind
+            await kill_process_async(process)
+            raise
         
-        return result
+        return collect_execution_result(
+            file_path, process.returncode,
+            stdout.decode(errors="replace"), stderr.decode(errors="replace"),
+            start_time, task_id, depth
+        )
     except Exception as e:
         log_error(
             f"ERROR EXECUTING FILE: {e}",
             task_id=task_id,
             depth=depth
         )
-        raise 
\ No newline at end of file
+        raise
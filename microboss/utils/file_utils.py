@@ -35,8 +35,17 @@ def create_task_directory(task):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     safe_name = create_safe_filename(task)
     task_dir = run_dir / f"{timestamp}_{safe_name}"
-    task_dir.mkdir(exist_ok=True)
-    return task_dir
+    
+    # Identical tasks started within the same second (e.g. concurrent subtasks)
+    # must not share a directory, so add a counter suffix on collision
+    suffix = 1
+    while True:
+        try:
+            task_dir.mkdir()
+            return task_dir
+        except FileExistsError:
+            suffix += 1
+            task_dir = run_dir / f"{timestamp}_{safe_name}_{suffix}"
 
 
 def save_code_to_file(code, file_path):
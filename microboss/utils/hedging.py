@@ -0,0 +1,415 @@
+"""
+Hedged LLM requests for tail-latency control in the microboss package.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from microboss.utils.logging import log_info, log_warning
+
+# Number of recent latencies kept per provider, model and purpose
+HISTORY_SIZE = 200
+
+
+class LatencyHistory:
+    """Latencies of the recent calls of one provider, model and purpose."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.samples = deque(maxlen=size)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, percentile):
+        """
+        Get a percentile of the recent latencies.
+
+        Args:
+            percentile (float): Percentile, between 0 and 100
+
+        Returns:
+            float: The latency in seconds
+        """
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def expected_beyond(self, elapsed):
+        """
+        Estimate how long a call still running after some time will take in total.
+
+        Args:
+            elapsed (float): Seconds the call has been running
+
+        Returns:
+            float: Mean of the recent latencies longer than elapsed, or elapsed if there are none
+        """
+        longer = [latency for latency in self.samples if latency > elapsed]
+        return sum(longer) / len(longer) if longer else elapsed
+
+
+def _run_in_thread(fn):
+    """Run a function in a daemon thread, with the caller's context. Returns its Future."""
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class Hedger:
+    """
+    Sends a second, hedge request when an LLM call is slower than usual.
+
+    A call still running after the configured percentile of the recent latencies
+    of its provider, model and purpose is sent again to the hedge provider, and
+    whichever returns first answers. The hedges are bounded by a share of the
+    calls, so a slow provider cannot double the traffic. An async loser is
+    cancelled; a sync loser cannot be interrupted, so its response is discarded
+    when it arrives.
+    """
+
+    def __init__(self, percentile=95.0, max_hedge_ratio=0.05, min_samples=20):
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latency_saved = 0.0
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, latency):
+        """
+        Add the latency of a call to the history.
+
+        Args:
+            key (tuple): (provider, model, purpose)
+            latency (float): Seconds the call took
+        """
+        with self._lock:
+            self._histories.setdefault(key, LatencyHistory()).add(latency)
+
+    def threshold(self, key):
+        """
+        Get the time after which a call is hedged.
+
+        Args:
+            key (tuple): (provider, model, purpose)
+
+        Returns:
+            float: Seconds, or None until enough calls have been observed
+        """
+        with self._lock:
+            history = self._histories.get(key)
+            if history is None or len(history.samples) < self.min_samples:
+                return None
+            return history.percentile(self.percentile)
+
+    def _start_call(self, key):
+        """Count a call and get its hedging threshold."""
+        with self._lock:
+            self.calls += 1
+        return self.threshold(key)
+
+    def _reserve_hedge(self):
+        """Take a hedge from the budget. Returns False if the budget is spent."""
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def _record_win(self, saved=0.0):
+        with self._lock:
+            self.hedge_wins += 1
+            self.latency_saved += max(0.0, saved)
+
+    def _record_saved(self, saved):
+        with self._lock:
+            self.latency_saved += max(0.0, saved)
+
+    def _log_hedge(self, key, threshold, hedge_label):
+        log_info(
+            "LLM CALL IS SLOW, SENDING HEDGE REQUEST",
+            data={"provider": key[0], "model": key[1], "purpose": key[2],
+                  "threshold": round(threshold, 3), "hedge": hedge_label}
+        )
+
+    def run(self, key, primary, hedge, hedge_label=None):
+        """
+        Run a call, hedging it if it is slow.
+
+        Args:
+            key (tuple): (provider, model, purpose) of the primary call
+            primary (callable): Sends the primary request and returns its result
+            hedge (callable): Sends the hedge request and returns its result
+            hedge_label (str): Name of the hedge provider, for the logs
+
+        Returns:
+            tuple: (result, hedged) where hedged is True if the hedge answered
+        """
+        threshold = self._start_call(key)
+        start_time = time.perf_counter()
+        if threshold is None:
+            result = primary()
+            self.observe(key, time.perf_counter() - start_time)
+            return result, False
+
+        primary_future = _run_in_thread(primary)
+        # Whichever of the primary's completion and the hedge's win comes last records the time saved
+        race = {"primary_latency": None, "hedge_won_at": None}
+
+        def primary_done(future):
+            latency = time.perf_counter() - start_time
+            failed = future.exception() is not None
+            if not failed:
+                self.observe(key, latency)
+            with self._lock:
+                race["primary_latency"] = None if failed else latency
+                hedge_won_at = race["hedge_won_at"]
+            if hedge_won_at is not None and not failed:
+                # A sync primary runs to completion, which gives the exact time saved
+                self._record_saved(latency - hedge_won_at)
+
+        primary_future.add_done_callback(primary_done)
+        done, _ = wait([primary_future], timeout=threshold)
+        if done or not self._reserve_hedge():
+            return primary_future.result(), False
+
+        self._log_hedge(key, threshold, hedge_label)
+        hedge_future = _run_in_thread(hedge)
+        pending = {primary_future, hedge_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if primary_future in done and primary_future.exception() is None:
+                return primary_future.result(), False
+            if hedge_future in done and hedge_future.exception() is None:
+                hedge_won_at = time.perf_counter() - start_time
+                with self._lock:
+                    race["hedge_won_at"] = hedge_won_at
+                    primary_latency = race["primary_latency"]
+                # A failed primary means the hedge saved a fallback rather than time
+                self._record_win(primary_latency - hedge_won_at if primary_latency is not None else 0.0)
+                return hedge_future.result(), True
+        return primary_future.result(), False
+
+    async def run_async(self, key, primary, hedge, hedge_label=None):
+        """
+        Asynchronous version of run, cancelling the request that loses.
+
+        Args:
+            key (tuple): (provider, model, purpose) of the primary call
+            primary (callable): Returns a coroutine sending the primary request
+            hedge (callable): Returns a coroutine sending the hedge request
+            hedge_label (str): Name of the hedge provider, for the logs
+
+        Returns:
+            tuple: (result, hedged) where hedged is True if the hedge answered
+        """
+        threshold = self._start_call(key)
+        start_time = time.perf_counter()
+        if threshold is None:
+            result = await primary()
+            self.observe(key, time.perf_counter() - start_time)
+            return result, False
+
+        primary_task = asyncio.ensure_future(primary())
+        tasks = [primary_task]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done or not self._reserve_hedge():
+                result = await primary_task
+                self.observe(key, time.perf_counter() - start_time)
+                return result, False
+
+            self._log_hedge(key, threshold, hedge_label)
+            hedge_task = asyncio.ensure_future(hedge())
+            tasks.append(hedge_task)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+                elapsed = time.perf_counter() - start_time
+                if primary_task in done and primary_task.exception() is None:
+                    self.observe(key, elapsed)
+                    return primary_task.result(), False
+                if hedge_task in done and hedge_task.exception() is None:
+                    if primary_task.done():
+                        self._record_win()
+                    else:
+                        # The primary is cancelled, so its latency is estimated from the history
+                        with self._lock:
+                            expected = self._histories[key].expected_beyond(elapsed)
+                        self._record_win(expected - elapsed)
+                        # Its elapsed time is a lower bound of its latency, keep the tail in the history
+                        self.observe(key, elapsed)
+                    return hedge_task.result(), True
+            return primary_task.result(), False
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        """
+        Get the hedging counters.
+
+        Returns:
+            dict: Calls, hedges sent, hedge rate, hedges that answered first and latency saved in seconds
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "latency_saved": round(self.latency_saved, 3),
+                "average_latency_saved": round(self.latency_saved / self.hedge_wins, 3) if self.hedge_wins else 0.0,
+                "thresholds": {
+                    ":".join(key): round(history.percentile(self.percentile), 3)
+                    for key, history in self._histories.items()
+                    if len(history.samples) >= self.min_samples
+                }
+            }
+
+
+def _get_float_env(name, default, minimum, maximum):
+    """Read a bounded number from the environment."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is None or not minimum <= number <= maximum:
+        log_warning(f"Invalid {name} value: {value}. Using default {default}.")
+        return default
+    return number
+
+
+def is_hedging_enabled():
+    """
+    Check whether slow LLM calls are hedged by default. Each run reads it once, into its RunConfig.
+
+    Returns:
+        bool: True if MICROBOSS_HEDGE is set to true
+    """
+    return os.environ.get("MICROBOSS_HEDGE", "false").lower() == "true"
+
+
+def get_hedge_provider():
+    """
+    Get the provider hedge requests are sent to by default.
+
+    Returns:
+        str: MICROBOSS_HEDGE_PROVIDER, or None for the fallback provider of each backend
+    """
+    return os.environ.get("MICROBOSS_HEDGE_PROVIDER") or None
+
+
+def get_hedge_model():
+    """
+    Get the model of the hedge requests by default.
+
+    Returns:
+        str: MICROBOSS_HEDGE_MODEL, or None for the model of the run
+    """
+    return os.environ.get("MICROBOSS_HEDGE_MODEL") or None
+
+
+_hedgers = {}
+_hedgers_lock = threading.Lock()
+
+
+def get_hedger(enabled=None):
+    """
+    Get the process-wide hedger, configured with MICROBOSS_HEDGE_PERCENTILE,
+    MICROBOSS_HEDGE_BUDGET and MICROBOSS_HEDGE_MIN_SAMPLES.
+
+    Args:
+        enabled (bool): Whether the calling run hedges, MICROBOSS_HEDGE if None
+
+    Returns:
+        Hedger: The hedger, or None if hedging is disabled
+    """
+    if not (is_hedging_enabled() if enabled is None else enabled):
+        return None
+
+    percentile = _get_float_env("MICROBOSS_HEDGE_PERCENTILE", 95.0, 1.0, 100.0)
+    max_hedge_ratio = _get_float_env("MICROBOSS_HEDGE_BUDGET", 0.05, 0.0, 1.0)
+    min_samples = int(_get_float_env("MICROBOSS_HEDGE_MIN_SAMPLES", 20, 1, 100000))
+
+    key = (percentile, max_hedge_ratio, min_samples)
+    with _hedgers_lock:
+        hedger = _hedgers.get(key)
+        if hedger is None:
+            hedger = Hedger(percentile, max_hedge_ratio, min_samples)
+            _hedgers[key] = hedger
+        return hedger
+
+
+def get_hedge_client(backend, client, is_async=False, name=None):
+    """
+    Get the client hedge requests are sent to: the named provider, or else
+    the fallback provider of the backend.
+
+    Args:
+        backend (ProviderBackend): Backend of the primary request
+        client: Client of the primary request
+        is_async (bool): Whether an async client is needed
+        name (str): Optional name of the provider to hedge with, see get_hedge_provider()
+
+    Returns:
+        The hedge client, or None if there is no healthy provider to hedge with
+    """
+    # Imported here, the provider registry imports the utilities
+    from microboss.providers.base import backend_for_client, get_backend
+    from microboss.providers.router import is_healthy
+
+    if not name:
+        hedge_client = backend.get_fallback_client(is_async)
+    else:
+        try:
+            hedge_backend = get_backend(name)
+        except ValueError as e:
+            log_warning(f"Invalid hedge provider: {name}. {str(e)}")
+            return None
+        if hedge_backend is backend:
+            hedge_client = client
+        else:
+            try:
+                hedge_client, _ = hedge_backend.get_async_client() if is_async else hedge_backend.get_client()
+            except Exception as e:
+                log_warning(f"Could not create the {hedge_backend.label} hedge client: {str(e)}")
+                return None
+
+    # Hedging to a provider whose circuit breaker is open would only add load to it
+    if hedge_client is None or not is_healthy(backend_for_client(hedge_client)):
+        return None
+    return hedge_client
+
+
+def get_hedge_stats():
+    """
+    Get the counters of the hedger of the process.
+
+    Returns:
+        dict: See Hedger.stats(), empty if no run has hedged
+    """
+    with _hedgers_lock:
+        hedgers = list(_hedgers.values())
+    return hedgers[-1].stats() if hedgers else {}
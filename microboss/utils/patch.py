@@ -0,0 +1,239 @@
+"""
+Targeted edits of generated code for the microboss package.
+"""
+
+import os
+import re
+import threading
+
+from microboss.utils.logging import log_info, log_warning
+from microboss.utils.streaming import check_syntax
+
+SEARCH_MARKER = re.compile(r"^<{5,}\s*SEARCH\s*$")
+DIVIDER_MARKER = re.compile(r"^={5,}\s*$")
+REPLACE_MARKER = re.compile(r"^>{5,}\s*REPLACE\s*$")
+HUNK_HEADER = re.compile(r"^@@ .* @@")
+
+
+class PatchError(Exception):
+    """Raised when a patch does not apply to the code."""
+
+
+def get_fix_mode():
+    """
+    Get how failing code is fixed.
+
+    Returns:
+        str: "patch" to ask for targeted edits, or "full" to ask for the whole fixed file (MICROBOSS_FIX_MODE)
+    """
+    mode = os.environ.get("MICROBOSS_FIX_MODE", "full").lower()
+    if mode not in ("full", "patch"):
+        log_warning(f"Invalid MICROBOSS_FIX_MODE value: {mode}. Using default full.")
+        return "full"
+    return mode
+
+
+def parse_edit_blocks(text):
+    """
+    Parse SEARCH/REPLACE edit blocks.
+
+    Args:
+        text (str): The response holding the blocks
+
+    Returns:
+        list: (search, replace) pairs, in order
+    """
+    edits = []
+    section = None
+    for line in text.splitlines():
+        if SEARCH_MARKER.match(line):
+            section, search, replace = "search", [], []
+        elif section == "search" and DIVIDER_MARKER.match(line):
+            section = "replace"
+        elif section == "replace" and REPLACE_MARKER.match(line):
+            edits.append(("\n".join(search), "\n".join(replace)))
+            section = None
+        elif section == "search":
+            search.append(line)
+        elif section == "replace":
+            replace.append(line)
+    return edits
+
+
+def parse_unified_diff(text):
+    """
+    Parse the hunks of a unified diff as edits. Line numbers are ignored, each hunk
+    is located by its context and removed lines.
+
+    Args:
+        text (str): The response holding the diff
+
+    Returns:
+        list: (search, replace) pairs, in order
+    """
+    edits = []
+    old, new = None, None
+
+    def close_hunk():
+        # Blank context lines trailing a hunk are usually the blank lines after the diff
+        while old and new and old[-1] == new[-1] == "":
+            old.pop()
+            new.pop()
+        if old is not None and (old or new):
+            edits.append(("\n".join(old), "\n".join(new)))
+
+    for line in text.splitlines():
+        if HUNK_HEADER.match(line):
+            close_hunk()
+            old, new = [], []
+        elif old is None or line.startswith(("---", "+++")):
+            continue
+        elif line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            old.append(line[1:])
+            new.append(line[1:])
+        elif not line.startswith("\\"):
+            # The hunk ended, e.g. at a closing fence
+            close_hunk()
+            old, new = None, None
+    close_hunk()
+    return edits
+
+
+def apply_edit(code, search, replace):
+    """
+    Replace the only occurrence of a block of lines.
+
+    The block is matched exactly first, then line by line ignoring trailing whitespace.
+
+    Args:
+        code (str): The code
+        search (str): Lines to replace
+        replace (str): Replacement lines
+
+    Returns:
+        str: The edited code
+
+    Raises:
+        PatchError: If the block is empty, missing, or found more than once
+    """
+    if not search.strip():
+        raise PatchError("An edit has no lines to replace")
+
+    count = code.count(search)
+    if count == 1:
+        return code.replace(search, replace, 1)
+    if count > 1:
+        raise PatchError(f"An edit matches {count} places: {search.splitlines()[0].strip()!r}")
+
+    lines = code.split("\n")
+    search_lines = [line.rstrip() for line in search.split("\n")]
+    matches = [
+        start for start in range(len(lines) - len(search_lines) + 1)
+        if [line.rstrip() for line in lines[start:start + len(search_lines)]] == search_lines
+    ]
+    if len(matches) != 1:
+        first_line = next(line for line in search_lines if line.strip()).strip()
+        raise PatchError(f"An edit matches {len(matches)} places: {first_line!r}")
+    start = matches[0]
+    return "\n".join(lines[:start] + replace.split("\n") + lines[start + len(search_lines):])
+
+
+def apply_patch(code, response):
+    """
+    Apply the edit blocks, or else the unified diff, of a response to some code.
+
+    Args:
+        code (str): The code
+        response (str): The response of the model
+
+    Returns:
+        tuple: (patched_code, patch_format, edit_count)
+
+    Raises:
+        PatchError: If the response holds no edits, an edit does not apply, or the patched code does not compile
+    """
+    edits = parse_edit_blocks(response)
+    patch_format = "edit blocks"
+    if not edits:
+        edits = parse_unified_diff(response)
+        patch_format = "unified diff"
+    if not edits:
+        raise PatchError("The response holds no edit blocks or diff hunks")
+
+    for search, replace in edits:
+        code = apply_edit(code, search, replace)
+
+    syntax_error = check_syntax(code)
+    if syntax_error:
+        raise PatchError(f"The patched code does not compile: {syntax_error}")
+    return code, patch_format, len(edits)
+
+
+class PatchStats:
+    """Counters of the patches applied and of the ones that fell back to a full rewrite."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.applied = 0
+        self.edits = 0
+        self._lock = threading.Lock()
+
+    def record(self, applied, edits=0):
+        with self._lock:
+            self.attempts += 1
+            self.applied += int(applied)
+            self.edits += edits
+
+    def stats(self):
+        """
+        Get the patch counters.
+
+        Returns:
+            dict: Patches attempted, applied and fallen back, and edits applied
+        """
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "applied": self.applied,
+                "fallbacks": self.attempts - self.applied,
+                "edits": self.edits
+            }
+
+
+_patch_stats = PatchStats()
+
+
+def try_apply_patch(code, response):
+    """
+    Apply a patch response, recording and logging the outcome.
+
+    Args:
+        code (str): The code
+        response (str): The response of the model
+
+    Returns:
+        str: The patched code, or None if the patch does not apply
+    """
+    try:
+        patched_code, patch_format, edit_count = apply_patch(code, response)
+    except PatchError as e:
+        _patch_stats.record(False)
+        log_warning("CODE PATCH DID NOT APPLY, REWRITING THE WHOLE FILE", data={"reason": str(e)})
+        return None
+    _patch_stats.record(True, edit_count)
+    log_info("CODE PATCH APPLIED", data={"format": patch_format, "edits": edit_count})
+    return patched_code
+
+
+def get_patch_stats():
+    """
+    Get the patch counters of the process.
+
+    Returns:
+        dict: See PatchStats.stats()
+    """
+    return _patch_stats.stats()
@@ -0,0 +1,322 @@
+"""
+Process-wide token-bucket rate limiting of LLM calls for the microboss package.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+from microboss.utils.logging import log_debug, log_warning
+
+# Characters per token used to estimate the input tokens of a request
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(*texts):
+    """
+    Estimate the number of tokens of some texts.
+
+    Args:
+        *texts (str): The texts
+
+    Returns:
+        int: Roughly one token per four characters
+    """
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """
+    A bucket refilled at a constant rate up to its capacity.
+
+    Takes may overdraw the bucket: the debt is paid back by the refill, which is
+    how a caller is told how long to wait before its request may be sent.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount, now):
+        """
+        Take an amount from the bucket.
+
+        Args:
+            amount (float): The amount
+            now (float): Current monotonic time
+
+        Returns:
+            float: Seconds until the bucket is no longer overdrawn
+        """
+        self.refill(now)
+        self.level -= amount
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def give(self, amount, now):
+        """Return an amount to the bucket, or take more if the amount is negative."""
+        self.refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Reservation:
+    """A granted slot: the caller waits for its delay, sends the request, then reconciles it."""
+
+    def __init__(self, limiter, estimated_tokens, delay):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.delay = delay
+
+    def reconcile(self, tokens):
+        """
+        Correct the estimated tokens with the usage reported by the provider.
+
+        Args:
+            tokens (int): Tokens actually used, 0 if the call failed
+        """
+        self.limiter.reconcile(self, tokens)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits of one provider and model.
+
+    Every caller reserves its request and estimated tokens up front, in the order
+    the callers arrive, and is told how long to wait. Later callers queue behind
+    earlier ones, so callers are served fairly whichever thread or event loop
+    they run in.
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.calls = 0
+        self.waits = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens):
+        """
+        Reserve a request and its estimated tokens.
+
+        Args:
+            estimated_tokens (int): Estimated input tokens of the request
+
+        Returns:
+            Reservation: The reservation, with the seconds to wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            if self.requests:
+                delay = max(delay, self.requests.take(1, now))
+            if self.tokens:
+                delay = max(delay, self.tokens.take(estimated_tokens, now))
+            self.calls += 1
+            if delay > 0:
+                self.waits += 1
+                self.total_wait += delay
+                self.max_wait = max(self.max_wait, delay)
+            return Reservation(self, estimated_tokens, delay)
+
+    def reconcile(self, reservation, tokens):
+        """Give back overestimated tokens, or take the underestimated ones."""
+        if self.tokens:
+            with self._lock:
+                self.tokens.give(reservation.estimated_tokens - tokens, time.monotonic())
+
+    def acquire(self, estimated_tokens):
+        """
+        Wait until a request may be sent.
+
+        Args:
+            estimated_tokens (int): Estimated input tokens of the request
+
+        Returns:
+            Reservation: The reservation, to reconcile once the call has returned
+        """
+        reservation = self.reserve(estimated_tokens)
+        if reservation.delay > 0:
+            self._log_wait(reservation)
+            self._set_waiting(1)
+            try:
+                time.sleep(reservation.delay)
+            finally:
+                self._set_waiting(-1)
+        return reservation
+
+    async def acquire_async(self, estimated_tokens):
+        """
+        Asynchronous version of acquire, waiting without blocking the event loop.
+
+        Args:
+            estimated_tokens (int): Estimated input tokens of the request
+
+        Returns:
+            Reservation: The reservation, to reconcile once the call has returned
+        """
+        reservation = self.reserve(estimated_tokens)
+        if reservation.delay > 0:
+            self._log_wait(reservation)
+            self._set_waiting(1)
+            try:
+                await asyncio.sleep(reservation.delay)
+            except asyncio.CancelledError:
+                # Nothing was sent, give the slot back to the callers behind
+                self.reconcile(reservation, 0)
+                if self.requests:
+                    with self._lock:
+                        self.requests.give(1, time.monotonic())
+                raise
+            finally:
+                self._set_waiting(-1)
+        return reservation
+
+    def _set_waiting(self, change):
+        with self._lock:
+            self.waiting += change
+
+    def _log_wait(self, reservation):
+        log_debug(
+            "RATE LIMITED, WAITING BEFORE LLM CALL",
+            data={"limiter": self.name, "wait": round(reservation.delay, 3), "queue_depth": self.waiting + 1}
+        )
+
+    def stats(self):
+        """
+        Get the limiter metrics.
+
+        Returns:
+            dict: Calls, calls that waited, current queue depth and wait times in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.refill(now)
+            return {
+                "calls": self.calls,
+                "waits": self.waits,
+                "queue_depth": self.waiting,
+                "total_wait": round(self.total_wait, 3),
+                "average_wait": round(self.total_wait / self.waits, 3) if self.waits else 0.0,
+                "max_wait": round(self.max_wait, 3),
+                "requests_available": round(self.requests.level, 2) if self.requests else None,
+                "tokens_available": round(self.tokens.level, 2) if self.tokens else None
+            }
+
+
+def _parse_limit(name, value):
+    """Parse an optional per-minute limit, None meaning unlimited."""
+    if value is None or value == "":
+        return None
+    try:
+        limit = float(value)
+    except (TypeError, ValueError):
+        log_warning(f"Invalid {name} value: {value}. Ignoring this limit.")
+        return None
+    return limit if limit > 0 else None
+
+
+def get_rate_limits():
+    """
+    Read the rate limits from the environment. MICROBOSS_RATE_LIMIT_RPM and
+    MICROBOSS_RATE_LIMIT_TPM apply to every provider and model, unless
+    MICROBOSS_RATE_LIMITS (a JSON object mapping a provider name, or a
+    "provider:model" prefix, to {"rpm": ..., "tpm": ...}) sets their own.
+
+    Returns:
+        dict: Mapping of provider or "provider:model" prefix ("" for every provider and model)
+              to a dict with the "rpm" and/or "tpm" limits it sets, None meaning unlimited
+    """
+    limits = {"": {
+        "rpm": _parse_limit("MICROBOSS_RATE_LIMIT_RPM", os.environ.get("MICROBOSS_RATE_LIMIT_RPM")),
+        "tpm": _parse_limit("MICROBOSS_RATE_LIMIT_TPM", os.environ.get("MICROBOSS_RATE_LIMIT_TPM"))
+    }}
+    limits_str = os.environ.get("MICROBOSS_RATE_LIMITS")
+    if limits_str:
+        try:
+            limits.update({
+                prefix: {
+                    name: _parse_limit(f"MICROBOSS_RATE_LIMITS {prefix} {name}", entry[name])
+                    for name in ("rpm", "tpm") if name in entry
+                }
+                for prefix, entry in json.loads(limits_str).items()
+            })
+        except (ValueError, TypeError, AttributeError):
+            log_warning(f"Invalid MICROBOSS_RATE_LIMITS value: {limits_str}. Using the default limits.")
+    return limits
+
+
+def resolve_rate_limits(limits, provider, model):
+    """
+    Get the limits of a provider and model: those of its most specific entry,
+    each falling back to the less specific entries.
+
+    Args:
+        limits (dict): The limits, as returned by get_rate_limits()
+        provider (str): Name of the provider backend
+        model (str): Model name
+
+    Returns:
+        tuple: (requests_per_minute, tokens_per_minute), None meaning unlimited
+    """
+    name = f"{provider}:{model}"
+    resolved = {"rpm": None, "tpm": None}
+    for prefix in sorted(limits, key=len):
+        if prefix in ("", provider) or (prefix.startswith(f"{provider}:") and name.startswith(prefix)):
+            resolved.update(limits[prefix])
+    return resolved["rpm"], resolved["tpm"]
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, model, limits=None):
+    """
+    Get the process-wide rate limiter of a provider and model.
+
+    Args:
+        provider (str): Name of the provider backend
+        model (str): Model name
+        limits (dict): Rate limits of the run, as returned by get_rate_limits(), read from the environment if None
+
+    Returns:
+        RateLimiter: The limiter, or None if no limit is set
+    """
+    requests_per_minute, tokens_per_minute = resolve_rate_limits(
+        get_rate_limits() if limits is None else limits, provider, model
+    )
+    if requests_per_minute is None and tokens_per_minute is None:
+        return None
+
+    key = (provider, model, requests_per_minute, tokens_per_minute)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(f"{provider}:{model}", requests_per_minute, tokens_per_minute)
+            _rate_limiters[key] = limiter
+        return limiter
+
+
+def get_rate_limit_stats():
+    """
+    Get the metrics of every rate limiter of the process.
+
+    Returns:
+        dict: Mapping of "provider:model" to RateLimiter.stats()
+    """
+    with _rate_limiters_lock:
+        limiters = list(_rate_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
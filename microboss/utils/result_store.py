@@ -0,0 +1,192 @@
+"""
+Content-addressed store of solved subtasks for the microboss package.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from microboss.utils.cache import _get_int_env
+from microboss.utils.logging import log_debug, log_warning
+
+# Defaults for the result store
+DEFAULT_RESULT_STORE_PATH = "run/.cache/results.sqlite3"
+DEFAULT_RESULT_STORE_MAX_ENTRIES = 10000
+
+
+def normalize_task(task):
+    """
+    Normalize a task description so trivially different spellings share a key.
+
+    Args:
+        task (str): Task description
+
+    Returns:
+        str: The task lowercased, with whitespace collapsed and trailing punctuation removed
+    """
+    return re.sub(r"\s+", " ", task).strip().rstrip(".!").lower()
+
+
+def make_result_key(task, inputs, depth, provider=None, model=None):
+    """
+    Build the key of a solved task.
+
+    Args:
+        task (str): Task description
+        inputs (list): Values of the dependencies the task was solved with
+        depth (int): Depth the task was solved at
+        provider (str): Name of the provider backend the task was solved with
+        model (str): Model the task was solved with, as resolved by the backend
+
+    Returns:
+        str: Hex digest identifying the task
+    """
+    payload = json.dumps(
+        {"task": normalize_task(task), "inputs": inputs or [], "depth": depth, "provider": provider, "model": model},
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    On-disk store mapping solved tasks to their validated code and result,
+    backed by SQLite in WAL mode.
+
+    Code is only stored for tasks solved directly (depth 1); results of
+    decomposed tasks are stored without code.
+    """
+
+    def __init__(self, path=DEFAULT_RESULT_STORE_PATH, max_entries=DEFAULT_RESULT_STORE_MAX_ENTRIES, revalidate=False):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                task TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                code TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up a solved task.
+
+        Args:
+            key (str): Key from make_result_key
+
+        Returns:
+            dict: {"code": str or None, "result": ...}, or None if the task has not been solved
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT code, result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+
+        log_debug(
+            f"RESULT STORE {'HIT' if row is not None else 'MISS'}",
+            data={"key": key[:16], "hits": self.hits, "misses": self.misses}
+        )
+        if row is None:
+            return None
+        return {"code": row[0], "result": json.loads(row[1])}
+
+    def set(self, key, task, depth, result, code=None):
+        """
+        Store a solved task and evict the least recently used entries beyond max_entries.
+
+        Args:
+            key (str): Key from make_result_key
+            task (str): Task description, for inspection
+            depth (int): Depth the task was solved at
+            result: The validated result
+            code (str): The code that produced the result, if solved directly
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, task, depth, code, result, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, task, depth, code, json.dumps(result, default=str), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        """
+        Forget a solved task, e.g. after its stored code failed re-validation.
+
+        Args:
+            key (str): Key from make_result_key
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all stored results."""
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """
+    Get the process-wide result store.
+
+    Returns:
+        ResultStore: The store, or None if memoization is disabled with MICROBOSS_RESULT_STORE=false
+    """
+    global _result_store
+
+    if os.environ.get("MICROBOSS_RESULT_STORE", "true").lower() != "true":
+        return None
+
+    with _result_store_lock:
+        if _result_store is None:
+            try:
+                _result_store = ResultStore(
+                    path=os.environ.get("MICROBOSS_RESULT_STORE_PATH", DEFAULT_RESULT_STORE_PATH),
+                    max_entries=_get_int_env("MICROBOSS_RESULT_STORE_MAX_ENTRIES", DEFAULT_RESULT_STORE_MAX_ENTRIES),
+                    revalidate=os.environ.get("MICROBOSS_REVALIDATE_RESULTS", "false").lower() == "true"
+                )
+            except sqlite3.Error as e:
+                log_warning(f"Could not open result store: {e}. Result memoization disabled.")
+                return None
+        return _result_store
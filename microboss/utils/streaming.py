@@ -0,0 +1,269 @@
+"""
+Streaming of generated code with early validation for the microboss package.
+"""
+
+import os
+import re
+import threading
+import time
+
+from microboss.providers.base import StreamEnd, Usage
+from microboss.utils.logging import log_info, log_warning
+from microboss.utils.rate_limit import estimate_tokens
+
+# A closing fence at the start of a line
+CLOSING_FENCE_PATTERN = re.compile(r"(?:^|\n)```")
+
+
+def is_streaming_enabled():
+    """
+    Check whether generated and fixed code is streamed.
+
+    Returns:
+        bool: True if MICROBOSS_STREAMING is set to true
+    """
+    return os.environ.get("MICROBOSS_STREAMING", "false").lower() == "true"
+
+
+def check_syntax(code):
+    """
+    Check that code compiles.
+
+    Args:
+        code (str): Python source
+
+    Returns:
+        str: The syntax error, or None if the code compiles
+    """
+    try:
+        compile(code, "main.py", "exec")
+        return None
+    except (SyntaxError, ValueError) as e:
+        return str(e)
+
+
+class CodeStreamParser:
+    """
+    Extracts the code of a response while it streams in.
+
+    Markdown fences are stripped as the text arrives: the code of a fenced
+    response is complete as soon as its closing fence arrives, so the rest of
+    the response (usually prose) does not need to be waited for. A response
+    without an opening fence is code until its end.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fenced = None
+        self.code_start = None
+        self.code = None
+        self._scan_from = 0
+
+    @property
+    def closed(self):
+        """Whether the closing fence of the code block has arrived."""
+        return self.code is not None
+
+    def feed(self, delta):
+        """
+        Add a text delta.
+
+        Args:
+            delta (str): The text received
+
+        Returns:
+            bool: True once the code block is complete
+        """
+        self.text += delta
+        if self.closed:
+            return True
+
+        if self.fenced is None:
+            stripped = self.text.lstrip()
+            if len(stripped) >= 3 or (stripped and not "```".startswith(stripped)):
+                self.fenced = stripped.startswith("```")
+        if not self.fenced:
+            return False
+
+        if self.code_start is None:
+            # The code starts after the language tag of the opening fence
+            newline = self.text.find("\n", self.text.find("```") + 3)
+            if newline < 0:
+                return False
+            self.code_start = self._scan_from = newline + 1
+
+        match = CLOSING_FENCE_PATTERN.search(self.text, self._scan_from)
+        if match:
+            self.code = self.text[self.code_start:match.start()]
+            return True
+        # Rescan the tail next time, a fence may be split across deltas
+        self._scan_from = max(self.code_start, len(self.text) - 4)
+        return False
+
+    def result(self):
+        """
+        Get the code received so far.
+
+        Returns:
+            str: The code, without fences
+        """
+        if self.closed:
+            return self.code
+        if self.fenced and self.code_start is not None:
+            return self.text[self.code_start:]
+        return self.text
+
+
+class StreamingStats:
+    """Counters of streamed calls, their early completions and truncations, and their latencies."""
+
+    def __init__(self):
+        self.calls = 0
+        self.closed_early = 0
+        self.truncated = 0
+        self.total_time_to_first_token = 0.0
+        self.total_time_to_executable = 0.0
+        self.executable = 0
+        self._lock = threading.Lock()
+
+    def record(self, time_to_first_token, time_to_executable, closed_early, truncated):
+        with self._lock:
+            self.calls += 1
+            self.total_time_to_first_token += time_to_first_token or 0.0
+            if time_to_executable is not None:
+                self.executable += 1
+                self.total_time_to_executable += time_to_executable
+            self.closed_early += int(closed_early)
+            self.truncated += int(truncated)
+
+    def stats(self):
+        """
+        Get the streaming counters.
+
+        Returns:
+            dict: Streamed calls, early completions, truncations and average latencies in seconds
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "closed_early": self.closed_early,
+                "truncated": self.truncated,
+                "average_time_to_first_token": round(self.total_time_to_first_token / self.calls, 3) if self.calls else 0.0,
+                "average_time_to_executable": round(self.total_time_to_executable / self.executable, 3) if self.executable else 0.0
+            }
+
+
+_streaming_stats = StreamingStats()
+
+
+def get_streaming_stats():
+    """
+    Get the streaming counters of the process.
+
+    Returns:
+        dict: See StreamingStats.stats()
+    """
+    return _streaming_stats.stats()
+
+
+class _StreamConsumer:
+    """State shared by the sync and async consumers of a code stream."""
+
+    def __init__(self, system, prompt, purpose):
+        self.system = system
+        self.prompt = prompt
+        self.purpose = purpose
+        self.parser = CodeStreamParser()
+        self.start_time = time.perf_counter()
+        self.time_to_first_token = None
+        self.end = None
+
+    def feed(self, event):
+        """Handle a stream event. Returns True when the rest of the stream is not needed."""
+        if isinstance(event, StreamEnd):
+            self.end = event
+            return True
+        if event and self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.start_time
+        return self.parser.feed(event)
+
+    def finish(self):
+        """Validate the code and record the call. Returns (code, usage, truncated)."""
+        code = self.parser.result()
+        syntax_error = check_syntax(code)
+        elapsed = time.perf_counter() - self.start_time
+        closed_early = self.parser.closed and self.end is None
+
+        # A response cut off by max_tokens, or a code block that never closed
+        # and does not compile, will not run: re-request it before executing it
+        truncated = not self.parser.closed and (
+            (self.end is not None and self.end.truncated) or (self.parser.fenced and syntax_error is not None)
+        )
+        time_to_executable = elapsed if syntax_error is None and not truncated else None
+
+        usage = self.end.usage if self.end is not None else None
+        if usage is None:
+            # The provider reports no usage for a stream closed early
+            usage = Usage(estimate_tokens(self.system, self.prompt), estimate_tokens(self.parser.text), 0)
+
+        _streaming_stats.record(self.time_to_first_token, time_to_executable, closed_early, truncated)
+        data = {
+            "purpose": self.purpose,
+            "time_to_first_token": round(self.time_to_first_token or 0.0, 3),
+            "time_to_executable": round(time_to_executable, 3) if time_to_executable is not None else None,
+            "closed_early": closed_early,
+            "syntax_error": syntax_error,
+            "tokens": usage.total
+        }
+        if truncated:
+            log_warning("STREAMED CODE WAS TRUNCATED", data=data)
+        else:
+            log_info("STREAMED CODE RECEIVED", data=data)
+        return code, usage, truncated
+
+
+def stream_code(events, system, prompt, purpose):
+    """
+    Consume a streamed response until its code is complete.
+
+    Args:
+        events: Generator of text deltas and a final StreamEnd, as returned by ProviderBackend.stream
+        system (str): The system prompt, used to estimate tokens when the provider does not report them
+        prompt (str): The user message
+        purpose (str): What the request is for (e.g. "generate code")
+
+    Returns:
+        tuple: (code, usage, truncated)
+    """
+    consumer = _StreamConsumer(system, prompt, purpose)
+    try:
+        for event in events:
+            if consumer.feed(event):
+                break
+    finally:
+        # Stops the generation when the code block closed before the response ended
+        events.close()
+    return consumer.finish()
+
+
+async def async_stream_code(events, system, prompt, purpose):
+    """
+    Asynchronous version of stream_code.
+
+    Args:
+        events: Async generator of text deltas and a final StreamEnd, as returned by ProviderBackend.astream
+        system (str): The system prompt
+        prompt (str): The user message
+        purpose (str): What the request is for (e.g. "generate code")
+
+    Returns:
+        tuple: (code, usage, truncated)
+    """
+    consumer = _StreamConsumer(system, prompt, purpose)
+    try:
+        async for event in events:
+            if consumer.feed(event):
+                break
+    finally:
+        await events.aclose()
+    return consumer.finish()
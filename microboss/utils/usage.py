@@ -0,0 +1,147 @@
+"""
+Token usage, latency and cost accounting of LLM calls for the microboss package.
+"""
+
+import json
+import os
+import threading
+
+from microboss.utils.logging import log_info, log_warning
+
+# USD per million input and output tokens, matched by the longest model name prefix
+MODEL_PRICES = {
+    "claude-3-7-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-opus": (15.0, 75.0),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o-2024-05-13": (5.0, 15.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+# Share of the input price paid for input tokens read from the provider's prompt cache
+CACHED_INPUT_PRICE_FACTOR = 0.1
+
+# Share of the price paid for requests submitted as batch jobs
+BATCH_PRICE_FACTOR = 0.5
+
+_prices = None
+_prices_lock = threading.Lock()
+
+
+def get_model_prices():
+    """
+    Get the price table, with the prices of MICROBOSS_MODEL_PRICES (a JSON object
+    mapping model name prefixes to [input, output] USD per million tokens) added.
+
+    Returns:
+        dict: Mapping of model name prefix to (input, output) prices
+    """
+    global _prices
+
+    with _prices_lock:
+        if _prices is None:
+            prices = dict(MODEL_PRICES)
+            prices_str = os.environ.get("MICROBOSS_MODEL_PRICES")
+            if prices_str:
+                try:
+                    prices.update({prefix: (float(price[0]), float(price[1])) for prefix, price in json.loads(prices_str).items()})
+                except (ValueError, TypeError, IndexError, AttributeError):
+                    log_warning(f"Invalid MICROBOSS_MODEL_PRICES value: {prices_str}. Using default prices.")
+            _prices = prices
+        return _prices
+
+
+def estimate_cost(model, usage):
+    """
+    Estimate the cost of an LLM call.
+
+    Args:
+        model (str): Model name
+        usage (Usage): Tokens used by the call
+
+    Returns:
+        float: Cost in USD, 0 for models without a known price
+    """
+    prices = get_model_prices()
+    prefix = max((prefix for prefix in prices if model.startswith(prefix)), key=len, default=None)
+    if prefix is None:
+        return 0.0
+    input_price, output_price = prices[prefix]
+    uncached_tokens = usage.input_tokens - usage.cached_tokens
+    return (
+        uncached_tokens * input_price
+        + usage.cached_tokens * input_price * CACHED_INPUT_PRICE_FACTOR
+        + usage.output_tokens * output_price
+    ) / 1_000_000
+
+
+def record_llm_call(budget, purpose, backend, model, usage, latency, batch=False, task_id=None, depth=None):
+    """
+    Emit the usage event of a completed LLM call and add it to the task tree's budget.
+
+    Args:
+        budget (Budget): Optional budget of the task tree
+        purpose (str): What the call was for (e.g. "generate code")
+        backend (ProviderBackend): The backend that served the call
+        model (str): Model name
+        usage (Usage): Tokens used by the call
+        latency (float): Seconds spent waiting on the model
+        batch (bool): Whether the request was part of a batch job, billed at a discount
+        task_id: Optional ID of the calling task, so costs add up per task tree in the event log
+        depth: Optional depth of the calling task
+    """
+    cost = estimate_cost(model, usage) if backend.billed else 0.0
+    if batch:
+        cost *= BATCH_PRICE_FACTOR
+    log_info(
+        "LLM CALL COMPLETED",
+        task_id=task_id,
+        depth=depth,
+        data={
+            "provider": backend.name,
+            "model": model,
+            "purpose": purpose,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_tokens": usage.cached_tokens,
+            "latency": round(latency, 3),
+            "cost": round(cost, 6),
+            "batch": batch
+        }
+    )
+    if budget:
+        budget.record_llm_call(purpose, usage, latency, cost)
+
+
+def format_usage_summary(usage):
+    """
+    Format the accounting of a budget for display.
+
+    Args:
+        usage (dict): The accounting, as returned by Budget.usage()
+
+    Returns:
+        list: Lines of the summary
+    """
+    lines = [
+        f"LLM calls: {usage['llm_calls']} ({usage['cache_hits']} served from cache)",
+        f"Tokens: {usage['tokens']:,} ({usage['input_tokens']:,} input, {usage['output_tokens']:,} output, "
+        f"{usage['cached_tokens']:,} cached)",
+        f"Estimated cost: ${usage['cost']:.4f}",
+        f"Time waiting on the model: {usage['llm_seconds']:.2f}s, executing code: {usage['execution_seconds']:.2f}s "
+        f"({usage['executions']} runs)",
+    ]
+    # Per purpose, e.g. to compare the output tokens and latency of patched and rewritten fixes
+    for purpose, entry in sorted(usage.get("purposes", {}).items()):
+        lines.append(
+            f"  {purpose}: {entry['calls']} calls, {entry.get('output_tokens', 0):,} output tokens "
+            f"({entry.get('output_tokens', 0) // max(1, entry['calls']):,} per call), "
+            f"{entry['seconds'] / max(1, entry['calls']):.2f}s per call"
+        )
+    return lines
@@ -0,0 +1,284 @@
+"""
+Static validation of generated code before it is executed, for the microboss package.
+"""
+
+import ast
+import builtins
+import functools
+import importlib.util
+import os
+import sys
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+# A problem found in the code: its line, the error Python would raise, and the message
+ValidationIssue = namedtuple("ValidationIssue", ["line", "kind", "message"])
+
+# Names defined in every module namespace
+MODULE_NAMES = {"__name__", "__file__", "__doc__", "__builtins__", "__spec__", "__loader__", "__package__"}
+
+# Standard library modules, known up front on Python 3.10+ and found with find_spec() before
+STDLIB_MODULE_NAMES = getattr(sys, "stdlib_module_names", frozenset())
+
+# Pattern nodes binding names, which only exist on Python 3.10+
+MATCH_CAPTURE_NODES = tuple(getattr(ast, name) for name in ("MatchAs", "MatchStar") if hasattr(ast, name))
+MATCH_MAPPING_NODES = tuple(getattr(ast, name) for name in ("MatchMapping",) if hasattr(ast, name))
+
+# Calls that define names at run time, which makes undefined names impossible to tell
+DYNAMIC_NAMESPACE_CALLS = {"exec", "eval", "globals", "locals", "vars", "setattr", "__import__"}
+
+# Exceptions whose handlers make the imports of a try block optional
+IMPORT_ERROR_NAMES = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+def is_validation_enabled():
+    """
+    Check whether generated code is validated before it is executed.
+
+    Returns:
+        bool: False if MICROBOSS_VALIDATION is set to false
+    """
+    return os.environ.get("MICROBOSS_VALIDATION", "true").lower() != "false"
+
+
+@functools.lru_cache(maxsize=None)
+def _is_module_available(name):
+    if name in STDLIB_MODULE_NAMES or name in sys.builtin_module_names:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def is_module_installed(name, directory=None):
+    """
+    Check whether a top-level module can be imported by the executed code.
+
+    Args:
+        name (str): Top-level module name
+        directory (Path): Directory the code runs in, whose own modules can be imported too
+
+    Returns:
+        bool: True if the module is in the standard library, installed, or next to the code
+    """
+    if directory is not None and ((directory / f"{name}.py").exists() or (directory / name / "__init__.py").exists()):
+        return True
+    return _is_module_available(name)
+
+
+def _catches_import_error(handler):
+    if handler.type is None:
+        return True
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return any(isinstance(t, ast.Name) and t.id in IMPORT_ERROR_NAMES for t in types)
+
+
+def _find_imports(node, optional=False):
+    """Yield the import statements under a node, with whether a handler makes them optional."""
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        yield node, optional
+        return
+    if isinstance(node, ast.Try):
+        body_optional = optional or any(_catches_import_error(handler) for handler in node.handlers)
+        for statement in node.body:
+            yield from _find_imports(statement, body_optional)
+        for statement in node.handlers + node.orelse + node.finalbody:
+            yield from _find_imports(statement, optional)
+        return
+    for child in ast.iter_child_nodes(node):
+        yield from _find_imports(child, optional)
+
+
+def _assigns_global_result(scope):
+    """Check whether a function or class, or one it defines, declares result global and binds it."""
+    declares = binds = False
+    nested = []
+    nodes = list(ast.iter_child_nodes(scope))
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            nested.append(node)
+            continue
+        if isinstance(node, ast.Global) and "result" in node.names:
+            declares = True
+        elif isinstance(node, ast.Name) and node.id == "result" and isinstance(node.ctx, ast.Store):
+            binds = True
+        nodes.extend(ast.iter_child_nodes(node))
+    return (declares and binds) or any(_assigns_global_result(node) for node in nested)
+
+
+def _assigns_result(node):
+    """Check whether a module-level statement binds result, outside of functions and classes unless declared global."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return _assigns_global_result(node)
+    if isinstance(node, ast.Lambda):
+        return False
+    if isinstance(node, ast.Name) and node.id == "result" and isinstance(node.ctx, ast.Store):
+        return True
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return any((alias.asname or alias.name) == "result" for alias in node.names)
+    return any(_assigns_result(child) for child in ast.iter_child_nodes(node))
+
+
+def _bound_names(tree):
+    """Get every name the code binds anywhere, in any scope."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, MATCH_CAPTURE_NODES) and node.name:
+            names.add(node.name)
+        elif isinstance(node, MATCH_MAPPING_NODES) and node.rest:
+            names.add(node.rest)
+    return names
+
+
+def _undefined_names(tree):
+    """Find the names read but never bound, unless the code defines names dynamically."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names):
+            return []
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DYNAMIC_NAMESPACE_CALLS:
+            return []
+
+    known = _bound_names(tree) | set(dir(builtins)) | MODULE_NAMES
+    issues = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known:
+            if node.id not in issues or node.lineno < issues[node.id].line:
+                issues[node.id] = ValidationIssue(node.lineno, "NameError", f"name '{node.id}' is not defined")
+    return list(issues.values())
+
+
+def validate_code(code, directory=None):
+    """
+    Find the problems that would make code fail before it sets its result.
+
+    The code must compile, assign result at module level if it assigns it at all
+    (a missing result gets a default when the file is prepared), read no name it
+    never defines, and import only modules available to the executed code.
+
+    Args:
+        code (str): The code
+        directory (Path): Directory the code runs in
+
+    Returns:
+        list: ValidationIssue of each problem, empty if the code looks runnable
+    """
+    try:
+        tree = ast.parse(code)
+        compile(tree, "main.py", "exec")
+    except SyntaxError as e:
+        text = (e.text or "").strip()
+        return [ValidationIssue(e.lineno or 0, type(e).__name__, f"{e.msg}" + (f": {text}" if text else ""))]
+    except ValueError as e:
+        return [ValidationIssue(0, "SyntaxError", str(e))]
+
+    issues = []
+    if any(_assigns_result(node) for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id == "result"):
+        if not any(_assigns_result(statement) for statement in tree.body):
+            issues.append(ValidationIssue(
+                0, "NameError", "'result' is only assigned inside a function or class, assign it at module level"
+            ))
+
+    issues.extend(_undefined_names(tree))
+
+    for node, optional in _find_imports(tree):
+        if optional:
+            continue
+        if isinstance(node, ast.ImportFrom):
+            modules = [node.module] if node.module and node.level == 0 else []
+        else:
+            modules = [alias.name for alias in node.names]
+        for module in modules:
+            name = module.split(".")[0]
+            if not is_module_installed(name, directory):
+                issues.append(ValidationIssue(
+                    node.lineno, "ModuleNotFoundError",
+                    f"No module named '{name}' is installed in the execution environment"
+                ))
+    return sorted(issues, key=lambda issue: issue.line)
+
+
+def format_issues(issues):
+    """
+    Format validation issues as a diagnostic for the fix prompt.
+
+    Args:
+        issues (list): ValidationIssue of each problem
+
+    Returns:
+        str: One line per issue
+    """
+    return "\n".join(
+        (f"line {issue.line}: " if issue.line else "") + f"{issue.kind}: {issue.message}" for issue in issues
+    )
+
+
+class ValidationStats:
+    """Counters of the files validated and of the subprocess launches avoided."""
+
+    def __init__(self):
+        self.checked = 0
+        self.launches_avoided = 0
+        self.issues = {}
+        self._lock = threading.Lock()
+
+    def record(self, issues):
+        with self._lock:
+            self.checked += 1
+            if issues:
+                self.launches_avoided += 1
+            for issue in issues:
+                self.issues[issue.kind] = self.issues.get(issue.kind, 0) + 1
+
+    def stats(self):
+        """
+        Get the validation counters.
+
+        Returns:
+            dict: Files checked, subprocess launches avoided, and issues found by kind
+        """
+        with self._lock:
+            return {"checked": self.checked, "launches_avoided": self.launches_avoided, "issues": dict(self.issues)}
+
+
+_validation_stats = ValidationStats()
+
+
+def validate_file(file_path):
+    """
+    Validate a generated file and count the outcome.
+
+    Args:
+        file_path (Path): The file
+
+    Returns:
+        list: ValidationIssue of each problem
+    """
+    file_path = Path(file_path)
+    issues = validate_code(file_path.read_text(encoding="utf-8"), file_path.parent)
+    _validation_stats.record(issues)
+    return issues
+
+
+def get_validation_stats():
+    """
+    Get the validation counters of the process.
+
+    Returns:
+        dict: See ValidationStats.stats()
+    """
+    return _validation_stats.stats()
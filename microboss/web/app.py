@@ -18,11 +18,13 @@ from flask import (
 )
 from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
-import requests
-import anthropic
-import openai
 
+from microboss.providers.router import get_provider_health
 from microboss.utils.logging import event_logger, LogEvent, LogLevel
+from microboss.utils.batch import get_batch_stats
+from microboss.utils.hedging import get_hedge_stats
+from microboss.utils.rate_limit import get_rate_limit_stats
+from microboss.utils.validation import get_validation_stats
 from microboss.web.services import task_service, Task, TaskStatus
 from microboss.web.helpers import register_template_filters, create_graph_data
 
@@ -153,12 +155,11 @@ def tasks():
             description=task_description,
             depth=depth,
             max_retries=max_retries,
-            max_decomposition_depth=max_decomposition_depth
+            max_decomposition_depth=max_decomposition_depth,
+            model=selected_model or None
         )
         
-        # Set environment variable for model if provided
         if selected_model:
-            os.environ["DEFAULT_MODEL"] = selected_model
             logging.info(f"Using selected model: {selected_model}")
         
         # Immediately start the task
@@ -347,6 +348,7 @@ def api_tasks():
             max_retries = data.get("max_retries", 3)
             max_decomposition_depth = data.get("max_decomposition_depth", 10)
             selected_model = data.get("selected_model")
+            batch = data.get("batch")
         else:
             # Handle form data
             task_description = request.form.get("task", "") or request.form.get("task_description", "")
@@ -354,6 +356,7 @@ def api_tasks():
             max_retries = int(request.form.get("max_retries", 3))
             max_decomposition_depth = int(request.form.get("max_decomposition_depth", 10))
             selected_model = request.form.get("selected_model")
+            batch = request.form.get("batch", "").lower() in ("true", "on", "1") or None
             
         # Ensure we have a valid task description
         if not task_description:
@@ -366,12 +369,12 @@ def api_tasks():
             description=task_description,
             depth=depth,
             max_retries=max_retries,
-            max_decomposition_depth=max_decomposition_depth
+            max_decomposition_depth=max_decomposition_depth,
+            model=selected_model or None,
+            batch=batch
         )
         
-        # Set environment variable for model if provided
         if selected_model:
-            os.environ["DEFAULT_MODEL"] = selected_model
             logging.info(f"API using selected model: {selected_model}")
         
         # Auto-start if requested
@@ -429,6 +432,36 @@ def api_events():
     return jsonify(events)
 
 
+@app.route("/api/rate-limits")
+def api_rate_limits():
+    """API endpoint for the queue depth and wait times of the LLM rate limiters."""
+    return jsonify(get_rate_limit_stats())
+
+
+@app.route("/api/hedging")
+def api_hedging():
+    """API endpoint for the hedge rate and latency saved by hedged LLM requests."""
+    return jsonify(get_hedge_stats())
+
+
+@app.route("/api/providers/health")
+def api_provider_health():
+    """API endpoint for the circuit breaker state and recent transitions of each provider."""
+    return jsonify(get_provider_health())
+
+
+@app.route("/api/batches")
+def api_batches():
+    """API endpoint for the batch jobs submitted in batch mode."""
+    return jsonify(get_batch_stats())
+
+
+@app.route("/api/validation")
+def api_validation():
+    """API endpoint for the generated files rejected by static validation before execution."""
+    return jsonify(get_validation_stats())
+
+
 @app.route("/api/test-key")
 def test_api_key():
     """Test the API keys and return the result."""
@@ -464,7 +497,9 @@ def test_api_key():
                 "message": "Anthropic API key has correct prefix"
             })
         
-        # Step 3: Test Anthropic API connection
+        # Step 3: Test Anthropic API connection, the SDK is only needed here
+        import anthropic
+        
         try:
             # Create the Anthropic client safely without 'proxies' parameter
             # Use kwargs to avoid errors with unsupported parameters
@@ -560,6 +595,8 @@ def test_api_key():
             })
         
         # Test OpenAI API connection
+        import openai
+        
         try:
             # Check for custom base URL or organization
             base_url = os.environ.get("OPENAI_API_BASE")
@@ -2,7 +2,9 @@
 Services for the Microboss web application.
 """
 
+import asyncio
 import json
+import os
 import threading
 import time
 import uuid
@@ -12,6 +14,8 @@ from typing import Any, Dict, List, Optional, Union, TypeVar, Type
 from pathlib import Path
 
 from microboss.core.agent import agent
+from microboss.core.async_agent import async_agent
+from microboss.core.config import RunConfig
 from microboss.utils.logging import (
     LogLevel, event_logger, log_info, log_success, log_warning, 
     log_error, log_task, log_code, log_result, LogEvent
@@ -40,7 +44,9 @@ class Task:
         status: TaskStatus = TaskStatus.PENDING,
         result: Any = None,
         error: Optional[str] = None,
-        model_info: Optional[str] = None
+        model_info: Optional[str] = None,
+        model: Optional[str] = None,
+        batch: Optional[bool] = None
     ):
         self.task_id = task_id
         self.description = description
@@ -54,6 +60,12 @@ class Task:
         self.started_at: Optional[float] = None
         self.completed_at: Optional[float] = None
         self.model_info: Optional[str] = model_info
+        # Model selected for this task, or None for DEFAULT_MODEL
+        self.model: Optional[str] = model
+        # Whether to submit code generation requests as batch jobs, or None for MICROBOSS_BATCH
+        self.batch: Optional[bool] = batch
+        # Token, cost and time accounting of the task tree, see Budget.usage()
+        self.usage: Optional[Dict[str, Any]] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization."""
@@ -73,7 +85,10 @@ class Task:
             "formatted_created": datetime.fromtimestamp(self.created_at).strftime('%Y-%m-%d %H:%M:%S'),
             "formatted_started": datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
             "formatted_completed": datetime.fromtimestamp(self.completed_at).strftime('%Y-%m-%d %H:%M:%S') if self.completed_at else None,
-            "model_info": self.model_info
+            "model_info": self.model_info,
+            "model": self.model,
+            "batch": self.batch,
+            "usage": self.usage
         }
     
     @classmethod
@@ -89,27 +104,39 @@ class Task:
             status=TaskStatus(data["status"]),
             result=data.get("result"),
             error=data.get("error"),
-            model_info=data.get("model_info")
+            model_info=data.get("model_info"),
+            model=data.get("model"),
+            batch=data.get("batch")
         )
         task.started_at = data.get("started_at")
         task.completed_at = data.get("completed_at")
+        task.usage = data.get("usage")
         return task
 
 
 class TaskService:
     """Service to manage tasks."""
     
-    def __init__(self):
+    def __init__(self, use_async: Optional[bool] = None):
         self.tasks: Dict[str, Task] = {}
         self.task_threads: Dict[str, threading.Thread] = {}
         self.callbacks = []
+        
+        # Run tasks with the async agent on one shared event loop instead of one thread per task
+        if use_async is None:
+            use_async = os.environ.get("MICROBOSS_ASYNC_TASKS", "false").lower() == "true"
+        self.use_async = use_async
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
     
     def create_task(
         self,
         description: str,
         depth: int = 1,
         max_retries: int = 3,
-        max_decomposition_depth: int = 10
+        max_decomposition_depth: int = 10,
+        model: Optional[str] = None,
+        batch: Optional[bool] = None
     ) -> Task:
         """Create a new task."""
         task_id = str(uuid.uuid4())
@@ -118,7 +145,9 @@ class TaskService:
             description=description,
             depth=depth,
             max_retries=max_retries,
-            max_decomposition_depth=max_decomposition_depth
+            max_decomposition_depth=max_decomposition_depth,
+            model=model,
+            batch=batch
         )
         self.tasks[task_id] = task
         
@@ -128,7 +157,9 @@ class TaskService:
             depth=depth,
             data={
                 "max_retries": max_retries,
-                "max_decomposition_depth": max_decomposition_depth
+                "max_decomposition_depth": max_decomposition_depth,
+                "model": model,
+                "batch": batch
             }
         )
         
@@ -158,14 +189,21 @@ class TaskService:
             depth=task.depth
         )
         
-        # Start task in a separate thread
-        thread = threading.Thread(
-            target=self._execute_task,
-            args=(task_id,),
-            daemon=True
-        )
-        self.task_threads[task_id] = thread
-        thread.start()
+        if self.use_async:
+            # Drive the task from the shared event loop instead of a dedicated thread
+            asyncio.run_coroutine_threadsafe(
+                self._execute_task_async(task_id),
+                self._get_event_loop()
+            )
+        else:
+            # Start task in a separate thread
+            thread = threading.Thread(
+                target=self._execute_task,
+                args=(task_id,),
+                daemon=True
+            )
+            self.task_threads[task_id] = thread
+            thread.start()
         
         # Notify callbacks
         for callback in self.callbacks:
@@ -175,10 +213,60 @@ class TaskService:
     
     def _execute_task(self, task_id: str):
         """Execute a task in the background."""
-        task = self.tasks.get(task_id)
+        task = self._begin_task_execution(task_id)
+        if not task:
+            return
+        
+        # Tasks running side by side each keep their own settings
+        config = RunConfig.from_env(model=task.model, batch=task.batch)
+        budget = config.make_budget()
+        try:
+            # Create a new agent instance to handle this task
+            result = agent(
+                task.description,
+                depth=task.depth,
+                max_retries=task.max_retries,
+                budget=budget,
+                config=config
+            )
+            task.usage = budget.usage()
+            self._complete_task(task_id, task, result)
+        except Exception as e:
+            task.usage = budget.usage()
+            self._fail_task(task_id, task, e)
+        
+        self._notify_task_finished(task)
+    
+    async def _execute_task_async(self, task_id: str):
+        """Execute a task on the shared event loop."""
+        task = self._begin_task_execution(task_id)
         if not task:
             return
         
+        config = RunConfig.from_env(model=task.model, batch=task.batch)
+        budget = config.make_budget()
+        try:
+            result = await async_agent(
+                task.description,
+                depth=task.depth,
+                max_retries=task.max_retries,
+                budget=budget,
+                config=config
+            )
+            task.usage = budget.usage()
+            self._complete_task(task_id, task, result)
+        except Exception as e:
+            task.usage = budget.usage()
+            self._fail_task(task_id, task, e)
+        
+        self._notify_task_finished(task)
+    
+    def _begin_task_execution(self, task_id: str) -> Optional[Task]:
+        """Mark a task as running before its agent starts."""
+        task = self.tasks.get(task_id)
+        if not task:
+            return None
+        
         task.status = TaskStatus.RUNNING
         task.started_at = time.time()
         
@@ -186,149 +274,161 @@ class TaskService:
         for callback in self.callbacks:
             callback("task_started", task)
         
-        try:
-            # Create a new agent instance to handle this task
-            result = agent(
-                task.description,
-                depth=task.depth,
-                max_retries=task.max_retries
-            )
-            
-            # Improved model_info extraction from events - do this BEFORE processing the result
-            events = event_logger.get_events(task_id=task_id)
-            model_info_found = False
-            
-            # First look for the most descriptive model_info in "Task will be solved using" messages
+        return task
+    
+    def _complete_task(self, task_id: str, task: Task, result: Any):
+        """Record the result of a successfully executed task."""
+        # Improved model_info extraction from events - do this BEFORE processing the result
+        events = event_logger.get_events(task_id=task_id)
+        model_info_found = False
+
+        # First look for the most descriptive model_info in "Task will be solved using" messages
+        for event in events:
+            if (event.level.value == "info" and event.data and "model_info" in event.data and 
+                "Task will be solved using" in event.message):
+                task.model_info = event.data["model_info"]
+                model_info_found = True
+                log_info(f"Found detailed model info: {task.model_info}", task_id=task_id)
+                break
+
+        # Then look for "USING MODEL:" messages
+        if not model_info_found:
             for event in events:
                 if (event.level.value == "info" and event.data and "model_info" in event.data and 
-                    "Task will be solved using" in event.message):
+                    "USING MODEL:" in event.message):
                     task.model_info = event.data["model_info"]
                     model_info_found = True
-                    log_info(f"Found detailed model info: {task.model_info}", task_id=task_id)
+                    log_info(f"Found model info from 'USING MODEL': {task.model_info}", task_id=task_id)
                     break
-            
-            # Then look for "USING MODEL:" messages
-            if not model_info_found:
-                for event in events:
-                    if (event.level.value == "info" and event.data and "model_info" in event.data and 
-                        "USING MODEL:" in event.message):
-                        task.model_info = event.data["model_info"]
-                        model_info_found = True
-                        log_info(f"Found model info from 'USING MODEL': {task.model_info}", task_id=task_id)
-                        break
-            
-            # If not found yet, check any event with model_info in data
-            if not model_info_found:
-                for event in events:
-                    if event.level.value == "info" and event.data and "model_info" in event.data:
-                        task.model_info = event.data["model_info"]
+
+        # If not found yet, check any event with model_info in data
+        if not model_info_found:
+            for event in events:
+                if event.level.value == "info" and event.data and "model_info" in event.data:
+                    task.model_info = event.data["model_info"]
+                    model_info_found = True
+                    log_info(f"Found model info from event data: {task.model_info}", task_id=task_id)
+                    break
+
+        # If still not found, search for model info in message text
+        if not model_info_found:
+            for event in events:
+                if (event.level.value == "info" and 
+                    ("USING MODEL:" in event.message or "Task will be solved using" in event.message)):
+                    parts = event.message.split(" ")
+                    if len(parts) >= 3:  # Should have format like "USING MODEL: Anthropic Claude" or similar
+                        model_text = " ".join(parts[2:])
+                        task.model_info = model_text
                         model_info_found = True
-                        log_info(f"Found model info from event data: {task.model_info}", task_id=task_id)
+                        log_info(f"Extracted model info from message: {task.model_info}", task_id=task_id)
                         break
-            
-            # If still not found, search for model info in message text
-            if not model_info_found:
-                for event in events:
-                    if (event.level.value == "info" and 
-                        ("USING MODEL:" in event.message or "Task will be solved using" in event.message)):
-                        parts = event.message.split(" ")
-                        if len(parts) >= 3:  # Should have format like "USING MODEL: Anthropic Claude" or similar
-                            model_text = " ".join(parts[2:])
-                            task.model_info = model_text
-                            model_info_found = True
-                            log_info(f"Extracted model info from message: {task.model_info}", task_id=task_id)
-                            break
-            
-            # If still no model info was found, set a default
-            if not model_info_found:
-                # Try to determine if we can tell which model was used from other clues
-                anthropic_found = False
-                openai_found = False
-                
-                for event in events:
-                    if "anthropic" in event.message.lower() or "claude" in event.message.lower():
-                        anthropic_found = True
-                        break
-                    if "openai" in event.message.lower() or "gpt" in event.message.lower():
-                        openai_found = True
-                        break
-                
-                if anthropic_found:
-                    task.model_info = "Anthropic Claude"
-                    model_info_found = True
-                    log_info(f"Inferred model: {task.model_info}", task_id=task_id)
-                elif openai_found:
-                    task.model_info = "OpenAI GPT-4"
-                    model_info_found = True
-                    log_info(f"Inferred model: {task.model_info}", task_id=task_id)
-                else:
-                    task.model_info = "Default AI Model"
-                    log_warning("Could not determine model info, using default", task_id=task_id)
-            
-            # Update task state immediately to make model info available
-            for callback in self.callbacks:
-                callback("task_updated", task)
-            
-            # Store the result
-            if isinstance(result, int) and result > 1000:
-                # Format with commas for readability
-                task.result = f"{result:,}"
-            elif isinstance(result, float):
-                # Format floats with 6 decimal places
-                task.result = f"{result:.6f}"
-            elif isinstance(result, dict):
-                # Try to convert to formatted JSON
-                try:
-                    task.result = json.dumps(result, indent=2)
-                except:
-                    task.result = str(result)
+
+        # If still no model info was found, set a default
+        if not model_info_found:
+            # Try to determine if we can tell which model was used from other clues
+            anthropic_found = False
+            openai_found = False
+
+            for event in events:
+                if "anthropic" in event.message.lower() or "claude" in event.message.lower():
+                    anthropic_found = True
+                    break
+                if "openai" in event.message.lower() or "gpt" in event.message.lower():
+                    openai_found = True
+                    break
+
+            if anthropic_found:
+                task.model_info = "Anthropic Claude"
+                model_info_found = True
+                log_info(f"Inferred model: {task.model_info}", task_id=task_id)
+            elif openai_found:
+                task.model_info = "OpenAI GPT-4"
+                model_info_found = True
+                log_info(f"Inferred model: {task.model_info}", task_id=task_id)
             else:
-                task.result = result
-                
-            if "factorial" in task.description.lower():
-                # Add specific context for factorial calculations
-                if task.result and (isinstance(task.result, int) or (isinstance(task.result, str) and task.result.replace(',', '').isdigit())):
-                    # If we have a numeric result, format it nicely
-                    value = task.result if isinstance(task.result, int) else int(task.result.replace(',', ''))
-                    task.result = f"The factorial of 10 is: {value:,}"
-            
-            task.status = TaskStatus.COMPLETED
-            task.completed_at = time.time()
-            
-            # Log the completion
-            log_success(
-                f"Task completed: {task.description}",
-                task_id=task_id
-            )
-            
-            # Log the result
-            log_result(
-                "Task result",
-                task_id=task_id,
-                result=task.result
-            )
-            
-            # Use the correct event callback notification method
-            for callback in self.callbacks:
-                callback("task_completed", task)
-        except Exception as e:
-            task.error = str(e)
-            task.status = TaskStatus.FAILED
-            task.completed_at = time.time()
-            
-            log_error(
-                f"Task failed: {task.description}. Error: {str(e)}",
-                task_id=task_id,
-                depth=task.depth
-            )
+                task.model_info = "Default AI Model"
+                log_warning("Could not determine model info, using default", task_id=task_id)
+
+        # Update task state immediately to make model info available
+        for callback in self.callbacks:
+            callback("task_updated", task)
+
+        # Store the result
+        if isinstance(result, int) and result > 1000:
+            # Format with commas for readability
+            task.result = f"{result:,}"
+        elif isinstance(result, float):
+            # Format floats with 6 decimal places
+            task.result = f"{result:.6f}"
+        elif isinstance(result, dict):
+            # Try to convert to formatted JSON
+            try:
+                task.result = json.dumps(result, indent=2)
+            except:
+                task.result = str(result)
+        else:
+            task.result = result
+
+        if "factorial" in task.description.lower():
+            # Add specific context for factorial calculations
+            if task.result and (isinstance(task.result, int) or (isinstance(task.result, str) and task.result.replace(',', '').isdigit())):
+                # If we have a numeric result, format it nicely
+                value = task.result if isinstance(task.result, int) else int(task.result.replace(',', ''))
+                task.result = f"The factorial of 10 is: {value:,}"
+
+        task.status = TaskStatus.COMPLETED
+        task.completed_at = time.time()
+
+        # Log the completion
+        log_success(
+            f"Task completed: {task.description}",
+            task_id=task_id
+        )
+
+        # Log the result
+        log_result(
+            "Task result",
+            task_id=task_id,
+            result=task.result
+        )
+
+        # Use the correct event callback notification method
+        for callback in self.callbacks:
+            callback("task_completed", task)
+    
+    def _fail_task(self, task_id: str, task: Task, error: Exception):
+        """Record the error of a failed task."""
+        task.error = str(error)
+        task.status = TaskStatus.FAILED
+        task.completed_at = time.time()
         
-        # Notify callbacks
+        log_error(
+            f"Task failed: {task.description}. Error: {str(error)}",
+            task_id=task_id,
+            depth=task.depth
+        )
+    
+    def _notify_task_finished(self, task: Task):
+        """Notify callbacks that a task has finished."""
         for callback in self.callbacks:
             callback(
                 "task_completed" if task.status == TaskStatus.COMPLETED else "task_failed",
                 task
             )
     
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """Get the event loop that drives async tasks, starting it on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="microboss-task-loop",
+                    daemon=True
+                )
+                thread.start()
+            return self._loop
+    
     def get_task(self, task_id: str) -> Optional[Task]:
         """Get a task by ID."""
         if task_id not in self.tasks:
@@ -0,0 +1,49 @@
+"""
+Shared fixtures: every test runs the agent offline on the local backend, from its own
+directory and with its own response cache and result store.
+"""
+
+import importlib
+import json
+import os
+
+import pytest
+
+from microboss.utils import batch, cache, result_store
+
+# The package re-exports agent(), which shadows the module of the same name
+agent_module = importlib.import_module("microboss.core.agent")
+
+# Settings read from the environment that must not leak in from the developer's shell
+ISOLATED_VARIABLES = ("MAX_PARALLEL_SUBTASKS", "MAX_CONCURRENT_CALLS", "OPENAI_API_BASE")
+
+
+@pytest.fixture(autouse=True)
+def local_run(tmp_path, monkeypatch):
+    """Run in a temporary directory against the local backend."""
+    for name in list(os.environ):
+        if name.startswith("MICROBOSS_") or name in ISOLATED_VARIABLES:
+            monkeypatch.delenv(name)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MICROBOSS_PROVIDER", "local")
+    monkeypatch.setenv("MICROBOSS_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setenv("MICROBOSS_RESULT_STORE_PATH", str(tmp_path / "results.db"))
+    monkeypatch.setattr(cache, "_response_cache", None)
+    monkeypatch.setattr(result_store, "_result_store", None)
+    monkeypatch.setattr(agent_module, "_call_semaphore", None)
+    monkeypatch.setattr(batch, "_collectors", {})
+    return tmp_path
+
+
+@pytest.fixture
+def local_responses(local_run, monkeypatch):
+    """Install canned local backend rules, given as (pattern, kind, response) tuples."""
+
+    def install(*rules):
+        path = local_run / "responses.json"
+        path.write_text(json.dumps([
+            {"pattern": pattern, "kind": kind, "response": response} for pattern, kind, response in rules
+        ]))
+        monkeypatch.setenv("MICROBOSS_LOCAL_RESPONSES", str(path))
+
+    return install
@@ -0,0 +1,107 @@
+"""
+End-to-end tests of the synchronous agent on the local backend.
+"""
+
+import pytest
+
+from microboss import Budget, RunConfig, agent
+from microboss.core.scheduler import DAGScheduler
+from microboss.providers.local import LocalBackend
+from microboss.utils.cache import get_response_cache
+from microboss.utils.execution import ExecutionError
+
+FAILING_CODE = "```python\nresult = 1 / 0\n```"
+
+
+def test_direct_solution():
+    budget = Budget()
+    assert agent("square of 4", budget=budget) == "square of 4"
+    assert budget.llm_calls == 1
+    assert budget.executions == 1
+
+
+@pytest.mark.parametrize("max_parallel", [1, 4])
+def test_decomposition_passes_dependency_results(max_parallel):
+    result = agent("sum things", depth=2, max_parallel=max_parallel, use_cache=False)
+    assert result == "Part 2 of 2 of: sum things with inputs ['Part 1 of 2 of: sum things']"
+
+
+def test_nested_decomposition_within_call_limit(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_CALLS", "1")
+    monkeypatch.setenv("MICROBOSS_LOCAL_DECOMPOSITION", "chain")
+    budget = Budget()
+    result = agent("chain things", depth=3, budget=budget, use_cache=False)
+    assert result.startswith("Part 2 of 2 of: Part 3 of 3 of: chain things")
+    # One decomposition per node above depth 1, one generation per leaf
+    assert budget.llm_calls == 1 + 3 + 6
+
+
+def test_scheduler_runs_dependencies_first():
+    order = []
+
+    def execute(subtask_id, template, deps):
+        order.append(subtask_id)
+        return template
+
+    subproblems = [("c", "C", ["a", "b"]), ("a", "A", []), ("b", "B", ["a"])]
+    results = DAGScheduler(subproblems, max_workers=2).run(execute)
+    assert results == {"a": "A", "b": "B", "c": "C"}
+    assert order == ["a", "b", "c"]
+
+
+def test_retry_fixes_failing_code(local_responses):
+    local_responses(("broken", "generate", FAILING_CODE))
+    budget = Budget()
+    assert agent("broken task", budget=budget) == "fixed"
+    assert budget.llm_calls == 2
+    assert budget.executions == 2
+
+
+def test_gives_up_after_retries(local_responses):
+    local_responses(("broken", "generate", FAILING_CODE), ("", "fix", FAILING_CODE))
+    with pytest.raises(ExecutionError):
+        agent("broken task", max_retries=1)
+
+
+@pytest.mark.parametrize("fix_mode, expected", [("patch", "fixed"), ("full", "rewritten")])
+def test_fix_mode(local_responses, fix_mode, expected):
+    local_responses(("broken", "generate", FAILING_CODE), ("", "fix", "```python\nresult = 'rewritten'\n```"))
+    config = RunConfig.from_env(fix_mode=fix_mode)
+    assert agent("broken task", config=config) == expected
+
+
+def test_result_store_serves_solved_tasks(monkeypatch):
+    monkeypatch.setattr(LocalBackend, "cacheable", True)
+    assert agent("stored task", depth=2) == "Part 2 of 2 of: stored task with inputs ['Part 1 of 2 of: stored task']"
+
+    budget = Budget()
+    assert agent("stored task", depth=2, budget=budget).startswith("Part 2 of 2 of: stored task")
+    assert budget.llm_calls == 0
+    assert budget.executions == 0
+
+
+def test_result_store_skips_failed_subtasks(monkeypatch, local_responses):
+    monkeypatch.setattr(LocalBackend, "cacheable", True)
+    monkeypatch.setenv("MICROBOSS_CACHE", "false")
+    local_responses(("Part 1 of 2", "generate", FAILING_CODE), ("Part 1 of 2", "fix", FAILING_CODE))
+    agent("flaky task", depth=2, max_retries=0)
+
+    budget = Budget()
+    agent("flaky task", depth=2, max_retries=0, budget=budget)
+    assert budget.llm_calls > 0
+
+
+def test_response_cache_replays_calls(monkeypatch):
+    monkeypatch.setattr(LocalBackend, "cacheable", True)
+    monkeypatch.setenv("MICROBOSS_RESULT_STORE", "false")
+    agent("cached task")
+
+    budget = Budget()
+    assert agent("cached task", budget=budget) == "cached task"
+    assert budget.llm_calls == 0
+    assert get_response_cache().stats()["hits"] == 1
+
+
+def test_speculative_candidates(monkeypatch):
+    monkeypatch.setenv("MICROBOSS_SPECULATIVE_CANDIDATES", "3")
+    assert agent("speculate this") == "speculate this"
@@ -0,0 +1,60 @@
+"""
+End-to-end tests of the asynchronous agent on the local backend.
+"""
+
+import asyncio
+
+from microboss import Budget, RunConfig, async_agent
+from microboss.providers.local import LocalBackend
+
+FAILING_CODE = "```python\nresult = 1 / 0\n```"
+
+
+def test_direct_solution():
+    budget = Budget()
+    assert asyncio.run(async_agent("square of 5", budget=budget)) == "square of 5"
+    assert budget.llm_calls == 1
+
+
+def test_decomposition_passes_dependency_results():
+    result = asyncio.run(async_agent("sum things", depth=2, use_cache=False))
+    assert result == "Part 2 of 2 of: sum things with inputs ['Part 1 of 2 of: sum things']"
+
+
+def test_nested_decomposition_within_call_limit(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_CALLS", "1")
+    budget = Budget()
+    result = asyncio.run(async_agent("sum things", depth=3, budget=budget, use_cache=False))
+    assert result.startswith("Part 2 of 2 of: Part 3 of 3 of: sum things")
+    assert budget.llm_calls == 1 + 3 + 6
+
+
+def test_retry_fixes_failing_code(local_responses):
+    local_responses(("broken", "generate", FAILING_CODE))
+    budget = Budget()
+    assert asyncio.run(async_agent("broken task", budget=budget)) == "fixed"
+    assert budget.executions == 2
+
+
+def test_patch_fix_mode(local_responses):
+    local_responses(("broken", "generate", FAILING_CODE), ("", "fix", "```python\nresult = 'rewritten'\n```"))
+    config = RunConfig.from_env(fix_mode="patch")
+    assert asyncio.run(async_agent("broken task", config=config)) == "fixed"
+
+
+def test_result_store_serves_solved_tasks(monkeypatch):
+    monkeypatch.setattr(LocalBackend, "cacheable", True)
+    asyncio.run(async_agent("stored task", depth=2))
+
+    budget = Budget()
+    assert asyncio.run(async_agent("stored task", depth=2, budget=budget)).startswith("Part 2 of 2 of: stored task")
+    assert budget.llm_calls == 0
+
+
+def test_speculative_losers_are_cancelled(monkeypatch, local_responses):
+    local_responses(
+        ("different algorithm", "generate", "```python\nimport time\ntime.sleep(30)\nresult = 'slow'\n```"),
+        ("", "generate", "```python\nresult = 'fast'\n```")
+    )
+    monkeypatch.setenv("MICROBOSS_SPECULATIVE_CANDIDATES", "4")
+    assert asyncio.run(asyncio.wait_for(async_agent("speculate that"), 20)) == "fast"
@@ -0,0 +1,86 @@
+"""
+Tests of batch mode against the stand-in OpenAI batch server.
+"""
+
+import asyncio
+import json
+import re
+
+import pytest
+
+pytest.importorskip("openai")
+
+from microboss import RunConfig, agent, async_agent
+from microboss.providers.base import get_backend
+from microboss.providers.batch_server import start_batch_server
+from microboss.utils.batch import BatchCollector, get_batch_stats
+
+# More independent leaves than MAX_CONCURRENT_CALLS lets run at once
+WIDE_LEAVES = 6
+
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    server = start_batch_server(turnaround=0.1)
+    host, port = server.server_address[:2]
+    monkeypatch.setenv("OPENAI_API_KEY", "stand-in")
+    monkeypatch.setenv("OPENAI_API_BASE", f"http://{host}:{port}/v1")
+    monkeypatch.setenv("MICROBOSS_BATCH_WINDOW", "0.1")
+    monkeypatch.setenv("MICROBOSS_BATCH_POLL_INTERVAL", "0.1")
+    yield server
+    server.shutdown()
+
+
+def test_collector_groups_requests_into_one_job(batch_server):
+    backend = get_backend("openai")
+    client, _ = backend.get_client()
+    collector = BatchCollector(backend, client, window=0.2, poll_interval=0.1)
+
+    futures = [collector.submit("", f"TASK: task {i}", "gpt-4", 100, 0) for i in range(3)]
+    for future in futures:
+        text, usage, latency = future.result(timeout=10)
+        assert "result" in text
+        assert usage.total > 0
+
+    stats = collector.stats()
+    assert stats["batches"] == 1
+    assert stats["completed"] == 3
+    assert stats["failed"] == 0
+
+
+def test_agent_in_batch_mode(batch_server, monkeypatch):
+    monkeypatch.setenv("MICROBOSS_PROVIDER", "openai")
+    config = RunConfig.from_env(batch=True)
+    result = agent("sum things", depth=2, use_cache=False, config=config)
+    assert result == "Part 2 of 2 of: sum things with inputs ['Part 1 of 2 of: sum things']"
+
+
+@pytest.fixture
+def wide_decomposition(batch_server, monkeypatch):
+    """Make the stand-in server split every task into independent leaves, sent with a low call limit."""
+    decomposition = {
+        "subtasks": [{"id": f"task_{i}", "task": f"leaf {i}", "depends_on": []} for i in range(1, WIDE_LEAVES + 1)],
+        "result": f"task_{WIDE_LEAVES}"
+    }
+    batch_server.state.client.rules = [(re.compile(""), "decompose_structured", json.dumps(decomposition))]
+    monkeypatch.setenv("MICROBOSS_PROVIDER", "openai")
+    monkeypatch.setenv("MAX_CONCURRENT_CALLS", "2")
+    monkeypatch.setenv("MICROBOSS_BATCH_WINDOW", "0.5")
+
+
+def test_batched_leaves_are_not_bound_by_call_limit(wide_decomposition):
+    config = RunConfig.from_env(batch=True)
+    result = agent("wide task", depth=2, max_parallel=WIDE_LEAVES, use_cache=False, config=config)
+    assert result == f"leaf {WIDE_LEAVES}"
+    stats = get_batch_stats()["openai"]
+    assert stats["batches"] == 1
+    assert stats["completed"] == WIDE_LEAVES
+
+
+def test_async_batched_leaves_are_not_bound_by_call_limit(wide_decomposition):
+    config = RunConfig.from_env(batch=True)
+    result = asyncio.run(async_agent("wide task", depth=2, max_parallel=WIDE_LEAVES, use_cache=False, config=config))
+    assert result == f"leaf {WIDE_LEAVES}"
+    stats = get_batch_stats()["openai"]
+    assert stats["batches"] == 1
+    assert stats["completed"] == WIDE_LEAVES
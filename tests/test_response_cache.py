@@ -0,0 +1,56 @@
+"""
+Tests that responses are cached under the provider and model that answered them.
+"""
+
+import pytest
+
+from microboss import Budget, agent
+from microboss.providers.local import LocalBackend
+from microboss.utils import api
+from microboss.utils.cache import get_response_cache
+
+
+class FallbackBackend(LocalBackend):
+    """A second cacheable offline provider, standing in for a fallback."""
+
+    name = "fallback"
+    label = "Fallback"
+
+
+@pytest.fixture(autouse=True)
+def cacheable_local(monkeypatch):
+    monkeypatch.setattr(LocalBackend, "cacheable", True)
+    monkeypatch.setenv("MICROBOSS_RESULT_STORE", "false")
+
+
+def solve_on_primary(task):
+    budget = Budget()
+    assert agent(task, budget=budget) == task
+    return budget
+
+
+def test_rerouted_answer_is_not_replayed_for_primary(monkeypatch):
+    with monkeypatch.context() as patched:
+        patched.setattr(api, "route", lambda backend, client, is_async=False: (FallbackBackend(), client))
+        agent("rerouted task")
+
+    assert solve_on_primary("rerouted task").llm_calls == 1
+    assert get_response_cache().stats()["hits"] == 0
+
+
+class AlwaysHedge:
+    """A hedger whose hedge request always wins."""
+
+    def run(self, key, primary, hedge, hedge_label=None):
+        return hedge(), True
+
+
+def test_hedged_answer_is_not_replayed_for_primary(monkeypatch):
+    with monkeypatch.context() as patched:
+        patched.setattr(
+            api, "plan_hedge", lambda backend, client, request, run_model, is_async=False: (AlwaysHedge(), client, "hedge-model")
+        )
+        agent("hedged task")
+
+    assert solve_on_primary("hedged task").llm_calls == 1
+    assert get_response_cache().stats()["hits"] == 0